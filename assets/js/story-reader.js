@@ -75,9 +75,20 @@ async function loadNode(nodeId) {
         // Display the image if available
         const imageContainer = document.getElementById('story-image');
         if (node.image) {
-            const imagePath = buildPath(`stories/${currentStory}/${node.image}`);
+            let imagePath = buildPath(`stories/${currentStory}/${node.image}`);
+            let srcsetAttrs = '';
+            // Prefer the compressed, multi-size variants so small screens get small files
+            if (node.imageVariants && node.imageVariants.length > 0) {
+                const variants = [...node.imageVariants].sort((a, b) => a.width - b.width);
+                const srcset = variants
+                    .map(v => `${buildPath(`stories/${currentStory}/${v.src}`)} ${v.width}w`)
+                    .join(', ');
+                imagePath = buildPath(`stories/${currentStory}/${variants[variants.length - 1].src}`);
+                srcsetAttrs = `srcset="${srcset}" sizes="(max-width: 1100px) 100vw, 1100px"`;
+            }
             imageContainer.innerHTML = `
                 <img src="${imagePath}" 
+                     ${srcsetAttrs}
                      alt="Story illustration" 
                      loading="lazy">
             `;
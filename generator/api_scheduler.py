@@ -0,0 +1,234 @@
+"""
+Rate-limit-aware scheduling for OpenAI API calls.
+
+Shared by generate_story.py and generate_images.py. An ApiScheduler enforces
+requests-per-minute and tokens-per-minute budgets with token buckets, and retries
+429s, 5xx responses and connection errors with jittered exponential backoff,
+honouring Retry-After when the provider sends it.
+
+Usage:
+    scheduler = scheduler_from_args(args)
+    client = scheduler.wrap(OpenAI(api_key=..., max_retries=0))
+    client.chat.completions.create(...)   # rate limited and retried
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Calls of these kinds are logged by the scheduler's telemetry recorder
+RECORDED_KINDS = {'chat', 'image', 'download'}
+# Matched by class name so neither openai nor requests has to be imported here
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError', 'ConnectionError', 'Timeout',
+                    'ConnectTimeout', 'ReadTimeout', 'ChunkedEncodingError'}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until amount tokens are available and take them; returns seconds waited"""
+        # A single request larger than the whole budget waits for a full bucket
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return waited
+                delay = (amount - self.available) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) tokens after the real cost is known"""
+        with self._lock:
+            self._refill()
+            self.available = min(self.capacity, self.available - amount)
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """HTTP status of an openai or requests exception, if it has one"""
+    if exc.__cause__ is not None and not hasattr(exc, 'response'):
+        exc = exc.__cause__
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for throttling, transient server errors and connection problems"""
+    if exc.__cause__ is not None and is_retryable(exc.__cause__):
+        return True
+    status = status_code_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Delay requested by the provider via Retry-After / retry-after-ms, if any"""
+    if exc.__cause__ is not None and getattr(exc, 'response', None) is None:
+        exc = exc.__cause__
+    headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_chat_tokens(params: dict) -> int:
+    """Rough token estimate for a chat request (about 4 characters per token plus the reply)"""
+    chars = sum(len(str(m.get('content', ''))) for m in params.get('messages', []))
+    return chars // 4 + int(params.get('max_tokens') or params.get('max_completion_tokens') or 1000)
+
+
+class ApiScheduler:
+    """Applies rate limits and retry/backoff to API calls from any number of threads"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 images_per_minute: Optional[float] = None, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0, recorder: Optional[Any] = None):
+        self.recorder = recorder
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.images = TokenBucket(images_per_minute) if images_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff_delay(self, attempt: int, exc: BaseException) -> float:
+        """Retry-After if present, otherwise full-jitter exponential backoff"""
+        requested = retry_after_seconds(exc)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[..., Any], *args, kind: str = 'other', tokens: int = 0, **kwargs) -> Any:
+        """
+        Call fn(*args, **kwargs) once the budgets for this kind of call allow it,
+        retrying transient failures. kind is 'chat', 'image' or anything else (no budget).
+        """
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            if kind == 'chat':
+                if self.requests:
+                    self.requests.acquire()
+                if self.tokens and tokens:
+                    self.tokens.acquire(tokens)
+            elif kind == 'image' and self.images:
+                self.images.acquire()
+            call_started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.record(kind, kwargs, started, call_started, attempt, error=e)
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                attempt += 1
+                status = status_code_of(e)
+                reason = f'HTTP {status}' if status else type(e.__cause__ or e).__name__
+                print(f'   ↻ {reason}; retrying in {delay:.1f}s ({attempt}/{self.max_retries})')
+                time.sleep(delay)
+                continue
+            if kind == 'chat' and self.tokens and tokens:
+                usage = getattr(result, 'usage', None)
+                actual = getattr(usage, 'total_tokens', None)
+                if isinstance(actual, int):
+                    self.tokens.adjust(actual - tokens)
+            return self.record(kind, kwargs, started, call_started, attempt, result)
+
+    def record(self, kind: str, params: dict, started: float, call_started: float, retries: int,
+               result: Any = None, error: Optional[BaseException] = None) -> Any:
+        """
+        Log a finished call with this scheduler's telemetry recorder, if any. Time before the final
+        attempt (rate limit waits, failed attempts, backoff) is logged separately from its latency.
+        Returns result, wrapped so a streamed response is logged once it has been read.
+        """
+        recorder = self.recorder
+        if recorder is None or kind not in RECORDED_KINDS:
+            return result
+        waited = call_started - started
+        if error is None and params.get('stream'):
+            return recorder.record_stream(result, params, started, waited, retries)
+        recorder.record_call(kind, params, started, time.perf_counter() - call_started, waited, retries,
+                             result, error)
+        return result
+
+    def wrap(self, client: Any) -> 'ScheduledClient':
+        """Wrap an OpenAI client so chat and image calls go through this scheduler"""
+        return ScheduledClient(client, self)
+
+
+class ScheduledClient:
+    """
+    Drop-in stand-in for an OpenAI client whose chat.completions.create and
+    images.generate are rate limited and retried. Everything else is passed through.
+    """
+
+    def __init__(self, client: Any, scheduler: ApiScheduler):
+        self._client = client
+        self.scheduler = scheduler
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+        self.images = SimpleNamespace(generate=self._images_generate)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def _chat_create(self, **params) -> Any:
+        return self.scheduler.call(self._client.chat.completions.create, kind='chat',
+                                   tokens=estimate_chat_tokens(params), **params)
+
+    def _images_generate(self, **params) -> Any:
+        return self.scheduler.call(self._client.images.generate, kind='image', **params)
+
+
+def add_scheduler_args(parser) -> None:
+    """Add the shared rate limit / retry options to an argparse parser"""
+    parser.add_argument('--rpm', type=float, default=None, help='Chat requests per minute budget (default: unlimited)')
+    parser.add_argument('--tpm', type=float, default=None, help='Chat tokens per minute budget (default: unlimited)')
+    parser.add_argument('--image-rpm', type=float, default=None, help='Image requests per minute budget (default: unlimited)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for 429/5xx/connection errors (default: 5)')
+
+
+def scheduler_from_args(args, recorder: Optional[Any] = None) -> ApiScheduler:
+    """Build an ApiScheduler from the options added by add_scheduler_args(), logging to recorder"""
+    return ApiScheduler(requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                        images_per_minute=args.image_rpm, max_retries=args.max_retries, recorder=recorder)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Offline bulk story generation through the provider's batch endpoint.
+
+Instead of one synchronous chat completion per story, every prompt is written to
+a JSONL batch file, uploaded and submitted as a single batch job (cheaper, and no
+client waiting on each request). When the batch has finished, each story in the
+output is validated and materialised into the normal stories/<storyId>/ layout
+(node files, story.json, styleKit) exactly as generate_story.py would.
+
+Batch jobs are recorded in generator/.cache/batches/<batch_id>.json so collection
+can happen later, from another run, and is safe to repeat: stories already
+materialised are skipped.
+
+Usage:
+    python batch_generate.py --api-key KEY run --system-prompt system-prompt.txt --user-prompts prompts/
+    python batch_generate.py --api-key KEY submit --system-prompt system-prompt.txt --user-prompts "prompts/*.txt"
+    python batch_generate.py --api-key KEY status [BATCH_ID]
+    python batch_generate.py --api-key KEY collect BATCH_ID [--wait]
+
+Images are not generated by default (the image API has no batch endpoint); use
+--images to generate them synchronously or --enqueue-images to queue them for
+image_queue.py. Use --base-url with mock_provider.py to run without network access.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict
+
+from api_scheduler import add_scheduler_args, scheduler_from_args
+import generate_story as gs
+from story_validation import validate_and_repair
+from telemetry import add_telemetry_args, telemetry_from_args
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+BATCH_DIR = Path(__file__).parent / '.cache' / 'batches'
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def record_path(batch_id: str) -> Path:
+    return BATCH_DIR / f'{batch_id}.json'
+
+
+def load_record(batch_id: str) -> Dict[str, Any]:
+    path = record_path(batch_id)
+    if not path.exists():
+        print(f'Error: No local record for batch {batch_id} in {BATCH_DIR}')
+        sys.exit(1)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_record(record: Dict[str, Any]) -> None:
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = record_path(record['batchId']).with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(record_path(record['batchId']))
+
+
+def build_batch_file(prompt_files, system_prompt: str, model: str, path: Path) -> Dict[str, str]:
+    """Write one chat completion request per prompt file; returns {custom_id: prompt path}"""
+    prompts = {}
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, prompt_path in enumerate(prompt_files):
+            custom_id = f'{index:04d}-{Path(prompt_path).stem}'
+            request = {
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    'model': model,
+                    'messages': [
+                        {'role': 'system', 'content': system_prompt},
+                        {'role': 'user', 'content': gs.load_prompt_file(str(prompt_path))},
+                    ],
+                    'temperature': 0.8,
+                    'response_format': {'type': 'json_object'},
+                },
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+            prompts[custom_id] = str(prompt_path)
+    return prompts
+
+
+def submit(args, client: OpenAI) -> Dict[str, Any]:
+    prompt_files = gs.find_prompt_files(args.user_prompts)
+    if not prompt_files:
+        print(f'Error: No prompt files found for: {args.user_prompts}')
+        sys.exit(1)
+    system_prompt = gs.load_prompt_file(args.system_prompt)
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    input_path = BATCH_DIR / f'input-{time.strftime("%Y%m%d-%H%M%S")}.jsonl'
+    prompts = build_batch_file(prompt_files, system_prompt, args.model, input_path)
+    print(f'📦 Wrote {len(prompts)} requests to {input_path}')
+
+    with open(input_path, 'rb') as f:
+        uploaded = client.files.create(file=f, purpose='batch')
+    batch = client.batches.create(input_file_id=uploaded.id, endpoint='/v1/chat/completions',
+                                  completion_window='24h', metadata={'source': 'cyoa-batch-generate'})
+    record = {
+        'batchId': batch.id,
+        'inputFileId': uploaded.id,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': args.model,
+        'systemPrompt': str(Path(args.system_prompt).resolve()),
+        'prompts': {cid: str(Path(p).resolve()) for cid, p in prompts.items()},
+        'status': batch.status,
+        'results': {},
+    }
+    save_record(record)
+    print(f'✓ Submitted batch {batch.id} ({batch.status})')
+    return record
+
+
+def wait_for_batch(client: OpenAI, batch_id: str, interval: float) -> Any:
+    """Poll until the batch reaches a terminal status"""
+    last = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f' {counts.completed}/{counts.total}' if counts and counts.total else ''
+        if batch.status != last or progress:
+            print(f'   ⏳ {batch.id}: {batch.status}{progress}')
+            last = batch.status
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(interval)
+
+
+def story_args(args, record: Dict[str, Any], prompt_path: str):
+    """generate_story.py options used to materialise one story"""
+    argv = ['--api-key', args.api_key, '--system-prompt', record['systemPrompt'],
+            '--user-prompt', prompt_path, '--model', record['model'], '--no-cache',
+            '--repair-attempts', str(args.repair_attempts), '--image-model', args.image_model,
+            '--image-quality', args.image_quality, '--image-frequency', args.image_frequency]
+    if args.overwrite:
+        argv.append('--overwrite')
+    if not args.images:
+        argv.append('--skip-images')
+    return gs.parse_args(argv)
+
+
+def collect(args, client: OpenAI, batch_id: str) -> Dict[str, Any]:
+    """Download a finished batch and materialise every story not already written"""
+    record = load_record(batch_id)
+    batch = wait_for_batch(client, batch_id, args.poll_interval) if args.wait else client.batches.retrieve(batch_id)
+    record['status'] = batch.status
+    save_record(record)
+    if batch.status != 'completed':
+        print(f'⚠️  Batch {batch_id} is {batch.status}; nothing to collect yet' if batch.status not in TERMINAL_STATUSES
+              else f'Error: Batch {batch_id} ended as {batch.status}')
+        return record
+
+    lines = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            lines += [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+    system_prompt = gs.load_prompt_file(record['systemPrompt'])
+    gs.remove_abandoned_builds(Path(__file__).parent.parent / 'stories')
+    new_story_ids = []
+    for line in sorted(lines, key=lambda entry: entry.get('custom_id') or ''):
+        custom_id = line.get('custom_id')
+        if record['results'].get(custom_id, {}).get('status') == 'ok':
+            continue
+        prompt_path = record['prompts'].get(custom_id)
+        result = {'prompt': prompt_path, 'status': 'failed'}
+        try:
+            response = line.get('response') or {}
+            if line.get('error') or response.get('status_code') != 200:
+                raise ValueError(f"request failed: {line.get('error') or response.get('body')}")
+            content = response['body']['choices'][0]['message']['content']
+            user_prompt = gs.load_prompt_file(prompt_path)
+            options = story_args(args, record, prompt_path)
+            story_data = validate_and_repair(gs.json_completer(client, record['model']), system_prompt,
+                                             user_prompt, json.loads(content), args.repair_attempts)
+            story_data = gs.create_story(options, client, system_prompt, user_prompt, story_data=story_data)
+            result.update(status='ok', storyId=story_data['metadata']['storyId'], nodes=len(story_data['nodes']))
+            new_story_ids.append(result['storyId'])
+        except (SystemExit, Exception) as e:
+            result['error'] = 'materialisation failed (see log above)' if isinstance(e, SystemExit) else str(e)
+            print(f'   ✗ {custom_id}: {result["error"]}')
+        record['results'][custom_id] = result
+        save_record(record)
+
+    if args.enqueue_images and new_story_ids:
+        from image_queue import ImageQueue, STORIES_DIR, enqueue_stories
+        queued = enqueue_stories(ImageQueue(), [STORIES_DIR / s for s in new_story_ids],
+                                 args.image_frequency, args.image_model, args.image_quality)
+        print(f'🖼  {queued} image job(s) queued; run: python image_queue.py work --api-key ...')
+
+    ok = sum(1 for r in record['results'].values() if r['status'] == 'ok')
+    print()
+    print('=' * 50)
+    print(f'✨ Batch {batch_id}: {ok}/{len(record["prompts"])} stories materialised')
+    print('=' * 50)
+    for custom_id, result in sorted(record['results'].items()):
+        mark = '✓' if result['status'] == 'ok' else '✗'
+        print(f'   {mark} {custom_id}: {result.get("storyId") or result.get("error")}')
+    missing = [cid for cid in record['prompts'] if cid not in record['results']]
+    for custom_id in missing:
+        print(f'   ✗ {custom_id}: no response in batch output')
+    return record
+
+
+def show_status(client: OpenAI, batch_id: str = None) -> None:
+    if batch_id:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        print(f'{batch.id}: {batch.status}' + (f' ({counts.completed}/{counts.total} done, {counts.failed} failed)'
+                                               if counts else ''))
+        return
+    records = sorted(BATCH_DIR.glob('batch*.json')) if BATCH_DIR.exists() else []
+    if not records:
+        print('No batches submitted yet.')
+    for path in records:
+        with open(path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        ok = sum(1 for r in record['results'].values() if r['status'] == 'ok')
+        print(f'{record["batchId"]}: {record["status"]}, {len(record["prompts"])} prompts, '
+              f'{ok} materialised (submitted {record["created"]})')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate CYOA stories in bulk through the batch API')
+    parser.add_argument('--api-key', required=True, help='Your OpenAI API key (any value for mock_provider.py)')
+    parser.add_argument('--base-url', default=None, help='API base URL, e.g. http://127.0.0.1:8765/v1 for mock_provider.py')
+    add_scheduler_args(parser)
+    add_telemetry_args(parser)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    submission = argparse.ArgumentParser(add_help=False)
+    submission.add_argument('--system-prompt', required=True, help='Path to the system prompt file')
+    submission.add_argument('--user-prompts', required=True, help='Directory or glob of prompt files, one story per file')
+    submission.add_argument('--model', default='gpt-4o', help='OpenAI model to use (default: gpt-4o)')
+
+    collection = argparse.ArgumentParser(add_help=False)
+    collection.add_argument('--poll-interval', type=float, default=30, help='Seconds between status checks while waiting (default: 30)')
+    collection.add_argument('--repair-attempts', type=int, default=1, help='Synchronous requests allowed to repair a broken story (default: 1)')
+    images = collection.add_mutually_exclusive_group()
+    images.add_argument('--images', action='store_true', help='Generate images synchronously while materialising')
+    images.add_argument('--enqueue-images', action='store_true', help='Queue images for image_queue.py instead')
+    collection.add_argument('--image-model', default='dall-e-3', help='Image model to use (default: dall-e-3)')
+    collection.add_argument('--image-quality', default='standard', choices=['standard','hd'], help='Image quality for dall-e-3 (standard or hd)')
+    collection.add_argument('--image-frequency', default='start-end-endings', choices=['all','start-end','start-end-endings'], help='Which nodes get images')
+    collection.add_argument('--overwrite', action='store_true', help='Replace published stories that have the same ID')
+
+    sub.add_parser('submit', parents=[submission], help='Write the batch file and submit it')
+    run = sub.add_parser('run', parents=[submission, collection], help='Submit, wait for completion and materialise the stories')
+    run.set_defaults(wait=True)
+    collect_parser = sub.add_parser('collect', parents=[collection], help='Materialise the stories of a finished batch')
+    collect_parser.add_argument('batch_id', help='Batch ID printed by submit')
+    collect_parser.add_argument('--wait', action='store_true', help='Wait for the batch to finish first')
+    status = sub.add_parser('status', help='Show submitted batches, or one batch in detail')
+    status.add_argument('batch_id', nargs='?', help='Batch ID to check with the provider')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Imported after parsing so --help and usage errors stay fast
+    from openai import OpenAI
+
+    recorder = telemetry_from_args(args, 'batch_generate')
+    client = scheduler_from_args(args, recorder).wrap(OpenAI(api_key=args.api_key, base_url=args.base_url, max_retries=0))
+
+    if args.command == 'submit':
+        record = submit(args, client)
+        print(f'   Collect with: python batch_generate.py --api-key ... collect {record["batchId"]} --wait')
+    elif args.command == 'run':
+        record = submit(args, client)
+        record = collect(args, client, record['batchId'])
+        if any(r['status'] != 'ok' for r in record['results'].values()) or len(record['results']) < len(record['prompts']):
+            sys.exit(1)
+    elif args.command == 'collect':
+        collect(args, client, args.batch_id)
+    elif args.command == 'status':
+        show_status(client, args.batch_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+End-to-end generator benchmark against the local mock provider.
+
+Starts mock_provider.py in-process (no network, no API key) and drives the real
+entry points, generate_story.main() and generate_images.main(), exactly as the
+command line would. Reports stories/minute, images/minute and tail latency per
+scenario, so changes to concurrency and retry logic can be measured on any machine.
+
+Scenarios:
+    text    generate_story.py batch mode, --skip-images
+    full    generate_story.py batch mode with images for every node
+    images  generate_images.py --force on stories generated beforehand (setup not timed)
+
+Usage:
+    python benchmark.py [--stories 12] [--concurrency 4] [--image-concurrency 4] [--scenarios text full images]
+    python benchmark.py --latency 1.5 --image-latency 4 --error-rate 0.05 --rate-limit-every 20 --json before.json
+
+Generator output goes to a log file per scenario; stories created by the benchmark
+are removed from stories/ afterwards unless --keep is given.
+"""
+import argparse
+import contextlib
+import json
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from mock_provider import add_fault_args, fault_options, start_background
+from telemetry import load_records, percentile
+
+
+SCRIPT_DIR = Path(__file__).parent
+STORIES_DIR = SCRIPT_DIR.parent / 'stories'
+SCENARIOS = ('text', 'full', 'images')
+
+
+def write_prompts(directory: Path, scenario: str, count: int) -> Path:
+    """One prompt file per story; titles are unique per run so story IDs never collide"""
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime('%H%M%S')
+    for i in range(count):
+        with open(directory / f'story-{i + 1:03}.txt', 'w', encoding='utf-8') as f:
+            f.write(f'Benchmark {scenario} {stamp} story {i + 1}\n\n'
+                    f'A short adventure for the generator benchmark about a girl with red hair.\n')
+    return directory
+
+
+def tail(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in seconds of millisecond values"""
+    if not values:
+        return {}
+    return {f'p{p}': round(percentile(values, p) / 1000, 3) for p in (50, 95, 99)}
+
+
+def run_entry_point(fn, argv: List[str]) -> None:
+    """Call a script's main(); its sys.exit() on failure is not fatal to the benchmark"""
+    try:
+        fn(argv)
+    except SystemExit:
+        pass
+
+
+def story_argv(args, base_url: str, prompts: Path, report: Path, telemetry_dir: Path, with_images: bool) -> List[str]:
+    argv = ['--api-key', 'benchmark', '--base-url', base_url,
+            '--system-prompt', str(SCRIPT_DIR / 'system-prompt.txt'), '--user-prompts', str(prompts),
+            '--batch-concurrency', str(args.concurrency), '--report', str(report),
+            '--no-cache', '--max-retries', str(args.max_retries), '--telemetry-dir', str(telemetry_dir)]
+    if with_images:
+        argv += ['--image-frequency', 'all', '--image-concurrency', str(args.image_concurrency), '--no-image-cache']
+    else:
+        argv.append('--skip-images')
+    if args.stream:
+        argv.append('--stream')
+    if args.no_optimise:
+        argv.append('--no-optimise')
+    return argv
+
+
+def refresh_images(args, base_url: str, prompts: Path, report_path: Path, scenario_dir: Path,
+                   telemetry_dir: Path, provider) -> tuple:
+    """The images scenario: generate_images.py --force on freshly generated stories, in parallel"""
+    import generate_story
+    import generate_images
+
+    # Untimed setup: the stories whose images are then generated
+    run_entry_point(generate_story.main,
+                    story_argv(args, base_url, prompts, report_path, scenario_dir / 'setup-telemetry', False))
+    with open(report_path, 'r', encoding='utf-8') as f:
+        story_ids = [r['storyId'] for r in json.load(f)['results'] if r['status'] == 'ok']
+    stats_before = dict(provider.stats)
+
+    def refresh(story_id: str) -> None:
+        argv = ['--api-key', 'benchmark', '--base-url', base_url, '--story-id', story_id,
+                '--image-frequency', 'all', '--force', '--no-image-cache',
+                '--max-retries', str(args.max_retries), '--telemetry-dir', str(telemetry_dir)]
+        if args.no_optimise:
+            argv.append('--no-optimise')
+        run_entry_point(generate_images.main, argv)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(refresh, story_ids))
+    return time.monotonic() - started, len(story_ids), [], stats_before
+
+
+def run_scenario(args, scenario: str, base_url: str, work_dir: Path, provider) -> Dict[str, Any]:
+    import generate_story
+
+    scenario_dir = work_dir / scenario
+    prompts = write_prompts(scenario_dir / 'prompts', scenario, args.stories)
+    telemetry_dir = scenario_dir / 'telemetry'
+    report_path = scenario_dir / 'report.json'
+    log_path = scenario_dir / 'generator.log'
+    stats_before = dict(provider.stats)
+
+    # Generator output (from every worker thread) goes to the scenario's log
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        if scenario == 'images':
+            wall, stories_ok, story_seconds, stats_before = refresh_images(
+                args, base_url, prompts, report_path, scenario_dir, telemetry_dir, provider)
+        else:
+            started = time.monotonic()
+            run_entry_point(generate_story.main,
+                            story_argv(args, base_url, prompts, report_path, telemetry_dir, scenario == 'full'))
+            wall = time.monotonic() - started
+            results = []
+            if report_path.exists():
+                with open(report_path, 'r', encoding='utf-8') as f:
+                    results = json.load(f)['results']
+            stories_ok = sum(1 for r in results if r['status'] == 'ok')
+            story_seconds = [r['seconds'] * 1000 for r in results if r['status'] == 'ok']
+    stories_failed = args.stories - stories_ok
+
+    calls = load_records(telemetry_dir / 'calls.jsonl')
+    chat = [c for c in calls if c['kind'] == 'chat']
+    images = [c for c in calls if c['kind'] == 'image']
+    images_ok = sum(1 for c in images if c['ok'])
+    injected = {k: provider.stats[k] - stats_before.get(k, 0) for k in ('errors', 'rate_limited')}
+    return {
+        'scenario': scenario,
+        'wallSeconds': round(wall, 2),
+        'stories': stories_ok,
+        'storiesFailed': stories_failed,
+        'storiesPerMinute': round(stories_ok / wall * 60, 2) if scenario != 'images' and wall else None,
+        'images': images_ok,
+        'imagesPerMinute': round(images_ok / wall * 60, 2) if images_ok and wall else None,
+        'storySeconds': tail(story_seconds),
+        'chatLatency': tail([c['latencyMs'] for c in chat if c['ok']]),
+        'imageLatency': tail([c['latencyMs'] for c in images if c['ok']]),
+        'retries': sum(c.get('retries', 0) for c in calls),
+        'failedCalls': sum(1 for c in calls if not c['ok']),
+        'injectedErrors': injected['errors'],
+        'injected429s': injected['rate_limited'],
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    def fmt(latency: Dict[str, float]) -> str:
+        return ' / '.join(f'{latency[p]:.2f}' for p in ('p50', 'p95', 'p99')) + ' s' if latency else '-'
+
+    print(f"\n▶ {result['scenario']}: {result['wallSeconds']:.1f}s wall")
+    if result['storiesPerMinute'] is not None:
+        print(f"   Stories:        {result['stories']} ok, {result['storiesFailed']} failed, "
+              f"{result['storiesPerMinute']:.1f}/min")
+        print(f"   Story time:     {fmt(result['storySeconds'])} (p50 / p95 / p99)")
+    if result['imagesPerMinute'] is not None:
+        print(f"   Images:         {result['images']} ok, {result['imagesPerMinute']:.1f}/min")
+    if result['chatLatency']:
+        print(f"   Chat latency:   {fmt(result['chatLatency'])}")
+    if result['imageLatency']:
+        print(f"   Image latency:  {fmt(result['imageLatency'])}")
+    print(f"   Retries:        {result['retries']} ({result['injectedErrors']} injected 500s, "
+          f"{result['injected429s']} injected 429s), {result['failedCalls']} call(s) failed for good")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the generator end to end against the local mock provider')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='Scenarios to run (default: all)')
+    parser.add_argument('--stories', type=int, default=12, help='Stories per scenario (default: 12)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Stories generated (or refreshed) in parallel (default: 4)')
+    parser.add_argument('--image-concurrency', type=int, default=4, help='Images generated in parallel per story (default: 4)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for 429/5xx errors, passed to the generator (default: 5)')
+    parser.add_argument('--stream', action='store_true', help='Generate stories with --stream')
+    parser.add_argument('--no-optimise', action='store_true', help='Skip creating image variants (measure API throughput only)')
+    parser.add_argument('--json', help='Also write the results to this JSON file, e.g. to compare runs')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated stories and the work directory with logs')
+    add_fault_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server, base_url = start_background(**fault_options(args))
+    work_dir = Path(tempfile.mkdtemp(prefix='cyoa-benchmark-'))
+    existing = {p.name for p in STORIES_DIR.iterdir()} if STORIES_DIR.exists() else set()
+    print(f'⏱  Benchmarking against mock provider at {base_url}')
+    print(f'   {args.stories} stories per scenario, concurrency {args.concurrency}, '
+          f'latency {args.latency}s chat / {args.image_latency}s image, error rate {args.error_rate:.0%}'
+          f'{f", 429 bursts every {args.rate_limit_every}s" if args.rate_limit_every else ""}')
+    results = []
+    try:
+        for scenario in args.scenarios:
+            result = run_scenario(args, scenario, base_url, work_dir, server.provider)
+            results.append(result)
+            print_result(result)
+    finally:
+        server.shutdown()
+        if not args.keep:
+            for path in STORIES_DIR.iterdir():
+                if path.name not in existing and path.name.startswith('benchmark-'):
+                    shutil.rmtree(path, ignore_errors=True)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f'\n📁 Logs and reports kept in {work_dir}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'options': vars(args), 'results': results},
+                      f, indent=2)
+        print(f'\n✓ Results written to {args.json}')
+    if any(r['storiesFailed'] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-story checkpoints so an interrupted generation can be resumed.
+
+The checkpoint lives in the story's build directory (stories/.staging/<storyId>.<job>/,
+see story_staging.py) under .checkpoint/ and records which stages have completed:
+    response.json  - the generated story (after metadata/style kit post-processing)
+    manifest.json  - storyId, the build options, node files written and images saved so far
+It is removed once the story has been published. `generate_story.py --resume <storyId>`
+loads it and skips every stage that is already done.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+CHECKPOINT_DIRNAME = '.checkpoint'
+
+
+def _write_json_atomic(path: Path, data: Any) -> None:
+    tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """Tracks completed generation stages for one story directory"""
+
+    def __init__(self, story_dir: Path, manifest: Optional[Dict[str, Any]] = None):
+        self.story_dir = Path(story_dir)
+        self.dir = self.story_dir / CHECKPOINT_DIRNAME
+        self.manifest = manifest or {'version': 1, 'storyId': self.story_dir.name, 'nodes': [], 'images': {}}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def exists(cls, story_dir: Path) -> bool:
+        return (Path(story_dir) / CHECKPOINT_DIRNAME / 'manifest.json').exists()
+
+    @classmethod
+    def start(cls, story_dir: Path, story_data: Dict[str, Any],
+              options: Optional[Dict[str, Any]] = None) -> 'Checkpoint':
+        """Record the generated story, and the options it is built with, as the first completed stage"""
+        checkpoint = cls(story_dir)
+        checkpoint.manifest['storyId'] = story_data['metadata']['storyId']
+        checkpoint.manifest['options'] = dict(options or {})
+        checkpoint.dir.mkdir(parents=True, exist_ok=True)
+        _write_json_atomic(checkpoint.dir / 'response.json', story_data)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, story_dir: Path) -> 'Checkpoint':
+        """Load an existing checkpoint; raises FileNotFoundError if there is none"""
+        manifest_path = Path(story_dir) / CHECKPOINT_DIRNAME / 'manifest.json'
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return cls(story_dir, json.load(f))
+
+    def load_story_data(self) -> Dict[str, Any]:
+        """Return the checkpointed story with textFile/image entries restored for completed work"""
+        with open(self.dir / 'response.json', 'r', encoding='utf-8') as f:
+            story_data = json.load(f)
+        for node_id, node_data in story_data.get('nodes', {}).items():
+            if self.node_done(node_id):
+                node_data['textFile'] = f'nodes/{node_id}.txt'
+            if self.image_done(node_id):
+                node_data['image'] = self.manifest['images'][node_id]
+        return story_data
+
+    def save(self) -> None:
+        with self._lock:
+            self.manifest['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            _write_json_atomic(self.dir / 'manifest.json', self.manifest)
+
+    def node_done(self, node_id: str) -> bool:
+        return node_id in self.manifest['nodes'] and (self.story_dir / 'nodes' / f'{node_id}.txt').exists()
+
+    def image_done(self, node_id: str) -> bool:
+        path = self.manifest['images'].get(node_id)
+        return bool(path) and (self.story_dir / path).exists()
+
+    def mark_nodes(self, node_ids) -> None:
+        with self._lock:
+            known = set(self.manifest['nodes'])
+            self.manifest['nodes'].extend(n for n in node_ids if n not in known)
+        self.save()
+
+    def mark_image(self, node_id: str, image_path: str) -> None:
+        with self._lock:
+            self.manifest['images'][node_id] = image_path
+        self.save()
+
+    def complete(self, story_dir: Optional[Path] = None) -> None:
+        """
+        All stages are done and the story is published; the checkpoint is no longer needed.
+        story_dir is where the story lives now, if it was moved since the checkpoint was made.
+        """
+        directory = Path(story_dir) / CHECKPOINT_DIRNAME if story_dir is not None else self.dir
+        shutil.rmtree(directory, ignore_errors=True)
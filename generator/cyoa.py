@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the generator scripts.
+
+Usage:
+    python cyoa.py generate --api-key KEY --system-prompt system-prompt.txt --user-prompt my-story.txt
+    python cyoa.py images --api-key KEY --story-id STORY_ID
+    python cyoa.py proofread [STORY_ID]
+    python cyoa.py publish STORY_ID [--force]
+    python cyoa.py validate --story-id STORY_ID | --all
+    python cyoa.py telemetry summary [--runs 20]
+    python cyoa.py benchmark [--stories 12 --latency 1 --error-rate 0.05]
+    python cyoa.py check-startup [--budget-ms 150]
+
+Each command takes the arguments of the script it runs (`python cyoa.py generate --help`).
+Only the module of the chosen command is imported, and provider SDKs (openai,
+requests) are imported inside the code that calls the API, so --help, dry runs and
+local commands start without paying for them. check-startup keeps it that way: it
+imports every command module in a fresh interpreter and fails if one of them loads
+a heavy SDK at import time or goes over the import-time budget.
+"""
+import importlib
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+
+SCRIPT_DIR = Path(__file__).parent
+
+# command -> (module, description); modules are imported only when their command runs.
+# Commands without a module are implemented here.
+COMMANDS = {
+    'generate': ('generate_story', 'Generate a story from a system and user prompt'),
+    'images': ('generate_images', 'Generate or refresh the images of an existing story'),
+    'proofread': ('proofread_story', 'Approve a story node by node and publish it'),
+    'publish': (None, 'Add a validated story to stories/index.json without proofreading'),
+    'validate': ('story_validation', 'Check the structure of stories on disk'),
+    'telemetry': ('telemetry', 'Summarise API call and pipeline stage timings across runs'),
+    'benchmark': ('benchmark', 'Measure generator throughput end to end against the local mock provider'),
+    'check-startup': (None, 'Fail if a command module loads a heavy SDK or imports too slowly'),
+}
+
+# Packages that must only be imported by code paths that actually need them
+HEAVY_MODULES = ('openai', 'httpx', 'requests', 'PIL', 'PySide6')
+DEFAULT_BUDGET_MS = 150
+
+
+def publish_command(argv) -> int:
+    import argparse
+    from proofread_story import STORIES_DIR, publish_story
+    from story_validation import validate_story
+
+    parser = argparse.ArgumentParser(prog='cyoa.py publish', description=COMMANDS['publish'][1])
+    parser.add_argument('story_id', help='Story ID (folder name in stories/)')
+    parser.add_argument('--force', action='store_true', help='Publish even if validation finds problems')
+    args = parser.parse_args(argv)
+
+    story_json_path = STORIES_DIR / args.story_id / 'story.json'
+    if not story_json_path.exists():
+        print(f"Error: {story_json_path} not found.")
+        return 1
+    with open(story_json_path, 'r', encoding='utf-8') as f:
+        story = json.load(f)
+    issues = validate_story(story, story_json_path.parent)
+    if issues:
+        print(f'{"⚠️ " if args.force else "✗"} {args.story_id}: {len(issues)} problem(s)')
+        for issue in issues:
+            print(f'   - {issue}')
+        if not args.force:
+            print('Fix them (or proofread the story), or publish anyway with --force.')
+            return 1
+    return 0 if publish_story(args.story_id, story) else 1
+
+
+def measure_import(module: str) -> tuple:
+    """Import module in a fresh interpreter; returns (cumulative microseconds, heavy packages loaded)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    total = 0
+    heavy = set()
+    for line in result.stderr.splitlines():
+        # "import time: self | cumulative | name", nested imports indented under their importer
+        m = re.match(r'import time:\s*\d+ \|\s*(\d+) \| ( *)(\S+)', line)
+        if not m:
+            continue
+        name = m.group(3)
+        if name.split('.')[0] in HEAVY_MODULES:
+            heavy.add(name.split('.')[0])
+        if name == module and not m.group(2):
+            total = int(m.group(1))
+    return total, sorted(heavy)
+
+
+def check_startup(argv) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='cyoa.py check-startup', description=COMMANDS['check-startup'][1])
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Maximum import time per command module in milliseconds (default: {DEFAULT_BUDGET_MS})')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for module in ['cyoa'] + [m for m, _ in COMMANDS.values() if m]:
+        try:
+            micros, heavy = measure_import(module)
+        except RuntimeError as e:
+            print(f'✗ {module}: {e}')
+            failed += 1
+            continue
+        ms = micros / 1000
+        problems = []
+        if heavy:
+            problems.append(f'imports {", ".join(heavy)}')
+        if ms > args.budget_ms:
+            problems.append(f'over budget ({args.budget_ms:.0f} ms)')
+        print(f'{"✗" if problems else "✓"} {module}: {ms:.1f} ms{" - " + "; ".join(problems) if problems else ""}')
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+def print_usage() -> None:
+    print('Usage: python cyoa.py <command> [arguments]\n')
+    print('Commands:')
+    for name, (_, description) in COMMANDS.items():
+        print(f'  {name:<14} {description}')
+    print('\nRun "python cyoa.py <command> --help" for the arguments of a command.')
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print_usage()
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f'Error: unknown command "{command}"\n')
+        print_usage()
+        return 2
+    if command == 'publish':
+        return publish_command(rest)
+    if command == 'check-startup':
+        return check_startup(rest)
+    module = importlib.import_module(COMMANDS[command][0])
+    # Scripts that report failure through sys.exit keep doing so
+    return module.main(rest) or 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print('\n\n❌ Cancelled by user')
+        sys.exit(1)
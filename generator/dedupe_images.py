@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Find visually duplicate story images with a perceptual hash.
+
+Every node image referenced from stories/*/story.json gets a 64-bit difference
+hash (dHash). Each group has one kept image, and every image within --threshold
+bits of that image (not of another member) joins its group, so chains of slightly
+different images never merge into one group. Hashes are kept in an index (keyed on
+file size and mtime) so later runs only hash new or changed files.
+
+--link only replaces exact duplicates (byte-identical files) with hard links to
+the kept image, and re-encodes the image variants of the nodes it replaced. Images
+that are merely similar, including ones with an identical hash (a 64-bit dHash can
+collide for different pictures), are reported, never linked.
+
+Usage:
+    python dedupe_images.py                  # report duplicate groups
+    python dedupe_images.py --threshold 0    # only near-identical images
+    python dedupe_images.py --link           # replace exact duplicates with hard links to one copy
+
+Requires Pillow (pip install Pillow).
+"""
+import argparse
+import filecmp
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from image_queue import load_story, save_story
+from image_store import link_or_copy
+from optimise_images import optimise_story_nodes
+
+
+STORIES_DIR = Path(__file__).parent.parent / 'stories'
+DEFAULT_INDEX = Path(__file__).parent / '.cache' / 'phash-index.json'
+
+
+def dhash(path: Path, hash_size: int = 8) -> int:
+    """Difference hash: compare neighbouring pixels of a small greyscale thumbnail"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.draft('L', (hash_size * 16, hash_size * 16))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def story_images(stories_dir: Path = STORIES_DIR) -> Dict[Path, Tuple[Path, str]]:
+    """All node images referenced from story.json files -> (story directory, node ID)"""
+    images = {}
+    for story_dir in sorted(p for p in stories_dir.iterdir() if p.is_dir() and not p.name.startswith('.')):
+        story_json = story_dir / 'story.json'
+        if not story_json.exists():
+            continue
+        with open(story_json, 'r', encoding='utf-8') as f:
+            story = json.load(f)
+        for node_id, node in story.get('nodes', {}).items():
+            if node.get('image') and (story_dir / node['image']).exists():
+                images[story_dir / node['image']] = (story_dir, node_id)
+    return images
+
+
+def load_index(path: Path) -> Dict[str, dict]:
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            pass
+    return {}
+
+
+def save_index(path: Path, index: Dict[str, dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1)
+
+
+def hash_images(paths: List[Path], index: Dict[str, dict]) -> Dict[Path, int]:
+    """Perceptual hash per image, reusing index entries whose size and mtime still match"""
+    hashes = {}
+    for path in paths:
+        st = path.stat()
+        entry = index.get(str(path))
+        if not entry or entry.get('size') != st.st_size or entry.get('mtime') != st.st_mtime_ns:
+            entry = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'dhash': f'{dhash(path):016x}'}
+            index[str(path)] = entry
+        hashes[path] = int(entry['dhash'], 16)
+    return hashes
+
+
+def find_duplicate_groups(hashes: Dict[Path, int], threshold: int = 4) -> List[List[Path]]:
+    """
+    Groups of images within threshold bits of the group's first (kept) image.
+    Members are compared with the kept image only, never through each other.
+    """
+    remaining = sorted(hashes)
+    groups = []
+    while remaining:
+        keep, rest = remaining[0], remaining[1:]
+        group = [keep] + [p for p in rest if hamming(hashes[keep], hashes[p]) <= threshold]
+        if len(group) > 1:
+            groups.append(group)
+        members = set(group)
+        remaining = [p for p in rest if p not in members]
+    return groups
+
+
+def is_exact_duplicate(keep: Path, dup: Path) -> bool:
+    """Safe to link: byte for byte the same file as the kept image"""
+    return filecmp.cmp(keep, dup, shallow=False)
+
+
+def refresh_variants(linked: Dict[Path, set]) -> None:
+    """Re-encode the variants of nodes whose image was replaced by a link"""
+    for story_dir, node_ids in linked.items():
+        story = load_story(story_dir)
+        nodes = story.get('nodes', {})
+        node_ids = {n for n in node_ids if nodes.get(n, {}).get('imageVariants')}
+        if node_ids and optimise_story_nodes(story_dir, nodes, node_ids, replaced=node_ids):
+            save_story(story_dir, story)
+            print(f'   ✓ Re-encoded variants of {len(node_ids)} image(s) in {story_dir.name}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Find visually duplicate images across stories')
+    parser.add_argument('--threshold', type=int, default=4, help='Maximum differing hash bits to count as a duplicate (default: 4)')
+    parser.add_argument('--link', action='store_true', help='Replace exact duplicates with hard links to the first image in each group')
+    parser.add_argument('--index', default=str(DEFAULT_INDEX), help='Perceptual hash index file (default: generator/.cache/phash-index.json)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if importlib.util.find_spec('PIL') is None:
+        print('Error: Pillow is required (pip install Pillow)')
+        sys.exit(1)
+
+    index_path = Path(args.index)
+    index = load_index(index_path)
+    images = story_images()
+    print(f'🔍 Hashing {len(images)} images...')
+    hashes = hash_images(images, index)
+    # Drop entries for images that no longer exist
+    save_index(index_path, {k: v for k, v in index.items() if Path(k) in hashes})
+
+    groups = find_duplicate_groups(hashes, args.threshold)
+    if not groups:
+        print('✓ No duplicate images found')
+        return
+
+    saved = 0
+    skipped = 0
+    linked: Dict[Path, set] = {}
+    for group in groups:
+        keep = group[0]
+        print(f'\n{len(group)} duplicates of {keep.relative_to(STORIES_DIR)}:')
+        for dup in group[1:]:
+            distance = hamming(hashes[keep], hashes[dup])
+            print(f'   - {dup.relative_to(STORIES_DIR)} (distance {distance})')
+            if not args.link or os.path.samefile(keep, dup):
+                continue
+            if not is_exact_duplicate(keep, dup):
+                skipped += 1
+                continue
+            saved += dup.stat().st_size
+            link_or_copy(keep, dup)
+            story_dir, node_id = images[dup]
+            linked.setdefault(story_dir, set()).add(node_id)
+    print(f'\n{len(groups)} duplicate groups, {sum(len(g) - 1 for g in groups)} redundant images')
+    if args.link:
+        refresh_variants(linked)
+        print(f'✓ Linked exact duplicates, {saved / 1024 / 1024:.1f} MB freed')
+        if skipped:
+            print(f'   {skipped} similar but not identical image(s) left as they are')
+
+
+if __name__ == '__main__':
+    main()
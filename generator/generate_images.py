@@ -6,55 +6,82 @@ Usage:
     python generate_images.py --api-key YOUR_KEY --story-id STORY_ID [--image-model dall-e-3] [--image-quality standard] [--image-frequency start-end-endings]
 
 - STORY_ID: The folder name in 'stories/' (e.g., 'historical-sherlock-holmes')
-- Only generates images for nodes that do not already have images.
-- Updates story.json with image paths.
+- Generates images for nodes that have none, and regenerates images whose
+  fingerprint (the image prompt built from the node's opening sentence and the
+  styleKit, plus image model/quality) has changed.
+- Use --dry-run to list what would be (re)built without calling the API.
+- Use --base-url to point at mock_provider.py for offline runs.
+- Updates story.json with image paths and fingerprints.
 """
 import argparse
 import json
 import os
 from pathlib import Path
-from openai import OpenAI
-import requests
+from api_scheduler import add_scheduler_args, scheduler_from_args
+from image_io import RESPONSE_FORMATS, build_image_prompt, fetch_image, image_fingerprint
+from optimise_images import optimise_story_nodes
+from image_store import ImageStore, DEFAULT_STORE_DIR
+from telemetry import add_telemetry_args, telemetry_from_args, stage
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Generate images for an existing CYOA story')
-    parser.add_argument('--api-key', required=True, help='Your OpenAI API key')
+    parser.add_argument('--api-key', help='Your OpenAI API key (not needed with --dry-run)')
+    parser.add_argument('--base-url', default=None, help='API base URL, e.g. http://127.0.0.1:8765/v1 for mock_provider.py')
     parser.add_argument('--story-id', required=True, help='Story ID (folder name in stories/)')
     parser.add_argument('--image-model', default='dall-e-3', help='Image model to use (default: dall-e-3)')
     parser.add_argument('--image-quality', default='standard', choices=['standard','hd'], help='Image quality for dall-e-3 (standard or hd)')
     parser.add_argument('--image-frequency', default='start-end-endings', choices=['all','start-end','start-end-endings'], help='Which nodes get images')
-    return parser.parse_args()
+    parser.add_argument('--image-response-format', default='b64_json', choices=RESPONSE_FORMATS, help='Receive images inline as base64 (one round trip) or as URLs to download (default: b64_json)')
+    parser.add_argument('--image-cache-dir', default=str(DEFAULT_STORE_DIR), help='Store of generated images reused for identical prompts (default: generator/.cache/images)')
+    parser.add_argument('--no-image-cache', action='store_true', help='Always call the image API, even for a prompt generated before')
+    parser.add_argument('--no-optimise', action='store_true', help='Do not create compressed multi-size image variants')
+    parser.add_argument('--dry-run', action='store_true', help='List the images that would be generated or rebuilt, then exit')
+    parser.add_argument('--force', action='store_true', help='Regenerate every target image with a fresh API call, even if its fingerprint is unchanged')
+    add_scheduler_args(parser)
+    add_telemetry_args(parser)
+    args = parser.parse_args(argv)
+    if not args.api_key and not args.dry_run:
+        parser.error('--api-key is required unless --dry-run is used')
+    return args
 
-def build_image_prompt(node_text, style_kit):
-    scene = node_text.split('.')[0][:80]
-    character = style_kit.get('character', 'a child')
-    art = style_kit.get('artStyle', "children's book illustration")
-    return f"{character} in {art}. Scene: {scene}. Mood: cheerful. Children's book illustration. No text."
-
-def generate_image(client, prompt, model, quality='standard'):
-    params = {
-        'model': model,
-        'prompt': prompt,
-        'n': 1,
-        'size': '1024x1024',
-        'style': 'vivid',
-    }
-    if model == 'dall-e-3':
-        params['quality'] = quality
-    response = client.images.generate(**params)
-    return response.data[0].url
+def target_node_ids(nodes, frequency):
+    """Node IDs that get images for the given --image-frequency"""
+    ending_nodes = {nid for nid, nd in nodes.items() if not nd.get('choices')}
+    if frequency in ['start-end','start-end-endings']:
+        return {'start'} | ending_nodes
+    return set(nodes.keys())
 
-def download_image(url, directory, filename):
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    filepath = directory / filename
-    with open(filepath, 'wb') as f:
-        f.write(response.content)
-    return filepath
+def plan_images(story_dir, nodes, target_nodes, style_kit, model, quality, force=False):
+    """
+    Decide which target nodes need a (new) image.
+    Returns (to_build, adopted): to_build is a list of (node_id, reason, node_text, fingerprint);
+    adopted maps nodes with an existing image but no recorded fingerprint to their current one,
+    so they are tracked from now on without being regenerated.
+    """
+    to_build = []
+    adopted = {}
+    for node_id in sorted(target_nodes):
+        node = nodes[node_id]
+        text_file = story_dir / node['textFile']
+        if not text_file.exists():
+            print(f"✗ {node_id}: Text file missing, skipping.")
+            continue
+        with open(text_file, 'r', encoding='utf-8') as tf:
+            node_text = tf.read()
+        fingerprint = image_fingerprint(build_image_prompt(node_text, style_kit), model, quality)
+        has_image = 'image' in node and (story_dir / node['image']).exists()
+        if not has_image:
+            to_build.append((node_id, 'missing', node_text, fingerprint))
+        elif force:
+            to_build.append((node_id, 'forced', node_text, fingerprint))
+        elif not node.get('imageFingerprint'):
+            adopted[node_id] = fingerprint
+        elif node['imageFingerprint'] != fingerprint:
+            to_build.append((node_id, 'changed', node_text, fingerprint))
+    return to_build, adopted
 
-def main():
-    args = parse_args()
-    client = OpenAI(api_key=args.api_key)
+def main(argv=None):
+    args = parse_args(argv)
     script_dir = Path(__file__).parent
     stories_dir = script_dir.parent / 'stories'
     story_dir = stories_dir / args.story_id
@@ -67,42 +94,59 @@ def main():
         story = json.load(f)
     style_kit = story['metadata'].get('styleKit', {'character':'a child','artStyle':"children's book illustration"})
     nodes = story['nodes']
-    # Determine which nodes get images
-    ending_nodes = {nid for nid, nd in nodes.items() if not nd.get('choices')}
-    target_nodes = set()
-    if args.image_frequency == 'all':
-        target_nodes = set(nodes.keys())
-    elif args.image_frequency in ['start-end','start-end-endings']:
-        target_nodes.add('start')
-        target_nodes |= ending_nodes
-    else:
-        target_nodes = set(nodes.keys())
+    target_nodes = target_node_ids(nodes, args.image_frequency)
+    to_build, adopted = plan_images(story_dir, nodes, target_nodes, style_kit,
+                                    args.image_model, args.image_quality, args.force)
+    up_to_date = len(target_nodes) - len(to_build)
+    if args.dry_run:
+        for node_id, reason, _, _ in to_build:
+            print(f"→ {node_id}: would {'generate' if reason == 'missing' else 'rebuild'} ({reason})")
+        for node_id in sorted(adopted):
+            print(f"• {node_id}: existing image has no fingerprint; it would be recorded, not rebuilt")
+        print(f"{len(to_build)} to build, {up_to_date} up to date.")
+        return
+
+    from openai import OpenAI
+
+    recorder = telemetry_from_args(args, 'generate_images')
+    scheduler = scheduler_from_args(args, recorder)
+    client = scheduler.wrap(OpenAI(api_key=args.api_key, base_url=args.base_url, max_retries=0))
+    store = None if args.no_image_cache else ImageStore(Path(args.image_cache_dir))
     images_dir.mkdir(parents=True, exist_ok=True)
     updated = False
-    for node_id in target_nodes:
-        node = nodes[node_id]
-        if 'image' in node and (story_dir / node['image']).exists():
-            print(f"✓ {node_id}: Image already exists, skipping.")
-            continue
-        # Load node text
-        text_file = story_dir / node['textFile']
-        if not text_file.exists():
-            print(f"✗ {node_id}: Text file missing, skipping.")
-            continue
-        with open(text_file, 'r', encoding='utf-8') as tf:
-            node_text = tf.read()
-        prompt = build_image_prompt(node_text, style_kit)
-        print(f"→ Generating image for {node_id}...")
-        try:
-            url = generate_image(client, prompt, args.image_model, args.image_quality)
-            img_path = download_image(url, images_dir, f'{node_id}.jpg')
-            node['image'] = f'images/{node_id}.jpg'
-            print(f"  ✓ Saved: images/{node_id}.jpg")
-            updated = True
-        except Exception as e:
-            print(f"  ✗ Failed: {e}")
+    for node_id, fingerprint in adopted.items():
+        nodes[node_id]['imageFingerprint'] = fingerprint
+        updated = True
+    if up_to_date:
+        print(f"✓ {up_to_date} image(s) up to date, skipping.")
+    new_images = set()
+    with stage('images', recorder):
+        for node_id, reason, node_text, fingerprint in to_build:
+            node = nodes[node_id]
+            prompt = build_image_prompt(node_text, style_kit)
+            print(f"→ {'Generating' if reason == 'missing' else 'Rebuilding'} image for {node_id} ({reason})...")
+            try:
+                fetch_image(client, prompt, args.image_model, images_dir, f'{node_id}.jpg',
+                            quality=args.image_quality, response_format=args.image_response_format,
+                            scheduler=scheduler, store=None if args.force else store)
+                node['image'] = f'images/{node_id}.jpg'
+                node['imageFingerprint'] = fingerprint
+                print(f"  ✓ Saved: images/{node_id}.jpg")
+                new_images.add(node_id)
+                updated = True
+            except Exception as e:
+                print(f"  ✗ Failed: {e}")
+    if not args.no_optimise:
+        # New images, plus any older ones that never had variants made
+        pending = {nid for nid, nd in nodes.items() if nd.get('image') and not nd.get('imageVariants')}
+        if new_images | pending:
+            print("→ Creating compressed image variants...")
+            with stage('optimise', recorder):
+                # Rebuilt images may be store links older than their stale variants
+                if optimise_story_nodes(story_dir, nodes, new_images | pending, replaced=new_images):
+                    updated = True
     if updated:
-        with open(story_json_path, 'w', encoding='utf-8') as f:
+        with stage('story-json', recorder), open(story_json_path, 'w', encoding='utf-8') as f:
             json.dump(story, f, indent=2, ensure_ascii=False)
         print(f"✓ Updated {story_json_path}")
     else:
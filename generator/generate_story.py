@@ -7,19 +7,35 @@ Generates a complete Choose Your Own Adventure story using OpenAI API
 
 Usage:
     python generate_story.py --api-key YOUR_KEY --system-prompt path/to/system.txt --user-prompt path/to/story.txt [--model gpt-4o] [--image-model dall-e-3] [--skip-images]
+    python generate_story.py --api-key YOUR_KEY --system-prompt path/to/system.txt --user-prompts 'prompts/*.txt' [--batch-concurrency 3]
 """
 
+from __future__ import annotations
+
 import argparse
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any
-import requests
-from openai import OpenAI
+from typing import TYPE_CHECKING, Dict, Any, Callable, Optional
+from story_stream import StreamingStoryParser
+from llm_cache import ResponseCache, DEFAULT_CACHE_DIR
+from api_scheduler import add_scheduler_args, scheduler_from_args
+from checkpoint import Checkpoint
+from story_staging import (staging_root, new_staging_dir, publish, discard, find_resumable, clean_stale,
+                           restore_swapped)
+from story_validation import validate_and_repair, story_metrics, score_story
+from image_io import RESPONSE_FORMATS, build_image_prompt, fetch_image, image_fingerprint
+from optimise_images import optimise_story_nodes
+from image_store import ImageStore, DEFAULT_STORE_DIR
+from telemetry import add_telemetry_args, telemetry_from_args, recorder_of, stage, carry_stage
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
-def parse_args():
+def parse_args(argv=None):
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
         description='Generate CYOA stories using OpenAI API',
@@ -32,21 +48,93 @@ Examples:
   # Generate story structure only (no images)
   python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompt my-story.txt --skip-images
 
+  # Stream the response, writing node files as they arrive
+  python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompt my-story.txt --stream
+
+  # Large story: outline first, then expand nodes in parallel batches
+  python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompt my-story.txt --outline --expand-batch-size 10
+
+  # Re-use cached responses for prompts that were generated before (e.g. to iterate on images)
+  python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompt my-story.txt --cache
+
+  # Re-run the same prompts offline from cached responses (e.g. to debug post-processing); no images are generated
+  python generate_story.py --system-prompt system-prompt.txt --user-prompt my-story.txt --replay
+
+  # Batch: one story per prompt file, 4 at a time, no interactive prompts
+  python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompts prompts-archive/ --batch-concurrency 4
+
+  # Resume a generation that was interrupted (e.g. during image generation)
+  python generate_story.py --api-key sk-... --resume my-story-id
+
   # Use GPT-4 Turbo
   python generate_story.py --api-key sk-... --system-prompt system-prompt.txt --user-prompt my-story.txt --model gpt-4-turbo
         """
     )
     
-    parser.add_argument('--api-key', required=True, help='Your OpenAI API key')
-    parser.add_argument('--system-prompt', required=True, help='Path to system prompt file (instructions for AI)')
-    parser.add_argument('--user-prompt', required=True, help='Path to user prompt file (your story outline)')
+    parser.add_argument('--api-key', help='Your OpenAI API key (not needed with --replay)')
+    parser.add_argument('--base-url', default=None, help='API base URL, e.g. http://127.0.0.1:8765/v1 for mock_provider.py')
+    parser.add_argument('--system-prompt', help='Path to system prompt file (instructions for AI)')
+    prompt_group = parser.add_mutually_exclusive_group()
+    prompt_group.add_argument('--user-prompt', help='Path to user prompt file (your story outline)')
+    prompt_group.add_argument('--user-prompts', help='Batch mode: directory or glob of prompt files, one story per file')
+    prompt_group.add_argument('--resume', metavar='STORY_ID', help='Resume an interrupted generation from its checkpoint, skipping completed stages')
+    parser.add_argument('--overwrite', action='store_true', help='Replace stories/<storyId>/ if a story with the same ID is already published')
+    parser.add_argument('--batch-concurrency', type=int, default=3, help='Stories generated in parallel in batch mode (default: 3)')
+    parser.add_argument('--report', default='batch-report.json', help='Where batch mode writes its summary report (default: batch-report.json)')
     parser.add_argument('--model', default='gpt-4o-mini', help='OpenAI model to use (default: gpt-4o-mini)')
     parser.add_argument('--image-model', default='dall-e-3', help='Image model to use (default: dall-e-3). Alternatives: dall-e-2')
     parser.add_argument('--image-quality', default='standard', choices=['standard','hd'], help='Image quality for dall-e-3 (standard or hd)')
     parser.add_argument('--image-frequency', default='start-end-endings', choices=['all','start-end','start-end-endings'], help='Which nodes get images')
+    parser.add_argument('--image-response-format', default='b64_json', choices=RESPONSE_FORMATS, help='Receive images inline as base64 (one round trip) or as URLs to download (default: b64_json)')
+    parser.add_argument('--image-cache-dir', default=str(DEFAULT_STORE_DIR), help='Store of generated images reused for identical prompts (default: generator/.cache/images)')
+    parser.add_argument('--no-image-cache', action='store_true', help='Always call the image API, even for a prompt generated before')
+    parser.add_argument('--image-concurrency', type=int, default=4, help='Maximum number of images generated in parallel (default: 4)')
     parser.add_argument('--skip-images', action='store_true', help='Skip image generation (faster, cheaper)')
+    parser.add_argument('--no-optimise', action='store_true', help='Do not create compressed multi-size image variants')
+    parser.add_argument('--stream', action='store_true', help='Stream the story response and write node files as soon as each node arrives')
+    add_scheduler_args(parser)
+    add_telemetry_args(parser)
+    parser.add_argument('--cache-dir', default=str(DEFAULT_CACHE_DIR), help='Directory for cached LLM responses (default: generator/.cache/llm)')
+    parser.add_argument('--cache-max-mb', type=int, default=200, help='Evict least recently used cached responses beyond this size (default: 200)')
+    parser.add_argument('--cache', action='store_true', help='Serve requests made before from cached responses instead of calling the API')
+    parser.add_argument('--no-cache', action='store_true', help='Do not record responses in the cache')
+    parser.add_argument('--replay', action='store_true', help='Serve LLM responses only from the cache (no network); implies --skip-images')
+    parser.add_argument('--outline', action='store_true', help='Generate an outline first, then expand node text in parallel batches (for large stories)')
+    parser.add_argument('--expand-batch-size', type=int, default=8, help='Nodes expanded per request in --outline mode (default: 8)')
+    parser.add_argument('--expand-concurrency', type=int, default=4, help='Expansion requests run in parallel in --outline mode (default: 4)')
+    parser.add_argument('--candidates', type=int, default=1, help='Generate this many stories in parallel and keep the best by graph metrics (default: 1)')
+    parser.add_argument('--repair-attempts', type=int, default=2, help='Requests allowed to repair broken or missing nodes in the generated story (default: 2, 0 to fail on any problem)')
     
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if not args.api_key and not args.replay:
+        parser.error('--api-key is required unless --replay is used')
+    if args.no_cache and (args.cache or args.replay):
+        parser.error('--no-cache cannot be combined with --cache or --replay')
+    if not args.resume:
+        if not args.system_prompt:
+            parser.error('--system-prompt is required')
+        if not args.user_prompt and not args.user_prompts:
+            parser.error('one of --user-prompt or --user-prompts is required')
+    else:
+        restore_build_options(parser, args)
+    return args
+
+
+# Options that decide what a build produces; recorded in the checkpoint and restored by --resume
+BUILD_OPTIONS = ('image_model', 'image_quality', 'image_frequency', 'skip_images', 'no_optimise')
+
+
+def restore_build_options(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Resume with the options the build was started with; an explicit different value is an error"""
+    resume_dir = find_resumable(Path(__file__).parent.parent / 'stories', args.resume)
+    if resume_dir is None:
+        return  # reported by create_story()
+    for name, value in Checkpoint.load(resume_dir).manifest.get('options', {}).items():
+        current = getattr(args, name, value)
+        if current != value and current != parser.get_default(name):
+            parser.error(f'--{name.replace("_", "-")} {current} conflicts with the checkpoint of {args.resume} '
+                         f'({value}); resume with the options the build was started with')
+        setattr(args, name, value)
 
 
 def load_prompt_file(filepath: str) -> str:
@@ -62,27 +150,82 @@ def load_prompt_file(filepath: str) -> str:
         sys.exit(1)
 
 
-def generate_story(client: OpenAI, system_prompt: str, user_prompt: str, model: str) -> Dict[str, Any]:
-    """Generate story using OpenAI chat completion"""
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.8,
-            response_format={"type": "json_object"}
-        )
-        
+def chat_completion(client: OpenAI, model: str, messages, temperature: float = 0.8,
+                    response_format: Optional[Dict[str, Any]] = None,
+                    cache: Optional[ResponseCache] = None,
+                    on_delta: Optional[Callable[[str], None]] = None,
+                    cache_salt: Optional[str] = None) -> str:
+    """
+    Run a chat completion and return the message content.
+    Responses are served from / stored in the cache when one is given; cache_salt
+    gives otherwise identical requests (parallel candidates) their own entries.
+    With on_delta the response is streamed and each piece of text is passed to on_delta
+    (a cached response is delivered as a single piece).
+    """
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(model, messages, temperature, response_format, cache_salt)
+        content = cache.get(key)
+        if content is not None:
+            if on_delta:
+                on_delta(content)
+            return content
+
+    params = {'model': model, 'messages': messages, 'temperature': temperature}
+    if response_format:
+        params['response_format'] = response_format
+    if on_delta:
+        parts = []
+        # include_usage adds a final chunk with token counts for telemetry
+        for chunk in client.chat.completions.create(stream=True, stream_options={'include_usage': True}, **params):
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_delta(parts[-1])
+        content = ''.join(parts)
+    else:
+        response = client.chat.completions.create(**params)
         content = response.choices[0].message.content
-        story_data = json.loads(content)
-        
-        # Validate the structure
-        if not story_data.get('metadata') or not story_data.get('nodes') or not story_data.get('nodes', {}).get('start'):
-            raise ValueError('Invalid story structure: missing metadata, nodes, or start node')
+
+    if cache is not None:
+        try:
+            if response_format and response_format.get('type') == 'json_object':
+                json.loads(content)  # never cache a malformed JSON response
+            cache.put(key, content, model)
+        except ValueError:
+            pass
+    return content
+
+
+def generate_story(client: OpenAI, system_prompt: str, user_prompt: str, model: str, stream: bool = False,
+                   on_node: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                   on_metadata: Optional[Callable[[Dict[str, Any]], None]] = None,
+                   cache: Optional[ResponseCache] = None, repair_attempts: int = 2,
+                   cache_salt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generate story using OpenAI chat completion.
+    With stream=True the response is parsed as it arrives and on_metadata/on_node
+    are called as soon as the metadata and each node object are complete.
+    The result is validated and broken nodes are re-requested (up to repair_attempts times).
+    """
+    content = ''
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        response_format = {"type": "json_object"}
+        if stream:
+            parser = StreamingStoryParser(on_node=on_node, on_metadata=on_metadata)
+            content = chat_completion(client, model, messages, 0.8, response_format, cache=cache,
+                                      on_delta=parser.feed, cache_salt=cache_salt)
+            story_data = parser.close()
+        else:
+            content = chat_completion(client, model, messages, 0.8, response_format, cache=cache,
+                                      cache_salt=cache_salt)
+            story_data = json.loads(content)
         
-        return story_data
+        return validate_and_repair(json_completer(client, model, cache), system_prompt, user_prompt,
+                                   story_data, repair_attempts)
     
     except json.JSONDecodeError as e:
         print(f"Error: Failed to parse AI response as JSON: {e}")
@@ -93,6 +236,120 @@ def generate_story(client: OpenAI, system_prompt: str, user_prompt: str, model:
         sys.exit(1)
 
 
+OUTLINE_INSTRUCTIONS = """
+
+OUTLINE MODE: Do not write the node text yet. Return ONLY a JSON object with the
+same "metadata" as usual and a "nodes" object mapping each node ID to an outline entry:
+  {"summary": "<one-line summary of what happens>", "choices": [{"text": "...", "nextNode": "<node ID>"}]}
+Ending nodes have an empty "choices" list. The first node must be "start"."""
+
+EXPAND_INSTRUCTIONS = """
+
+EXPANSION MODE: You are given the complete outline of the story and a list of node IDs.
+Write the full node for each requested ID only, following its summary and staying consistent
+with the rest of the outline. Return ONLY a JSON object of the form:
+  {"nodes": {"<node ID>": {"text": "<full node text>", "imagePrompt": "<image prompt>"}}}
+Do not change node IDs or choices."""
+
+
+def request_json_completion(client: OpenAI, model: str, messages, temperature: float = 0.8,
+                            cache: Optional[ResponseCache] = None, cache_salt: Optional[str] = None) -> Dict[str, Any]:
+    """Run a single JSON-mode chat completion and return the parsed object"""
+    content = chat_completion(client, model, messages, temperature, {"type": "json_object"}, cache=cache,
+                              cache_salt=cache_salt)
+    return json.loads(content)
+
+
+def json_completer(client: OpenAI, model: str,
+                   cache: Optional[ResponseCache] = None) -> Callable[[list], Dict[str, Any]]:
+    """request_json_completion bound to a client and model, for validate_and_repair"""
+    return lambda messages: request_json_completion(client, model, messages, cache=cache)
+
+
+def generate_outline(client: OpenAI, system_prompt: str, user_prompt: str, model: str,
+                     cache: Optional[ResponseCache] = None, cache_salt: Optional[str] = None) -> Dict[str, Any]:
+    """Phase 1 of --outline mode: generate metadata plus node IDs, choices and one-line summaries"""
+    outline = request_json_completion(client, model, [
+        {"role": "system", "content": system_prompt + OUTLINE_INSTRUCTIONS},
+        {"role": "user", "content": user_prompt}
+    ], cache=cache, cache_salt=cache_salt)
+    if not outline.get('metadata') or not outline.get('nodes') or 'start' not in outline.get('nodes', {}):
+        raise ValueError('Invalid outline structure: missing metadata, nodes, or start node')
+    return outline
+
+
+def expand_outline_batch(client: OpenAI, system_prompt: str, user_prompt: str, model: str,
+                         outline_json: str, node_ids, cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """Phase 2 of --outline mode: write the full text for one batch of outlined nodes"""
+    request = (
+        f"{user_prompt}\n\nStory outline:\n{outline_json}\n\n"
+        f"Write the full nodes for these IDs: {', '.join(node_ids)}"
+    )
+    result = request_json_completion(client, model, [
+        {"role": "system", "content": system_prompt + EXPAND_INSTRUCTIONS},
+        {"role": "user", "content": request}
+    ], cache=cache)
+    nodes = result.get('nodes', {})
+    return {nid: nodes[nid] for nid in node_ids if isinstance(nodes.get(nid), dict) and nodes[nid].get('text')}
+
+
+def generate_story_outlined(client: OpenAI, system_prompt: str, user_prompt: str, model: str,
+                            batch_size: int = 8, concurrency: int = 4,
+                            cache: Optional[ResponseCache] = None, repair_attempts: int = 2,
+                            cache_salt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generate a story in two phases so its size is not capped by a single completion:
+    an outline of the whole graph, then node text expanded in parallel batches with
+    the outline as shared context. Returns the same structure as generate_story().
+    """
+    try:
+        outline = generate_outline(client, system_prompt, user_prompt, model, cache=cache, cache_salt=cache_salt)
+        outline_nodes = outline['nodes']
+        print(f'   ✓ Outline: {len(outline_nodes)} nodes')
+        outline_json = json.dumps(outline, ensure_ascii=False)
+
+        expanded = {}
+        # Second round only re-requests nodes the model skipped in the first
+        for attempt in range(2):
+            missing = [nid for nid in outline_nodes if nid not in expanded]
+            if not missing:
+                break
+            batch_size = max(1, batch_size)
+            batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+            print(f'   Expanding {len(missing)} nodes in {len(batches)} batches...')
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+                futures = {
+                    executor.submit(carry_stage(expand_outline_batch), client, system_prompt, user_prompt, model,
+                                    outline_json, batch, cache): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    try:
+                        expanded.update(future.result())
+                    except Exception as e:
+                        print(f'   ✗ Failed to expand {", ".join(futures[future])}: {e}')
+        missing = [nid for nid in outline_nodes if nid not in expanded]
+        if missing:
+            raise ValueError(f'Nodes could not be expanded: {", ".join(missing)}')
+
+        story_data = {'metadata': outline['metadata'], 'nodes': {}}
+        for node_id, entry in outline_nodes.items():
+            story_data['nodes'][node_id] = {
+                'text': expanded[node_id]['text'],
+                'imagePrompt': expanded[node_id].get('imagePrompt', entry.get('summary', '')),
+                'choices': entry.get('choices', [])
+            }
+        return validate_and_repair(json_completer(client, model, cache), system_prompt, user_prompt,
+                                   story_data, repair_attempts)
+
+    except json.JSONDecodeError as e:
+        print(f"Error: Failed to parse AI response as JSON: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error generating story: {e}")
+        sys.exit(1)
+
+
 def extract_character_description(image_prompt: str) -> str:
     """
     Extract character description from an image prompt.
@@ -209,26 +466,6 @@ def build_style_kit(user_prompt: str, nodes: Dict[str, Any]) -> Dict[str, str]:
     return { 'character': character, 'artStyle': art_style, 'palette': palette }
 
 
-def first_sentence(text: str, max_words: int = 28) -> str:
-    """Extract a short scene description from the node text."""
-    if not text:
-        return ''
-    # Take up to the first sentence terminator or word cap
-    import re
-    m = re.split(r'(?:[.!?]\s)', text.strip(), maxsplit=1)
-    s = m[0] if m else text.strip()
-    words = s.split()
-    if len(words) > max_words:
-        s = ' '.join(words[:max_words])
-    return s
-
-
-def build_image_prompt(node_text: str, style_kit: Dict[str, str]) -> str:
-    scene = first_sentence(node_text)
-    character = style_kit.get('character','a child')
-    art = style_kit.get('artStyle', "children's book illustration")
-    return f"{character} in {art}. Scene: {scene}. Mood: cheerful. Children's book illustration. No text."
-
 def ensure_character_consistency(nodes: Dict[str, Any]) -> None:
     """
     Ensure all image prompts use the same character description.
@@ -275,38 +512,102 @@ def ensure_character_consistency(nodes: Dict[str, Any]) -> None:
                 node_data['imagePrompt'] = f"{character_desc} in {prompt}"
 
 
-def generate_image(client: OpenAI, prompt: str, model: str, quality: str = 'standard') -> str:
-    """Generate an image using DALL-E and return the URL"""
+def generate_node_image(client: OpenAI, node_id: str, node_data: Dict[str, Any], style_kit: Dict[str, str],
+                        images_dir: Path, model: str, quality: str, response_format: str = 'b64_json',
+                        store: Optional[ImageStore] = None) -> str:
+    """Generate and save the image for a single node, returning its relative path"""
+    # Build compact, consistent prompt from style kit + node text
+    node_text = node_data.get('text', '')
+    prompt_text = build_image_prompt(node_text, style_kit)
     try:
-        params = {
-            'model': model,
-            'prompt': prompt,
-            'n': 1,
-            'size': '1024x1024',
-            'style': 'vivid',
-        }
-        # Only dall-e-3 supports quality 'hd'; keep 'standard' otherwise
-        if model == 'dall-e-3':
-            params['quality'] = quality
-        response = client.images.generate(**params)
-        return response.data[0].url
+        fetch_image(client, prompt_text, model, images_dir, f'{node_id}.jpg', quality=quality,
+                    response_format=response_format, scheduler=getattr(client, 'scheduler', None),
+                    store=store)
     except Exception as e:
-        raise Exception(f"Failed to generate image: {e}")
+        raise Exception(f"Failed to generate image: {e}") from e
+    return f'images/{node_id}.jpg'
 
 
-def download_image(url: str, directory: Path, filename: str) -> Path:
-    """Download an image from URL and save to disk"""
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        filepath = directory / filename
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        return filepath
-    except Exception as e:
-        raise Exception(f"Failed to download image: {e}")
+def generate_node_images(client: OpenAI, nodes_list, style_kit: Dict[str, str], images_dir: Path,
+                         model: str, quality: str, concurrency: int = 4, response_format: str = 'b64_json',
+                         store: Optional[ImageStore] = None,
+                         on_saved: Optional[Callable[[str, str], None]] = None) -> int:
+    """
+    Generate images for the given (node_id, node_data) pairs using a bounded thread pool.
+    Each node succeeds or fails on its own; node_data['image'] is only set on success,
+    and on_saved(node_id, image_path) is called for every saved image.
+    Returns the number of images saved.
+    """
+    total = len(nodes_list)
+    if not total:
+        return 0
+    saved = 0
+    workers = max(1, min(concurrency, total))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for idx, (node_id, node_data) in enumerate(nodes_list, 1):
+            print(f'   [{idx}/{total}] Generating image for "{node_id}"...')
+            future = executor.submit(carry_stage(generate_node_image), client, node_id, node_data, style_kit,
+                                     images_dir, model, quality, response_format, store)
+            futures[future] = (node_id, node_data)
+        for future in as_completed(futures):
+            node_id, node_data = futures[future]
+            try:
+                node_data['image'] = future.result()
+                saved += 1
+                print(f'   ✓ Saved: {node_data["image"]}')
+                if on_saved:
+                    on_saved(node_id, node_data['image'])
+            except Exception as e:
+                print(f'   ✗ Failed to generate image for {node_id}: {e}')
+                # Continue without the image
+    return saved
+
+
+def write_node_text(story_dir: Path, node_id: str, node_data: Dict[str, Any]) -> str:
+    """Write a node's text to nodes/<node_id>.txt and record it as the node's textFile"""
+    text_file = f'nodes/{node_id}.txt'
+    with open(story_dir / text_file, 'w', encoding='utf-8') as f:
+        f.write(node_data['text'])
+    node_data['textFile'] = text_file
+    return text_file
+
+
+class StreamingNodeWriter:
+    """
+    Writes node text files while a streamed story is still arriving.
+    Nodes that arrive before the metadata (and therefore the story ID) are held
+    back and flushed once the story's staging directory is known.
+    """
+
+    def __init__(self, stories_dir: Path):
+        self.stories_dir = stories_dir
+        self.story_id = None
+        self.story_dir = None
+        self.pending = []
+        self.written = {}
+        self.texts = {}
+
+    def on_metadata(self, metadata: Dict[str, Any]) -> None:
+        if self.story_dir is not None or not metadata.get('storyId'):
+            return
+        self.story_id = metadata['storyId']
+        self.story_dir = new_staging_dir(self.stories_dir, self.story_id)
+        (self.story_dir / 'nodes').mkdir(parents=True, exist_ok=True)
+        print(f'   ✓ Streaming into: {self.story_dir}')
+        pending, self.pending = self.pending, []
+        for node_id, node_data in pending:
+            self.on_node(node_id, node_data)
+
+    def on_node(self, node_id: str, node_data: Dict[str, Any]) -> None:
+        if self.story_dir is None:
+            self.pending.append((node_id, node_data))
+            return
+        if not isinstance(node_data.get('text'), str):
+            return
+        self.written[node_id] = write_node_text(self.story_dir, node_id, node_data)
+        self.texts[node_id] = node_data['text']
+        print(f'   ✓ {self.written[node_id]}')
 
 
 def update_stories_index(stories_dir: Path, metadata: Dict[str, Any]):
@@ -347,63 +648,92 @@ def update_stories_index(stories_dir: Path, metadata: Dict[str, Any]):
         json.dump(stories, f, indent=2, ensure_ascii=False)
 
 
-def main():
-    """Main execution function"""
-    print('🎭 CYOA Story Generator\n')
-    
-    args = parse_args()
-    
-    # Load prompts from files
-    print('📖 Loading prompts...')
-    system_prompt = load_prompt_file(args.system_prompt)
-    user_prompt = load_prompt_file(args.user_prompt)
-    print('✓ Prompts loaded\n')
-    
-    # Initialize OpenAI client
-    client = OpenAI(api_key=args.api_key)
-    
-    # Generate story structure
-    print(f'🤖 Generating story using {args.model}...')
-    print('   (This may take 30-60 seconds)\n')
-    
-    story_data = generate_story(client, system_prompt, user_prompt, args.model)
-    # Overwrite the created date with today's date (YYYY-MM-DD)
-    from datetime import date
-    today_str = date.today().isoformat()
-    story_data['metadata']['created'] = today_str
-    # Build and attach style kit
-    style_kit = build_style_kit(user_prompt, story_data['nodes'])
-    story_data['metadata']['styleKit'] = style_kit
-    print(f'✓ Story generated: "{story_data["metadata"]["title"]}"')
-    print(f'   Nodes: {len(story_data["nodes"])}')
-    print(f'   Story ID: {story_data["metadata"]["storyId"]}\n')
-    print(f'   Date set to: {today_str}')
-    # Ensure character consistency across all image prompts
-    print('👤 Checking character consistency...')
-    ensure_character_consistency(story_data['nodes'])
-    print()
-    
-    # Create directory structure
-    script_dir = Path(__file__).parent
-    stories_dir = script_dir.parent / 'stories'
-    story_dir = stories_dir / story_data['metadata']['storyId']
+def select_image_nodes(nodes_dict: Dict[str, Any], frequency: str):
+    """Return (node_id, node_data) pairs that should get images for the given --image-frequency"""
+    ending_nodes = {nid for nid, nd in nodes_dict.items() if not nd.get('choices')}
+    target_nodes = set()
+    if frequency == 'all':
+        target_nodes = set(nodes_dict.keys())
+    elif frequency in ['start-end','start-end-endings']:
+        target_nodes.add('start')
+        target_nodes |= ending_nodes
+    else:
+        target_nodes = set(nodes_dict.keys())
+    return [(nid, nodes_dict[nid]) for nid in nodes_dict if nid in target_nodes]
+
+
+def generate_candidates(args, client: OpenAI, system_prompt: str, user_prompt: str,
+                        cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """
+    Generate args.candidates stories concurrently and return the one with the best
+    score_story() (size, branching, endings, text length). Only the winner is kept.
+    """
+    count = args.candidates
+    if args.stream:
+        print('   ℹ --stream is ignored with --candidates (only the winning story is written)')
+    print(f'🎲 Generating {count} candidates in parallel...')
+
+    def candidate(index: int) -> Dict[str, Any]:
+        salt = f'candidate-{index}'
+        if args.outline:
+            return generate_story_outlined(client, system_prompt, user_prompt, args.model, args.expand_batch_size,
+                                           args.expand_concurrency, cache=cache,
+                                           repair_attempts=args.repair_attempts, cache_salt=salt)
+        return generate_story(client, system_prompt, user_prompt, args.model, cache=cache,
+                              repair_attempts=args.repair_attempts, cache_salt=salt)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = {executor.submit(carry_stage(candidate), i): i for i in range(1, count + 1)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                story_data = future.result()
+            except (SystemExit, Exception) as e:
+                # generate_story() exits on failure; one bad candidate must not stop the others
+                print(f'   ✗ Candidate {index} failed{f": {e}" if not isinstance(e, SystemExit) else ""}')
+                continue
+            metrics = story_metrics(story_data)
+            results.append((score_story(metrics), index, story_data, metrics))
+            print(f'   ✓ Candidate {index}: score {results[-1][0]} - {metrics["reachable_nodes"]} nodes, '
+                  f'{metrics["endings"]} endings, branching {metrics["branching"]}, '
+                  f'depth {metrics["max_depth"]}, ~{metrics["avg_words"]} words/node')
+    if not results:
+        print('Error: every candidate failed')
+        sys.exit(1)
+    score, index, story_data, _ = max(results, key=lambda r: (r[0], -r[1]))
+    print(f'🏆 Keeping candidate {index} (score {score})\n')
+    return story_data
+
+
+def build_story_files(args, client: OpenAI, story_data: Dict[str, Any], story_dir: Path,
+                      checkpoint: Optional[Checkpoint] = None) -> Checkpoint:
+    """
+    Write node files, images and story.json for generated story_data into story_dir,
+    checkpointing each stage (a new checkpoint is started unless one is given).
+    Returns the checkpoint; the caller completes it once the story is published.
+    """
     nodes_dir = story_dir / 'nodes'
     images_dir = story_dir / 'images'
+    recorder = recorder_of(client)
     
     print('📁 Creating directory structure...')
     nodes_dir.mkdir(parents=True, exist_ok=True)
     images_dir.mkdir(parents=True, exist_ok=True)
     print(f'✓ Created: {story_dir}\n')
+    if checkpoint is None:
+        # The expensive chat call is done; from here on a failure can be resumed
+        checkpoint = Checkpoint.start(story_dir, story_data, {name: getattr(args, name) for name in BUILD_OPTIONS})
     
     # Write node text files
     print('📝 Writing node text files...')
-    for node_id, node_data in story_data['nodes'].items():
-        text_file = f'nodes/{node_id}.txt'
-        file_path = story_dir / text_file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(node_data['text'])
-        node_data['textFile'] = text_file
-        print(f'   ✓ {text_file}')
+    with stage('node-files', recorder):
+        for node_id, node_data in story_data['nodes'].items():
+            if node_data.get('textFile') and (story_dir / node_data['textFile']).exists():
+                continue  # already written while streaming or before resuming
+            text_file = write_node_text(story_dir, node_id, node_data)
+            print(f'   ✓ {text_file}')
+        checkpoint.mark_nodes(story_data['nodes'].keys())
     print()
     
     # Generate images
@@ -412,33 +742,22 @@ def main():
         print('   (This may take several minutes)\n')
         
         # Determine which nodes get images according to frequency
-        nodes_dict = story_data['nodes']
-        ending_nodes = {nid for nid, nd in nodes_dict.items() if not nd.get('choices')}
-        target_nodes = set()
-        if args.image_frequency == 'all':
-            target_nodes = set(nodes_dict.keys())
-        elif args.image_frequency in ['start-end','start-end-endings']:
-            target_nodes.add('start')
-            target_nodes |= ending_nodes
-        else:
-            target_nodes = set(nodes_dict.keys())
-
-        nodes_list = [(nid, nodes_dict[nid]) for nid in nodes_dict if nid in target_nodes]
-        for idx, (node_id, node_data) in enumerate(nodes_list, 1):
-            print(f'   [{idx}/{len(nodes_list)}] Generating image for "{node_id}"...')
-            
-            try:
-                # Build compact, consistent prompt from style kit + node text
-                node_text = node_data.get('text', '')
-                prompt_text = build_image_prompt(node_text, style_kit)
-                image_url = generate_image(client, prompt_text, args.image_model, quality=args.image_quality)
-                download_image(image_url, images_dir, f'{node_id}.jpg')
-                node_data['image'] = f'images/{node_id}.jpg'
-                print(f'   ✓ Saved: images/{node_id}.jpg')
-            except Exception as e:
-                print(f'   ✗ Failed to generate image for {node_id}: {e}')
-                # Continue without the image
+        nodes_list = select_image_nodes(story_data['nodes'], args.image_frequency)
+        done = [nid for nid, _ in nodes_list if checkpoint.image_done(nid)]
+        if done:
+            print(f'   ⏭  {len(done)} image(s) already saved before resuming')
+        nodes_list = [(nid, nd) for nid, nd in nodes_list if nid not in done]
+        with stage('images', recorder):
+            generate_node_images(client, nodes_list, story_data['metadata']['styleKit'], images_dir, args.image_model,
+                                 args.image_quality, args.image_concurrency, args.image_response_format,
+                                 store=None if args.no_image_cache else ImageStore(Path(args.image_cache_dir)),
+                                 on_saved=checkpoint.mark_image)
         print()
+        if not args.no_optimise:
+            print('🖼  Creating compressed image variants...')
+            with stage('optimise', recorder):
+                optimised = optimise_story_nodes(story_dir, story_data['nodes'])
+            print(f'✓ {optimised} image(s) optimised\n')
     else:
         print('⊘ Skipping image generation\n')
     
@@ -456,15 +775,270 @@ def main():
         }
         if node_data.get('image'):
             story_json['nodes'][node_id]['image'] = node_data['image']
+            # Lets generate_images.py rebuild this image if the text or style kit changes later
+            story_json['nodes'][node_id]['imageFingerprint'] = image_fingerprint(
+                build_image_prompt(node_data.get('text', ''), story_data['metadata']['styleKit']),
+                args.image_model, args.image_quality)
+        if node_data.get('imageVariants'):
+            story_json['nodes'][node_id]['imageVariants'] = node_data['imageVariants']
     
     # Write story.json
     print('💾 Writing story.json...')
-    with open(story_dir / 'story.json', 'w', encoding='utf-8') as f:
+    with stage('story-json', recorder), open(story_dir / 'story.json', 'w', encoding='utf-8') as f:
         json.dump(story_json, f, indent=2, ensure_ascii=False)
     print(f'✓ Saved: {story_data["metadata"]["storyId"]}/story.json\n')
+    return checkpoint
+
+
+def create_story(args, client: OpenAI, system_prompt: str, user_prompt: str,
+                 cache: Optional[ResponseCache] = None,
+                 story_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Run the generation pipeline for one prompt: generate the story, write node files,
+    generate images and write story.json. Returns the generated story data.
+    Pass story_data to materialise a story generated elsewhere (e.g. a batch job).
+    """
+    script_dir = Path(__file__).parent
+    stories_dir = script_dir.parent / 'stories'
+    resume_id = getattr(args, 'resume', None)
+    recorder = recorder_of(client)
+    story_dir = None
+    if resume_id:
+        resume_dir = find_resumable(stories_dir, resume_id)
+        if resume_dir is None:
+            print(f'Error: No checkpoint to resume for {resume_id} in stories/.staging/ or stories/')
+            sys.exit(1)
+        checkpoint = Checkpoint.load(resume_dir)
+        story_data = checkpoint.load_story_data()
+        print(f'⏯  Resuming "{story_data["metadata"]["title"]}" from checkpoint')
+        print('   Story generation: done')
+        print(f'   Node files: {len(checkpoint.manifest["nodes"])}/{len(story_data["nodes"])} written')
+        print(f'   Images: {len(checkpoint.manifest["images"])} saved\n')
+    else:
+        if story_data is None:
+            # Generate story structure
+            print(f'🤖 Generating story using {args.model}...')
+            print('   (This may take 30-60 seconds)\n')
+    
+            with stage('llm', recorder):
+                if args.candidates > 1:
+                    story_data = generate_candidates(args, client, system_prompt, user_prompt, cache=cache)
+                elif args.outline:
+                    story_data = generate_story_outlined(client, system_prompt, user_prompt, args.model,
+                                                         args.expand_batch_size, args.expand_concurrency, cache=cache,
+                                                         repair_attempts=args.repair_attempts)
+                elif args.stream:
+                    stream_writer = StreamingNodeWriter(stories_dir)
+                    try:
+                        story_data = generate_story(client, system_prompt, user_prompt, args.model, stream=True,
+                                                    on_node=stream_writer.on_node, on_metadata=stream_writer.on_metadata,
+                                                    cache=cache, repair_attempts=args.repair_attempts)
+                    except BaseException:
+                        if stream_writer.story_dir is not None:
+                            discard(stream_writer.story_dir)
+                        raise
+                    if stream_writer.story_id == story_data['metadata']['storyId']:
+                        story_dir = stream_writer.story_dir
+                    elif stream_writer.story_dir is not None:
+                        # The story ID was fixed up during validation; the streamed files are in the wrong place
+                        discard(stream_writer.story_dir)
+                        stream_writer.written = {}
+                    # Node files were written from the stream; keep their textFile entries
+                    # unless the node was replaced during repair
+                    for node_id, text_file in stream_writer.written.items():
+                        if story_data['nodes'].get(node_id, {}).get('text') == stream_writer.texts.get(node_id):
+                            story_data['nodes'][node_id]['textFile'] = text_file
+                    print()
+                else:
+                    story_data = generate_story(client, system_prompt, user_prompt, args.model, cache=cache,
+                                                repair_attempts=args.repair_attempts)
+        # Overwrite the created date with today's date (YYYY-MM-DD)
+        from datetime import date
+        today_str = date.today().isoformat()
+        story_data['metadata']['created'] = today_str
+        # Build and attach style kit
+        with stage('style-kit', recorder):
+            style_kit = build_style_kit(user_prompt, story_data['nodes'])
+        story_data['metadata']['styleKit'] = style_kit
+        print(f'✓ Story generated: "{story_data["metadata"]["title"]}"')
+        print(f'   Nodes: {len(story_data["nodes"])}')
+        print(f'   Story ID: {story_data["metadata"]["storyId"]}\n')
+        print(f'   Date set to: {today_str}')
+        # Ensure character consistency across all image prompts
+        print('👤 Checking character consistency...')
+        with stage('consistency', recorder):
+            ensure_character_consistency(story_data['nodes'])
+        print()
+    
+    story_id = resume_id or story_data['metadata']['storyId']
+    staged = not resume_id or resume_dir.parent == staging_root(stories_dir)
+    overwrite = getattr(args, 'overwrite', False)
+    if staged and not overwrite and (stories_dir / story_id).exists():
+        # Checked before any image is paid for; publish() refuses as well
+        if story_dir is not None:
+            discard(story_dir)
+        print(f'Error: stories/{story_id}/ already exists; re-run with --overwrite to replace it'
+              + (f' (--resume {story_id} --overwrite)' if resume_id else ' (add --cache to reuse the generated text)'))
+        sys.exit(1)
+    if story_dir is None:
+        story_dir = resume_dir if resume_id else new_staging_dir(stories_dir, story_id)
+    try:
+        checkpoint = build_story_files(args, client, story_data, story_dir, checkpoint if resume_id else None)
+        if staged:
+            # Readers only ever see the complete story directory
+            with stage('publish', recorder):
+                published = publish(stories_dir, story_dir, overwrite)
+            print(f'✓ Published: stories/{story_id}/\n')
+    except BaseException as e:
+        if staged:
+            if discard(story_dir):
+                print(f'🧹 Removed the partial build of {story_id}')
+            else:
+                # Another run may have published the same story ID in the meantime
+                retry = f'--resume {story_id}' + (' --overwrite' if isinstance(e, FileExistsError) else '')
+                print(f'💾 Partial build kept in {story_dir}; resume with {retry}')
+        raise
+    # Only now is the build safe without its checkpoint
+    checkpoint.complete(published if staged else None)
     
     # NOTE: Story is NOT automatically added to index.json
     # Must be proofread and approved first using proofread_story.py
+    return story_data
+
+
+def remove_abandoned_builds(stories_dir: Path) -> None:
+    """Clear out staging directories left by crashed runs; call once per run, before any build starts"""
+    for story_id in restore_swapped(stories_dir):
+        print(f'♻️  Restored stories/{story_id}/ from an interrupted publish')
+    removed = clean_stale(stories_dir)
+    if removed:
+        print(f'🧹 Removed {removed} abandoned staging director{"y" if removed == 1 else "ies"}')
+
+
+def find_prompt_files(pattern: str):
+    """Resolve --user-prompts (a directory or a glob) to a sorted list of prompt files"""
+    path = Path(pattern)
+    if path.is_dir():
+        candidates = [p for p in path.iterdir() if p.suffix.lower() in ('.txt', '.md')]
+    else:
+        import glob
+        candidates = [Path(p) for p in glob.glob(pattern, recursive=True)]
+    # Directory READMEs (e.g. prompts-archive/README.md) are not story prompts
+    return sorted(p for p in candidates if p.is_file() and p.name.lower() != 'readme.md')
+
+
+def run_batch(args, client: OpenAI, system_prompt: str, cache: Optional[ResponseCache] = None) -> list:
+    """
+    Generate one story per prompt file concurrently, at most --batch-concurrency at a time.
+    Never prompts interactively. Writes a JSON summary report and returns its entries.
+    """
+    import time
+    prompt_files = find_prompt_files(args.user_prompts)
+    if not prompt_files:
+        print(f'Error: No prompt files found for: {args.user_prompts}')
+        sys.exit(1)
+    print(f'📚 Batch: {len(prompt_files)} prompt files, {args.batch_concurrency} at a time\n')
+
+    def run_one(prompt_path: Path) -> Dict[str, Any]:
+        entry = {'prompt': str(prompt_path), 'status': 'failed'}
+        started = time.monotonic()
+        try:
+            user_prompt = load_prompt_file(str(prompt_path))
+            story_data = create_story(args, client, system_prompt, user_prompt, cache=cache)
+            entry.update({
+                'status': 'ok',
+                'storyId': story_data['metadata']['storyId'],
+                'title': story_data['metadata'].get('title', ''),
+                'nodes': len(story_data['nodes']),
+                'images': sum(1 for nd in story_data['nodes'].values() if nd.get('image')),
+            })
+        except SystemExit:
+            # generate_story() reports its own errors and exits; treat that as this prompt failing
+            entry['error'] = 'generation failed (see log above)'
+        except Exception as e:
+            entry['error'] = str(e)
+        entry['seconds'] = round(time.monotonic() - started, 1)
+        return entry
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.batch_concurrency)) as executor:
+        futures = [executor.submit(run_one, path) for path in prompt_files]
+        for future in as_completed(futures):
+            entry = future.result()
+            results.append(entry)
+            mark = '✓' if entry['status'] == 'ok' else '✗'
+            print(f'{mark} [{len(results)}/{len(prompt_files)}] {entry["prompt"]}: '
+                  f'{entry.get("storyId") or entry.get("error")}')
+    results.sort(key=lambda e: e['prompt'])
+
+    succeeded = [e for e in results if e['status'] == 'ok']
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': args.model,
+        'total': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'results': results,
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print()
+    print('=' * 50)
+    print(f'✨ Batch complete: {len(succeeded)} succeeded, {len(results) - len(succeeded)} failed')
+    print('=' * 50)
+    for entry in results:
+        if entry['status'] != 'ok':
+            print(f'   ✗ {entry["prompt"]}: {entry.get("error")}')
+    print(f'Report: {args.report}')
+    print()
+    return results
+
+
+def main(argv=None):
+    """Main execution function"""
+    print('🎭 CYOA Story Generator\n')
+    
+    args = parse_args(argv)
+    recorder = telemetry_from_args(args, 'generate_story')
+    
+    # Load prompts from files (a resumed story already has its generated text)
+    system_prompt = user_prompt = None
+    if not args.resume:
+        print('📖 Loading prompts...')
+        with stage('load-prompts', recorder):
+            system_prompt = load_prompt_file(args.system_prompt)
+            user_prompt = load_prompt_file(args.user_prompt) if args.user_prompt else None
+        print('✓ Prompts loaded\n')
+    
+    # Initialize OpenAI client (never used for chat calls in replay mode).
+    # Retries are handled by the scheduler, which also enforces rate limits.
+    # The SDK is imported here rather than at module level so --help and the
+    # helpers other scripts import from this module start quickly.
+    from openai import OpenAI
+    client = scheduler_from_args(args, recorder).wrap(OpenAI(api_key=args.api_key or 'replay', base_url=args.base_url,
+                                                     max_retries=0))
+    # Responses are always recorded; they are only served back with --cache or --replay,
+    # so re-running a prompt produces a new story by default
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(Path(args.cache_dir), args.cache_max_mb * 1024 * 1024, replay=args.replay,
+                              read=args.cache)
+    if args.replay:
+        print('⏪ Replay mode: serving LLM responses from cache, skipping images\n')
+        args.skip_images = True
+    if not args.resume:
+        remove_abandoned_builds(Path(__file__).parent.parent / 'stories')
+
+    if args.user_prompts:
+        results = run_batch(args, client, system_prompt, cache=cache)
+        if any(e['status'] != 'ok' for e in results):
+            sys.exit(1)
+        return
+    
+    story_data = create_story(args, client, system_prompt, user_prompt, cache=cache)
+    if cache is not None and cache.hits:
+        print(f'⚡ {cache.hits} LLM response(s) served from cache\n')
     
     # Offer to run proofreading immediately
     try:
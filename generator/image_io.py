@@ -0,0 +1,149 @@
+"""
+Image prompts and retrieval shared by generate_story.py and generate_images.py.
+
+Images are requested with response_format='b64_json' by default so the bytes come
+back in the generation response and are decoded straight to disk, saving a second
+HTTPS round trip. When URLs are used instead, downloads go through one pooled
+requests.Session and are streamed to disk in chunks rather than buffered in memory.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+
+RESPONSE_FORMATS = ['b64_json', 'url']
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> 'requests.Session':
+    """Shared Session so downloads reuse pooled keep-alive connections (requests is imported on first use)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def _tmp_path(filepath: Path) -> Path:
+    return filepath.with_name(f'.{filepath.name}.{threading.get_ident()}.part')
+
+
+def download_image(url: str, directory: Path, filename: str) -> Path:
+    """Stream an image from URL to disk in chunks"""
+    try:
+        filepath = Path(directory) / filename
+        tmp_path = _tmp_path(filepath)
+        with get_session().get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        os.replace(tmp_path, filepath)
+        return filepath
+    except Exception as e:
+        raise Exception(f"Failed to download image: {e}") from e
+
+
+def save_b64_image(data: str, directory: Path, filename: str) -> Path:
+    """Decode a base64 image from the API response and write it to disk"""
+    filepath = Path(directory) / filename
+    tmp_path = _tmp_path(filepath)
+    with open(tmp_path, 'wb') as f:
+        f.write(base64.b64decode(data))
+    os.replace(tmp_path, filepath)
+    return filepath
+
+
+def image_params(prompt: str, model: str, quality: str = 'standard', response_format: str = 'b64_json') -> dict:
+    """Parameters for client.images.generate()"""
+    params = {
+        'model': model,
+        'prompt': prompt,
+        'n': 1,
+        'size': '1024x1024',
+        'style': 'vivid',
+        'response_format': response_format,
+    }
+    # Only dall-e-3 supports quality 'hd'; keep 'standard' otherwise
+    if model == 'dall-e-3':
+        params['quality'] = quality
+    return params
+
+
+def first_sentence(text: str, max_words: int = 28) -> str:
+    """Extract a short scene description from the node text."""
+    if not text:
+        return ''
+    # Take up to the first sentence terminator or word cap
+    m = re.split(r'(?:[.!?]\s)', text.strip(), maxsplit=1)
+    s = m[0] if m else text.strip()
+    words = s.split()
+    if len(words) > max_words:
+        s = ' '.join(words[:max_words])
+    return s
+
+
+def build_image_prompt(node_text: str, style_kit: Dict[str, str]) -> str:
+    scene = first_sentence(node_text)
+    character = style_kit.get('character','a child')
+    art = style_kit.get('artStyle', "children's book illustration")
+    return f"{character} in {art}. Scene: {scene}. Mood: cheerful. Children's book illustration. No text."
+
+
+def image_fingerprint(prompt: str, model: str, quality: str = 'standard') -> str:
+    """
+    Hash of everything a node image depends on: the prompt from build_image_prompt()
+    and the model/quality. Edits to the node text outside the scene sentence leave it
+    unchanged; a new scene, character, art style or model makes the image stale.
+    """
+    payload = json.dumps({
+        'prompt': prompt,
+        'model': model,
+        'quality': quality if model == 'dall-e-3' else None,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def fetch_image(client: Any, prompt: str, model: str, directory: Path, filename: str,
+                quality: str = 'standard', response_format: str = 'b64_json',
+                scheduler: Optional[Any] = None, store: Optional[Any] = None) -> Path:
+    """
+    Generate an image and save it as directory/filename in as few round trips as possible.
+    URL downloads are retried through the scheduler when one is given. With an
+    ImageStore, an identical earlier request is reused instead of calling the API.
+    """
+    params = image_params(prompt, model, quality, response_format)
+    key = None
+    if store is not None:
+        key = store.make_key(params)
+        if store.get(key, Path(directory) / filename):
+            return Path(directory) / filename
+    response = client.images.generate(**params)
+    item = response.data[0]
+    if getattr(item, 'b64_json', None):
+        filepath = save_b64_image(item.b64_json, directory, filename)
+    elif scheduler is not None:
+        filepath = scheduler.call(download_image, item.url, directory, filename, kind='download')
+    else:
+        filepath = download_image(item.url, directory, filename)
+    if store is not None:
+        store.put(key, filepath)
+    return filepath
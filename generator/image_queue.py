@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Durable image job queue shared by any number of stories.
+
+Jobs live in a SQLite database (generator/.cache/image-queue.db), one row per
+node image to (re)build. Worker threads claim jobs with a lease; a job whose
+worker dies is picked up again once its lease expires, so every job runs at
+least once and an interrupted run resumes where it stopped. Saved images are
+written back to each story.json (path, fingerprint and compressed variants).
+
+Usage:
+    python image_queue.py backfill --api-key KEY --all [--workers 8]   # enqueue every story and drain the queue
+    python image_queue.py enqueue --story-id STORY_ID [--force]
+    python image_queue.py work --api-key KEY [--workers 8]
+    python image_queue.py status [--failed]
+    python image_queue.py retry [--story-id STORY_ID]                   # requeue failed jobs
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from api_scheduler import add_scheduler_args, scheduler_from_args
+from image_io import RESPONSE_FORMATS, build_image_prompt, fetch_image
+from image_store import ImageStore, DEFAULT_STORE_DIR
+from optimise_images import optimise_story_nodes
+from telemetry import add_telemetry_args, telemetry_from_args, stage, carry_stage
+
+
+STORIES_DIR = Path(__file__).parent.parent / 'stories'
+DEFAULT_DB = Path(__file__).parent / '.cache' / 'image-queue.db'
+DEFAULT_STYLE_KIT = {'character': 'a child', 'artStyle': "children's book illustration"}
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    story_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    fresh INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    applied INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    UNIQUE (story_id, node_id, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+"""
+
+
+class ImageQueue:
+    """SQLite-backed job queue; safe to use from several threads and processes"""
+
+    def __init__(self, path: Path = DEFAULT_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, story_id: str, node_id: str, fingerprint: str, prompt: str,
+                model: str, quality: str, fresh: bool = False) -> None:
+        """Add a job, replacing queued jobs for an older version of the same node"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                "DELETE FROM jobs WHERE story_id = ? AND node_id = ? AND fingerprint != ? "
+                "AND status IN ('pending', 'failed')",
+                (story_id, node_id, fingerprint))
+            conn.execute(
+                "INSERT INTO jobs (story_id, node_id, fingerprint, prompt, model, quality, fresh, available_at, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (story_id, node_id, fingerprint) DO UPDATE SET "
+                "status = 'pending', attempts = 0, last_error = NULL, applied = 0, fresh = excluded.fresh, "
+                "available_at = excluded.available_at, updated = excluded.updated "
+                "WHERE status != 'running'",
+                (story_id, node_id, fingerprint, prompt, model, quality, int(fresh), now, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def claim(self, lease_seconds: float = 600) -> Optional[sqlite3.Row]:
+        """Lease the next runnable job (pending, or running with an expired lease)"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now, now)).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated = ? "
+                    "WHERE id = ?", (now + lease_seconds, now, job['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return job
+
+    def complete(self, job_id: int) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', last_error = NULL, lease_until = NULL, updated = ? WHERE id = ?",
+            (time.time(), job_id))
+
+    def fail(self, job_id: int, error: str, max_attempts: int = 3) -> bool:
+        """Record a failed attempt; the job is retried later until max_attempts. Returns True if it gave up."""
+        now = time.time()
+        conn = self._conn()
+        attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()['attempts']
+        if attempts >= max_attempts:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ?, lease_until = NULL, updated = ? WHERE id = ?",
+                (error, now, job_id))
+            return True
+        conn.execute(
+            "UPDATE jobs SET status = 'pending', last_error = ?, lease_until = NULL, available_at = ?, updated = ? "
+            "WHERE id = ?", (error, now + 30 * attempts, now, job_id))
+        return False
+
+    def retry_failed(self, story_id: Optional[str] = None) -> int:
+        """Move failed jobs back to pending"""
+        sql = "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, updated = ? WHERE status = 'failed'"
+        params = [time.time(), time.time()]
+        if story_id:
+            sql += " AND story_id = ?"
+            params.append(story_id)
+        return self._conn().execute(sql, params).rowcount
+
+    def release_running(self) -> int:
+        """Return every running job to pending, for when their workers are known to be gone"""
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'pending', lease_until = NULL, available_at = ?, updated = ? "
+            "WHERE status = 'running'", (time.time(), time.time())).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row['status']] = row['n']
+        return counts
+
+    def story_counts(self) -> List[sqlite3.Row]:
+        return self._conn().execute(
+            "SELECT story_id, "
+            "SUM(status = 'pending') AS pending, SUM(status = 'running') AS running, "
+            "SUM(status = 'done') AS done, SUM(status = 'failed') AS failed "
+            "FROM jobs GROUP BY story_id ORDER BY story_id").fetchall()
+
+    def failed_jobs(self) -> List[sqlite3.Row]:
+        return self._conn().execute(
+            "SELECT * FROM jobs WHERE status = 'failed' ORDER BY story_id, node_id").fetchall()
+
+    def outstanding(self) -> int:
+        """Jobs that may still produce work: pending (possibly backing off) or running"""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    def unapplied(self) -> List[sqlite3.Row]:
+        """Finished jobs whose image has not yet been written back to story.json"""
+        return self._conn().execute(
+            "SELECT * FROM jobs WHERE status = 'done' AND applied = 0 ORDER BY story_id, id").fetchall()
+
+    def mark_applied(self, job_ids) -> None:
+        self._conn().executemany("UPDATE jobs SET applied = 1 WHERE id = ?", [(i,) for i in job_ids])
+
+
+def load_story(story_dir: Path) -> Dict[str, Any]:
+    with open(story_dir / 'story.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_story(story_dir: Path, story: Dict[str, Any]) -> None:
+    tmp_path = story_dir / f'.story.json.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(story, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, story_dir / 'story.json')
+
+
+def story_dirs_for(args) -> List[Path]:
+    if getattr(args, 'all', False):
+        return sorted(p for p in STORIES_DIR.iterdir()
+                      if p.is_dir() and not p.name.startswith('.') and (p / 'story.json').exists())
+    story_dir = STORIES_DIR / args.story_id
+    if not (story_dir / 'story.json').exists():
+        print(f"Error: {story_dir / 'story.json'} not found.")
+        sys.exit(1)
+    return [story_dir]
+
+
+def enqueue_stories(queue: ImageQueue, story_dirs: List[Path], frequency: str, model: str,
+                    quality: str, force: bool = False) -> int:
+    """Queue every missing or stale image in the given stories. Returns the number of jobs queued."""
+    from generate_images import plan_images, target_node_ids
+
+    total = 0
+    for story_dir in story_dirs:
+        story = load_story(story_dir)
+        nodes = story['nodes']
+        style_kit = story['metadata'].get('styleKit', DEFAULT_STYLE_KIT)
+        to_build, adopted = plan_images(story_dir, nodes, target_node_ids(nodes, frequency),
+                                        style_kit, model, quality, force)
+        for node_id, _, node_text, fingerprint in to_build:
+            queue.enqueue(story_dir.name, node_id, fingerprint, build_image_prompt(node_text, style_kit),
+                          model, quality, fresh=force)
+        if adopted:
+            for node_id, fingerprint in adopted.items():
+                nodes[node_id]['imageFingerprint'] = fingerprint
+            save_story(story_dir, story)
+        if to_build:
+            print(f"   + {story_dir.name}: {len(to_build)} image(s) queued")
+        total += len(to_build)
+    return total
+
+
+def apply_results(queue: ImageQueue, optimise: bool = True) -> int:
+    """Write finished jobs back to their story.json. Returns the number of nodes updated."""
+    by_story: Dict[str, List[sqlite3.Row]] = {}
+    for job in queue.unapplied():
+        by_story.setdefault(job['story_id'], []).append(job)
+    updated = 0
+    for story_id, jobs in by_story.items():
+        story_dir = STORIES_DIR / story_id
+        if not (story_dir / 'story.json').exists():
+            queue.mark_applied(j['id'] for j in jobs)
+            continue
+        story = load_story(story_dir)
+        nodes = story['nodes']
+        node_ids = set()
+        for job in jobs:
+            node = nodes.get(job['node_id'])
+            if node is None:
+                continue
+            node['image'] = f"images/{job['node_id']}.jpg"
+            node['imageFingerprint'] = job['fingerprint']
+            node_ids.add(job['node_id'])
+        if optimise and node_ids:
+            optimise_story_nodes(story_dir, nodes, node_ids, replaced=node_ids)
+        save_story(story_dir, story)
+        queue.mark_applied(j['id'] for j in jobs)
+        print(f"   ✓ {story_id}/story.json: {len(node_ids)} image(s) updated")
+        updated += len(node_ids)
+    return updated
+
+
+def run_job(client: Any, scheduler: Any, store: Optional[ImageStore], job: sqlite3.Row,
+            response_format: str) -> None:
+    images_dir = STORIES_DIR / job['story_id'] / 'images'
+    images_dir.mkdir(parents=True, exist_ok=True)
+    fetch_image(client, job['prompt'], job['model'], images_dir, f"{job['node_id']}.jpg",
+                quality=job['quality'], response_format=response_format,
+                scheduler=scheduler, store=None if job['fresh'] else store)
+
+
+def worker_loop(queue: ImageQueue, client: Any, scheduler: Any, store: Optional[ImageStore],
+                response_format: str, max_attempts: int, lease_seconds: float, stop: threading.Event) -> int:
+    """Claim and run jobs until the queue is drained. Returns the number of jobs completed."""
+    done = 0
+    while not stop.is_set():
+        job = queue.claim(lease_seconds)
+        if job is None:
+            if queue.outstanding() == 0:
+                break
+            # Jobs are backing off or leased by another worker; check again shortly
+            stop.wait(2)
+            continue
+        label = f"{job['story_id']}/{job['node_id']}"
+        try:
+            run_job(client, scheduler, store, job, response_format)
+            queue.complete(job['id'])
+            done += 1
+            print(f"   ✓ {label}")
+        except Exception as e:
+            gave_up = queue.fail(job['id'], str(e), max_attempts)
+            print(f"   ✗ {label} (attempt {job['attempts'] + 1}): {e}{' - giving up' if gave_up else ''}")
+    return done
+
+
+def work(args, queue: ImageQueue) -> None:
+    from openai import OpenAI
+
+    recorder = telemetry_from_args(args, 'image_queue')
+    scheduler = scheduler_from_args(args, recorder)
+    client = scheduler.wrap(OpenAI(api_key=args.api_key, base_url=args.base_url, max_retries=0))
+    store = None if args.no_image_cache else ImageStore(Path(args.image_cache_dir))
+    optimise = not args.no_optimise
+
+    if args.reclaim:
+        print(f"↩️  {queue.release_running()} abandoned job(s) requeued")
+    # Results from an interrupted run that never reached story.json
+    apply_results(queue, optimise)
+    counts = queue.counts()
+    print(f"🎨 {counts['pending'] + counts['running']} job(s) to run with {args.workers} worker(s)...")
+    stop = threading.Event()
+    completed = 0
+    start = time.time()
+    try:
+        with stage('images', recorder), ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(carry_stage(worker_loop), queue, client, scheduler, store, args.image_response_format,
+                                       args.max_attempts, args.lease, stop) for _ in range(args.workers)]
+            try:
+                for future in futures:
+                    # Poll so Ctrl+C is handled promptly
+                    while not future.done():
+                        time.sleep(0.5)
+                    completed += future.result()
+            except KeyboardInterrupt:
+                print("\n⏹  Interrupted; finishing in-flight jobs (run `work` again to resume)...")
+                stop.set()
+    finally:
+        apply_results(queue, optimise)
+    counts = queue.counts()
+    print(f"✓ {completed} image(s) generated in {time.time() - start:.1f}s "
+          f"({counts['pending']} pending, {counts['failed']} failed)")
+    if store is not None and store.hits:
+        print(f"   ♻️  {store.hits} served from the image cache")
+
+
+def print_status(queue: ImageQueue, show_failed: bool) -> None:
+    counts = queue.counts()
+    print('  '.join(f"{status}: {counts[status]}" for status in STATUSES))
+    for row in queue.story_counts():
+        print(f"   {row['story_id']}: {row['pending']} pending, {row['running']} running, "
+              f"{row['done']} done, {row['failed']} failed")
+    if show_failed:
+        for job in queue.failed_jobs():
+            print(f"   ✗ {job['story_id']}/{job['node_id']} after {job['attempts']} attempt(s): {job['last_error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Durable image job queue for CYOA stories')
+    parser.add_argument('--db', default=str(DEFAULT_DB), help='Queue database (default: generator/.cache/image-queue.db)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    targets = argparse.ArgumentParser(add_help=False)
+    group = targets.add_mutually_exclusive_group(required=True)
+    group.add_argument('--story-id', help='Story ID (folder name in stories/)')
+    group.add_argument('--all', action='store_true', help='Every story in stories/')
+    targets.add_argument('--image-model', default='dall-e-3', help='Image model to use (default: dall-e-3)')
+    targets.add_argument('--image-quality', default='standard', choices=['standard','hd'], help='Image quality for dall-e-3 (standard or hd)')
+    targets.add_argument('--image-frequency', default='start-end-endings', choices=['all','start-end','start-end-endings'], help='Which nodes get images')
+    targets.add_argument('--force', action='store_true', help='Queue every target image, even if its fingerprint is unchanged')
+
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument('--api-key', required=True, help='Your OpenAI API key (any value for mock_provider.py)')
+    workers.add_argument('--base-url', default=None, help='API base URL, e.g. http://127.0.0.1:8765/v1 for mock_provider.py')
+    workers.add_argument('--workers', type=int, default=8, help='Worker threads draining the queue (default: 8)')
+    workers.add_argument('--max-attempts', type=int, default=3, help='Attempts per job before it is marked failed (default: 3)')
+    workers.add_argument('--lease', type=float, default=600, help='Seconds before a running job is considered abandoned and re-run (default: 600)')
+    workers.add_argument('--reclaim', action='store_true', help='Requeue jobs left running by a killed run without waiting for their lease (only if no other worker is active)')
+    workers.add_argument('--image-response-format', default='b64_json', choices=RESPONSE_FORMATS, help='Receive images inline as base64 (one round trip) or as URLs to download (default: b64_json)')
+    workers.add_argument('--image-cache-dir', default=str(DEFAULT_STORE_DIR), help='Store of generated images reused for identical prompts (default: generator/.cache/images)')
+    workers.add_argument('--no-image-cache', action='store_true', help='Always call the image API, even for a prompt generated before')
+    workers.add_argument('--no-optimise', action='store_true', help='Do not create compressed multi-size image variants')
+    add_scheduler_args(workers)
+    add_telemetry_args(workers)
+
+    sub.add_parser('enqueue', parents=[targets], help='Queue missing or stale images')
+    sub.add_parser('work', parents=[workers], help='Drain the queue')
+    sub.add_parser('backfill', parents=[targets, workers], help='Queue missing or stale images, then drain the queue')
+    status = sub.add_parser('status', help='Show queued, failed and finished jobs')
+    status.add_argument('--failed', action='store_true', help='List failed jobs and their last error')
+    retry = sub.add_parser('retry', help='Requeue failed jobs')
+    retry.add_argument('--story-id', help='Only requeue jobs for this story')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    queue = ImageQueue(Path(args.db))
+
+    if args.command in ('enqueue', 'backfill'):
+        story_dirs = story_dirs_for(args)
+        # Finished jobs must reach story.json first, or their nodes would look like they still need images
+        apply_results(queue, optimise=False)
+        print(f"🔍 Checking images in {len(story_dirs)} stories...")
+        queued = enqueue_stories(queue, story_dirs, args.image_frequency, args.image_model,
+                                 args.image_quality, args.force)
+        print(f"✓ {queued} job(s) queued")
+    if args.command in ('work', 'backfill'):
+        work(args, queue)
+    elif args.command == 'status':
+        print_status(queue, args.failed)
+    elif args.command == 'retry':
+        print(f"✓ {queue.retry_failed(args.story_id)} failed job(s) requeued")
+
+
+if __name__ == '__main__':
+    main()
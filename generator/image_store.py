@@ -0,0 +1,119 @@
+"""
+Content-addressed store of generated images.
+
+Images are keyed on a SHA-256 of the final generation parameters (model, quality,
+size and prompt). Before calling the image API, fetch_image() checks the store and,
+on a hit, links the stored file into the story instead of paying for a new image.
+Files are hard-linked where the filesystem allows it, so repeated images cost no
+extra disk space.
+
+The store is not trimmed automatically. `prune` removes stored images that no story
+links to any more, least recently used first:
+    python image_store.py prune [--max-mb 500]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+
+DEFAULT_STORE_DIR = Path(__file__).parent / '.cache' / 'images'
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    """Hard-link src to dest (replacing dest), falling back to a copy across filesystems"""
+    tmp_path = dest.with_name(f'.{dest.name}.{threading.get_ident()}.link')
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+class ImageStore:
+    """On-disk image cache keyed on the generation parameters"""
+
+    def __init__(self, directory: Path = DEFAULT_STORE_DIR):
+        self.directory = Path(directory)
+        self.hits = 0
+
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> str:
+        """Hash the parameters that determine the generated image"""
+        payload = json.dumps({
+            'model': params.get('model'),
+            'quality': params.get('quality'),
+            'size': params.get('size'),
+            'style': params.get('style'),
+            'prompt': params.get('prompt'),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str, dest: Path) -> bool:
+        """Place the stored image for key at dest; returns False on a miss"""
+        path = self._path(key)
+        if not path.exists():
+            return False
+        link_or_copy(path, Path(dest))
+        os.utime(path)  # recently used entries are pruned last
+        self.hits += 1
+        return True
+
+    def put(self, key: str, src: Path) -> None:
+        """Add a freshly generated image to the store"""
+        path = self._path(key)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(Path(src), path)
+
+    def prune(self, max_bytes: int = 0) -> tuple:
+        """
+        Remove stored images no story links to (no other hard link), least recently used
+        first, until they take at most max_bytes. Returns (files removed, bytes freed).
+        Copies made where hard links were not possible count as unlinked.
+        """
+        if not self.directory.exists():
+            return 0, 0
+        unlinked = []
+        for path in self.directory.glob('??/*'):
+            st = path.stat()
+            if path.is_file() and st.st_nlink == 1:
+                unlinked.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in unlinked)
+        removed = freed = 0
+        for _, size, path in sorted(unlinked):
+            if total - freed <= max_bytes:
+                break
+            path.unlink()
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the generated image store')
+    parser.add_argument('--image-cache-dir', default=str(DEFAULT_STORE_DIR), help='Image store directory (default: generator/.cache/images)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    prune = sub.add_parser('prune', help='Remove stored images no story links to, least recently used first')
+    prune.add_argument('--max-mb', type=float, default=0, help='Unlinked images to keep, in MB (default: 0, remove all)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'prune':
+        removed, freed = ImageStore(Path(args.image_cache_dir)).prune(int(args.max_mb * 1024 * 1024))
+        print(f'🧹 Removed {removed} stored image(s), {freed / 1024 / 1024:.1f} MB freed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Content-addressed on-disk cache for LLM responses.
+
+Responses are keyed on a SHA-256 of (model, messages, temperature, response_format)
+and stored as small JSON files under the cache directory. The cache's size is counted
+once and then tracked as entries are written; when it grows past the size limit the
+least recently used entries are evicted (the only time the directory is scanned again). With read=False the cache
+only records responses, so every request still reaches the API. In replay mode a miss
+is an error instead of a network call, so the pipeline can run fully offline.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / '.cache' / 'llm'
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+EVICT_HEADROOM = 0.1  # fraction of max_bytes freed beyond the limit on each eviction
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a response is not in the cache"""
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of chat completion responses on disk"""
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, replay: bool = False,
+                 read: bool = True):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.read = read or replay
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes on disk, counted on the first put
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], temperature: float,
+                 response_format: Optional[Dict[str, Any]] = None, salt: Optional[str] = None) -> str:
+        """
+        Hash the request parameters that determine the response.
+        A salt keeps otherwise identical requests apart (e.g. parallel candidates).
+        """
+        request = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'response_format': response_format,
+        }
+        if salt:
+            request['salt'] = salt
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}.json'
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response content, or None (CacheMiss in replay mode)"""
+        if not self.read:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = json.load(f)['content']
+            # Touch so eviction sees this entry as recently used
+            os.utime(path, None)
+            self.hits += 1
+            return content
+        except (FileNotFoundError, KeyError, ValueError):
+            self.misses += 1
+            if self.replay:
+                raise CacheMiss(f'No cached response for request {key[:12]} (replay mode)')
+            return None
+
+    def put(self, key: str, content: str, model: str = '') -> None:
+        """Store a response and evict old entries if the cache is over its size limit"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'created': time.time(), 'content': content}, f, ensure_ascii=False)
+        size = tmp_path.stat().st_size
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            try:
+                self._size -= path.stat().st_size  # replacing an existing entry
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _scan(self) -> tuple:
+        """(entries as (mtime, size, path), total bytes) for every cached response on disk"""
+        entries = []
+        total = 0
+        for path in self.directory.glob('*/*.json'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        return entries, total
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache fits in max_bytes, leaving
+        EVICT_HEADROOM of it free so the next puts do not each trigger another scan
+        """
+        if not self.directory.exists():
+            return 0
+        # Rescanning also picks up entries written by other processes
+        entries, total = self._scan()
+        target = int(self.max_bytes * (1 - EVICT_HEADROOM))
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        self._size = total
+        return removed
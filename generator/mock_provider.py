@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat, image, files and batches endpoints.
+
+Lets generate_story.py, generate_images.py, regenerate_nodes.py, image_queue.py and
+batch_generate.py run end to end with no network access and no API key. Every chat
+completion (direct, streamed or inside a batch file) is answered with a small, valid,
+deterministic story built from the prompt, or, for a regenerate_nodes.py request,
+with rewrites of the requested nodes that keep their choices; image requests return
+a small PNG, inline or as a URL. Batch files are "processed" after --batch-delay seconds.
+
+Latency and failures can be injected to exercise concurrency and retry logic
+(see benchmark.py): --latency / --image-latency set the median response time
+(log-normally distributed with --jitter), --error-rate answers that fraction of
+requests with a 500, and --rate-limit-every N answers every request with a 429
+(and Retry-After) for --rate-limit-duration seconds out of every N.
+
+Usage:
+    python mock_provider.py --port 8765 [--batch-delay 2] [--latency 0.5 --image-latency 1 --error-rate 0.05]
+    python generate_story.py --api-key test --base-url http://127.0.0.1:8765/v1 --system-prompt system-prompt.txt --user-prompt my-story.txt
+    python batch_generate.py --api-key test --base-url http://127.0.0.1:8765/v1 run --system-prompt system-prompt.txt --user-prompts prompts/
+
+Endpoints: POST /v1/chat/completions, POST /v1/images/generations, GET /v1/mock-images/{id}.png,
+POST /v1/files, GET /v1/files/{id}, GET /v1/files/{id}/content,
+POST /v1/batches, GET /v1/batches, GET /v1/batches/{id}, POST /v1/batches/{id}/cancel
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _id(prefix: str) -> str:
+    return f'{prefix}-{uuid.uuid4().hex[:24]}'
+
+
+def fake_story(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """A small valid story whose title and ID are derived from the user prompt"""
+    prompt = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    first_line = next((line.strip('# ').strip() for line in prompt.splitlines() if line.strip()), 'Mock story')
+    title = first_line[:60]
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:6]
+    slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')[:40] or 'mock-story'
+
+    def text(label: str) -> str:
+        return ' '.join([f'This is the {label} of "{title}".'] +
+                        ['The young hero looks around carefully and thinks about what to do next.'] * 5)
+
+    return {
+        'metadata': {'title': title, 'description': f'A mock story about {title.lower()}.',
+                     'author': 'Mock Provider', 'storyId': f'{slug}-{digest}'},
+        'nodes': {
+            'start': {'text': text('beginning'), 'imagePrompt': 'a young girl with red hair at a crossroads',
+                      'choices': [{'text': 'Go to the forest', 'nextNode': 'forest'},
+                                  {'text': 'Go to the river', 'nextNode': 'river'}]},
+            'forest': {'text': text('forest'), 'imagePrompt': 'a young girl with red hair in a forest',
+                       'choices': [{'text': 'Climb the tree', 'nextNode': 'treetop-ending'},
+                                   {'text': 'Follow the path', 'nextNode': 'cabin-ending'}]},
+            'river': {'text': text('river'), 'imagePrompt': 'a young girl with red hair by a river',
+                      'choices': [{'text': 'Build a raft', 'nextNode': 'raft-ending'}]},
+            'treetop-ending': {'text': text('treetop ending'), 'imagePrompt': 'a treetop view', 'choices': []},
+            'cabin-ending': {'text': text('cabin ending'), 'imagePrompt': 'a cosy cabin', 'choices': []},
+            'raft-ending': {'text': text('raft ending'), 'imagePrompt': 'a raft on a river', 'choices': []},
+        },
+    }
+
+
+def fake_rewrite(prompt: str) -> Optional[Dict[str, Any]]:
+    """Rewritten nodes for a regenerate_nodes.py request (None for any other prompt)"""
+    match = re.search(r'^Return the rewritten nodes for these IDs: (.+)$', prompt, re.MULTILINE)
+    if not match:
+        return None
+    nodes = {}
+    for node_id in match.group(1).split(', '):
+        section = re.search(rf'^\[{re.escape(node_id)}\] .*?(?=^\[|^Allowed choice targets:)', prompt,
+                            re.MULTILINE | re.DOTALL)
+        current = re.search(r'^Current choices: (.+)$', section.group(0), re.MULTILINE) if section else None
+        choices = [{'text': text, 'nextNode': target} for text, target in
+                   (c.rsplit(' -> ', 1) for c in current.group(1).split('; '))] if current else []
+        nodes[node_id] = {'text': ' '.join([f'This is the rewritten {node_id}.'] +
+                                           ['The young hero takes a deep breath and tries again.'] * 5),
+                          'choices': choices}
+    return {'nodes': nodes}
+
+
+def chat_completion_body(request: Dict[str, Any]) -> Dict[str, Any]:
+    """A chat.completion response object answering request with a fake story (or node rewrites)"""
+    messages = request.get('messages', [])
+    prompt = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    content = json.dumps(fake_rewrite(prompt) or fake_story(messages), ensure_ascii=False)
+    prompt_tokens = sum(len(str(m.get('content', ''))) for m in request.get('messages', [])) // 4
+    return {
+        'id': _id('chatcmpl'),
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'mock'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                  'total_tokens': prompt_tokens + len(content) // 4},
+    }
+
+
+def chat_completion_chunks(request: Dict[str, Any], piece: int = 200) -> List[Dict[str, Any]]:
+    """chat.completion.chunk objects streaming the same fake story, plus a usage chunk if requested"""
+    body = chat_completion_body(request)
+    content = body['choices'][0]['message']['content']
+    base = {'id': body['id'], 'object': 'chat.completion.chunk', 'created': body['created'], 'model': body['model']}
+    chunks = [dict(base, choices=[{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])]
+    chunks += [dict(base, choices=[{'index': 0, 'delta': {'content': content[i:i + piece]}, 'finish_reason': None}])
+               for i in range(0, len(content), piece)]
+    chunks.append(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+    if (request.get('stream_options') or {}).get('include_usage'):
+        chunks.append(dict(base, choices=[], usage=body['usage']))
+    return chunks
+
+
+def tiny_png(seed: str, size: int = 256) -> bytes:
+    """A solid-colour PNG (colour derived from seed), small but decodable by Pillow"""
+    colour = hashlib.sha256(seed.encode('utf-8')).digest()[:3]
+    raw = b''.join(b'\x00' + colour * size for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+class MockProvider:
+    """In-memory state shared by all request handlers"""
+
+    def __init__(self, batch_delay: float = 2.0, latency: float = 0.0, image_latency: float = 0.0,
+                 jitter: float = 0.3, error_rate: float = 0.0, rate_limit_every: float = 0.0,
+                 rate_limit_duration: float = 2.0, seed: Optional[int] = None):
+        self.batch_delay = batch_delay
+        self.latency = latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_duration = rate_limit_duration
+        self.started = time.time()
+        self.random = random.Random(seed)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.images: Dict[str, bytes] = {}
+        self.stats = {'chat': 0, 'image': 0, 'download': 0, 'errors': 0, 'rate_limited': 0}
+        self.lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+    def delay(self, median: float) -> float:
+        """Simulated response time: log-normal around median, so there is a tail"""
+        if median <= 0:
+            return 0.0
+        with self.lock:
+            return median * self.random.lognormvariate(0, self.jitter) if self.jitter else median
+
+    def fault(self) -> Optional[Tuple[int, Dict[str, str], str]]:
+        """(status, headers, message) when this request should fail, else None"""
+        if self.rate_limit_every > 0:
+            into_window = (time.time() - self.started) % self.rate_limit_every
+            if into_window < self.rate_limit_duration:
+                self.count('rate_limited')
+                retry_after = self.rate_limit_duration - into_window
+                return 429, {'retry-after-ms': str(int(retry_after * 1000))}, 'Rate limit reached (mock burst)'
+        with self.lock:
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+        if failed:
+            self.count('errors')
+            return 500, {}, 'The server had an error while processing your request (mock)'
+        return None
+
+    def generate_image(self, body: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        data = tiny_png(body.get('prompt', ''))
+        if body.get('response_format', 'url') == 'b64_json':
+            item = {'b64_json': base64.b64encode(data).decode('ascii')}
+        else:
+            image_id = _id('img')
+            with self.lock:
+                self.images[image_id] = data
+            item = {'url': f'{base_url}/mock-images/{image_id}.png'}
+        item['revised_prompt'] = body.get('prompt', '')
+        return {'created': int(time.time()), 'data': [item]}
+
+    def add_file(self, data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = _id('file')
+        meta = {'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+        with self.lock:
+            self.files[file_id] = {'meta': meta, 'data': data}
+        return meta
+
+    def create_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if body.get('input_file_id') not in self.files:
+            raise KeyError(f"No such file: {body.get('input_file_id')}")
+        batch = {
+            'id': _id('batch'), 'object': 'batch', 'endpoint': body.get('endpoint', '/v1/chat/completions'),
+            'input_file_id': body['input_file_id'], 'completion_window': body.get('completion_window', '24h'),
+            'status': 'validating', 'created_at': int(time.time()), 'output_file_id': None, 'error_file_id': None,
+            'metadata': body.get('metadata'), 'errors': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        return batch
+
+    def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Advance a batch according to its age, completing it after batch_delay seconds"""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch['status'] in ('completed', 'failed', 'cancelled', 'expired'):
+                return batch
+            age = time.time() - batch['created_at']
+            if age >= self.batch_delay:
+                self._complete(batch)
+            elif age >= self.batch_delay / 2:
+                batch['status'] = 'in_progress'
+            return batch
+
+    def _complete(self, batch: Dict[str, Any]) -> None:
+        lines = self.files[batch['input_file_id']]['data'].decode('utf-8').splitlines()
+        outputs, errors = [], []
+        for line in filter(None, (line.strip() for line in lines)):
+            request = json.loads(line)
+            record = {'id': _id('batch_req'), 'custom_id': request.get('custom_id')}
+            if request.get('url') != '/v1/chat/completions':
+                errors.append(dict(record, response=None, error={
+                    'code': 'invalid_url', 'message': f"Unsupported url {request.get('url')}"}))
+                continue
+            outputs.append(dict(record, error=None, response={
+                'status_code': 200, 'request_id': _id('req'), 'body': chat_completion_body(request.get('body', {}))}))
+        now = int(time.time())
+        for name, records in (('output_file_id', outputs), ('error_file_id', errors)):
+            if records:
+                data = '\n'.join(json.dumps(r, ensure_ascii=False) for r in records).encode('utf-8') + b'\n'
+                file_id = _id('file')
+                self.files[file_id] = {'meta': {'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': now,
+                                                'filename': f'{batch["id"]}_{name}.jsonl', 'purpose': 'batch_output',
+                                                'status': 'processed'}, 'data': data}
+                batch[name] = file_id
+        batch.update(status='completed', completed_at=now,
+                     request_counts={'total': len(outputs) + len(errors), 'completed': len(outputs),
+                                     'failed': len(errors)})
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """Parse a multipart/form-data body into {field: (filename, data)}"""
+    message = BytesParser(policy=HTTP).parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    provider: MockProvider = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: Any, raw: bool = False, headers: Optional[Dict[str, str]] = None) -> None:
+        data = payload if raw else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream' if raw else 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        error_type = {429: 'rate_limit_exceeded', 500: 'server_error'}.get(status, 'invalid_request_error')
+        self._send(status, {'error': {'message': message, 'type': error_type}}, headers=headers)
+
+    def _base_url(self) -> str:
+        return f'http://{self.headers.get("Host") or "%s:%d" % self.server.server_address[:2]}/v1'
+
+    def _chat(self, request: Dict[str, Any]) -> None:
+        provider = self.provider
+        provider.count('chat')
+        fault = provider.fault()
+        if fault:
+            time.sleep(provider.delay(provider.latency) / 10)
+            return self._error(fault[0], fault[2], fault[1])
+        delay = provider.delay(provider.latency)
+        if not request.get('stream'):
+            time.sleep(delay)
+            return self._send(200, chat_completion_body(request))
+        # Server-sent events; the first token arrives after a third of the response time
+        chunks = chat_completion_chunks(request)
+        time.sleep(delay / 3)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(delay * 2 / 3 / len(chunks))
+        self.wfile.write(b'data: [DONE]\n\n')
+
+    def _image(self, request: Dict[str, Any]) -> None:
+        provider = self.provider
+        provider.count('image')
+        fault = provider.fault()
+        if fault:
+            time.sleep(provider.delay(provider.image_latency) / 10)
+            return self._error(fault[0], fault[2], fault[1])
+        time.sleep(provider.delay(provider.image_latency))
+        self._send(200, provider.generate_image(request, self._base_url()))
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        provider = self.provider
+        try:
+            if m := re.fullmatch(r'/v1/mock-images/([\w-]+)\.png', path):
+                provider.count('download')
+                return self._send(200, provider.images[m.group(1)], raw=True)
+            if m := re.fullmatch(r'/v1/files/([\w-]+)/content', path):
+                return self._send(200, provider.files[m.group(1)]['data'], raw=True)
+            if m := re.fullmatch(r'/v1/files/([\w-]+)', path):
+                return self._send(200, provider.files[m.group(1)]['meta'])
+            if m := re.fullmatch(r'/v1/batches/([\w-]+)', path):
+                return self._send(200, provider.get_batch(m.group(1)))
+            if path == '/v1/batches':
+                data = [provider.get_batch(b) for b in list(provider.batches)]
+                return self._send(200, {'object': 'list', 'data': data, 'has_more': False})
+        except KeyError as e:
+            return self._error(404, f'Not found: {e}')
+        self._error(404, f'Unknown path {path}')
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        provider = self.provider
+        body = self._body()
+        try:
+            if path == '/v1/chat/completions':
+                return self._chat(json.loads(body))
+            if path == '/v1/images/generations':
+                return self._image(json.loads(body))
+            if path == '/v1/files':
+                fields = parse_multipart(self.headers.get('Content-Type', ''), body)
+                filename, data = fields['file']
+                purpose = fields.get('purpose', (None, b'batch'))[1].decode()
+                return self._send(200, provider.add_file(data, filename or 'upload.jsonl', purpose))
+            if path == '/v1/batches':
+                return self._send(200, provider.create_batch(json.loads(body)))
+            if m := re.fullmatch(r'/v1/batches/([\w-]+)/cancel', path):
+                batch = provider.get_batch(m.group(1))
+                if batch['status'] not in ('completed', 'failed', 'expired'):
+                    batch['status'] = 'cancelled'
+                return self._send(200, batch)
+        except KeyError as e:
+            return self._error(404, f'Not found: {e}')
+        except ValueError as e:
+            return self._error(400, str(e))
+        self._error(404, f'Unknown path {path}')
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8765, **options) -> ThreadingHTTPServer:
+    """Create (but do not start) a mock server; port 0 picks a free port"""
+    provider = MockProvider(**options)
+    handler = type('Handler', (MockHandler,), {'provider': provider})
+    # A deeper listen backlog than the default 5, for benchmarks with many parallel clients
+    server_class = type('MockServer', (ThreadingHTTPServer,), {'request_queue_size': 128})
+    server = server_class((host, port), handler)
+    server.provider = provider
+    return server
+
+
+def start_background(host: str = '127.0.0.1', port: int = 0, **options) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a mock server on a daemon thread; returns (server, base_url)"""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/v1'
+
+
+def add_fault_args(parser) -> None:
+    """Latency and failure injection options, shared with benchmark.py"""
+    parser.add_argument('--latency', type=float, default=0.0, help='Median seconds per chat completion (default: 0)')
+    parser.add_argument('--image-latency', type=float, default=0.0, help='Median seconds per image generation (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.3, help='Spread of the log-normal latency distribution (default: 0.3)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of chat/image requests answered with HTTP 500 (default: 0)')
+    parser.add_argument('--rate-limit-every', type=float, default=0.0, help='Start a burst of HTTP 429s every N seconds (default: never)')
+    parser.add_argument('--rate-limit-duration', type=float, default=2.0, help='Length of each 429 burst in seconds (default: 2)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for latency and errors (default: random)')
+
+
+def fault_options(args) -> Dict[str, Any]:
+    """MockProvider keyword arguments for the options added by add_fault_args()"""
+    return {'latency': args.latency, 'image_latency': args.image_latency, 'jitter': args.jitter,
+            'error_rate': args.error_rate, 'rate_limit_every': args.rate_limit_every,
+            'rate_limit_duration': args.rate_limit_duration, 'seed': args.seed}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Local stand-in for the OpenAI chat, image, files and batches API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--batch-delay', type=float, default=2.0, help='Seconds before a submitted batch completes (default: 2)')
+    add_fault_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = make_server(args.host, args.port, batch_delay=args.batch_delay, **fault_options(args))
+    print(f'🧪 Mock provider on http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C to stop)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Create compressed, resized variants of story images for responsive loading.
+
+Provider images are saved as 1024x1024 files of 1-3 MB each. This script
+re-encodes every node image to WebP (or JPEG) at several widths and records them
+in story.json as `imageVariants`, which story-reader.js turns into a srcset so
+phones download a small file. The original image is kept as the source.
+
+Usage:
+    python optimise_images.py --story-id STORY_ID [--widths 320 640 1024] [--format webp] [--quality 80]
+    python optimise_images.py --all [--workers 8]      # backfill every story in parallel
+
+Requires Pillow (pip install Pillow).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_WIDTHS = (320, 640, 1024)
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+}
+STORIES_DIR = Path(__file__).parent.parent / 'stories'
+
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec('PIL') is not None
+
+
+def variant_path(image_path: str, width: int, fmt: str = 'webp') -> str:
+    """images/start.jpg -> images/start-640.webp"""
+    stem, _ = os.path.splitext(image_path)
+    return f'{stem}-{width}{FORMATS[fmt][1]}'
+
+
+def optimise_image(story_dir: Path, image_path: str, widths=DEFAULT_WIDTHS, fmt: str = 'webp',
+                   quality: int = 80, force: bool = False) -> List[Dict[str, Any]]:
+    """
+    Write resized variants of story_dir/image_path and return their descriptions.
+    Variants newer than the source image are reused rather than re-encoded, unless
+    force is set: an image placed from the image store is a hard link that keeps the
+    stored file's (older) mtime, so callers force the images they have just replaced.
+    """
+    from PIL import Image
+
+    pil_format, _, mime = FORMATS[fmt]
+    source = Path(story_dir) / image_path
+    source_mtime = source.stat().st_mtime
+    variants = []
+    # Image.open only reads the header, so fresh variants are reused without decoding the source
+    with Image.open(source) as img:
+        # Never upscale; a source narrower than every width gets a single variant at its own size
+        targets = sorted({min(w, img.width) for w in widths})
+        rgb = None
+        for width in targets:
+            rel_path = variant_path(image_path, width, fmt)
+            out_path = Path(story_dir) / rel_path
+            if force or not out_path.exists() or out_path.stat().st_mtime < source_mtime:
+                if rgb is None:
+                    rgb = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+                height = round(rgb.height * width / rgb.width)
+                resized = rgb if width == rgb.width else rgb.resize((width, height), Image.LANCZOS)
+                save_args = {'quality': quality}
+                if pil_format == 'JPEG':
+                    save_args.update(optimize=True, progressive=True)
+                else:
+                    save_args['method'] = 6
+                tmp_path = out_path.with_name(f'.{out_path.name}.part')
+                resized.save(tmp_path, pil_format, **save_args)
+                os.replace(tmp_path, out_path)
+            variants.append({'src': rel_path, 'width': width, 'type': mime})
+    return variants
+
+
+def _optimise_job(job):
+    """Worker entry point: (story_dir, node_id, image_path, widths, fmt, quality, force)"""
+    story_dir, node_id, image_path, widths, fmt, quality, force = job
+    try:
+        return story_dir, node_id, optimise_image(Path(story_dir), image_path, widths, fmt, quality, force), None
+    except Exception as e:
+        return story_dir, node_id, None, str(e)
+
+
+def optimise_nodes(jobs, workers: Optional[int] = None, processes: bool = False) -> Dict[tuple, Any]:
+    """
+    Run optimisation jobs in parallel. Threads by default: Pillow releases the GIL while
+    resizing and encoding, and the generator calls this from its own worker threads,
+    where forking a process pool could deadlock the children on locks held by other
+    threads. Only the standalone CLI, which is single-threaded, uses processes.
+    Returns {(story_dir, node_id): variants} for every job that succeeded.
+    """
+    results = {}
+    if not jobs:
+        return results
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        outcomes = map(_optimise_job, jobs)
+    else:
+        executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+        outcomes = (f.result() for f in as_completed([executor.submit(_optimise_job, job) for job in jobs]))
+    try:
+        for story_dir, node_id, variants, error in outcomes:
+            if error:
+                print(f'   ✗ {Path(story_dir).name}/{node_id}: {error}')
+            else:
+                results[(story_dir, node_id)] = variants
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return results
+
+
+def optimise_story_nodes(story_dir: Path, nodes: Dict[str, Any], node_ids=None, widths=DEFAULT_WIDTHS,
+                         fmt: str = 'webp', quality: int = 80, workers: Optional[int] = None,
+                         replaced=()) -> int:
+    """
+    Create variants for nodes that have an image and set node['imageVariants'].
+    Only node_ids are processed when given; the variants of nodes in replaced (images
+    written in this run) are always re-encoded. Returns the number of nodes updated.
+    """
+    if not pillow_available():
+        print('   ⚠️  Pillow is not installed; skipping image optimisation (pip install Pillow)')
+        return 0
+    jobs = []
+    for node_id, node in nodes.items():
+        if node_ids is not None and node_id not in node_ids:
+            continue
+        if node.get('image') and (Path(story_dir) / node['image']).exists():
+            jobs.append((str(story_dir), node_id, node['image'], tuple(widths), fmt, quality, node_id in replaced))
+    results = optimise_nodes(jobs, workers)
+    for (_, node_id), variants in results.items():
+        nodes[node_id]['imageVariants'] = variants
+    return len(results)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Create compressed multi-size image variants for CYOA stories')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--story-id', help='Story ID (folder name in stories/)')
+    target.add_argument('--all', action='store_true', help='Backfill every story in stories/')
+    parser.add_argument('--widths', type=int, nargs='+', default=list(DEFAULT_WIDTHS), help='Variant widths in pixels (default: 320 640 1024)')
+    parser.add_argument('--format', default='webp', choices=sorted(FORMATS), help='Output format (default: webp)')
+    parser.add_argument('--quality', type=int, default=80, help='Encoder quality 1-100 (default: 80)')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel worker processes (default: number of CPU cores)')
+    parser.add_argument('--force', action='store_true', help='Re-encode every variant, even those newer than their image')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not pillow_available():
+        print('Error: Pillow is required (pip install Pillow)')
+        sys.exit(1)
+
+    if args.all:
+        story_dirs = sorted(p for p in STORIES_DIR.iterdir()
+                            if p.is_dir() and not p.name.startswith('.') and (p / 'story.json').exists())
+    else:
+        story_dirs = [STORIES_DIR / args.story_id]
+        if not (story_dirs[0] / 'story.json').exists():
+            print(f"Error: {story_dirs[0] / 'story.json'} not found.")
+            sys.exit(1)
+
+    # Collect jobs from every story first so one process pool spans all of them
+    stories = {}
+    jobs = []
+    for story_dir in story_dirs:
+        with open(story_dir / 'story.json', 'r', encoding='utf-8') as f:
+            story = json.load(f)
+        stories[str(story_dir)] = story
+        for node_id, node in story.get('nodes', {}).items():
+            if node.get('image') and (story_dir / node['image']).exists():
+                jobs.append((str(story_dir), node_id, node['image'], tuple(args.widths), args.format, args.quality,
+                             args.force))
+    print(f'🖼  Optimising {len(jobs)} images across {len(story_dirs)} stories...')
+
+    results = optimise_nodes(jobs, args.workers, processes=True)
+    for (story_dir, node_id), variants in results.items():
+        stories[story_dir]['nodes'][node_id]['imageVariants'] = variants
+
+    for story_dir, story in stories.items():
+        if not any(key[0] == story_dir for key in results):
+            continue
+        with open(Path(story_dir) / 'story.json', 'w', encoding='utf-8') as f:
+            json.dump(story, f, indent=2, ensure_ascii=False)
+        print(f'   ✓ Updated {Path(story_dir).name}/story.json')
+    print(f'✓ {len(results)}/{len(jobs)} images optimised')
+
+
+if __name__ == '__main__':
+    main()
@@ -150,6 +150,8 @@ def proofread_story(story_id: str):
         for node_id in rejected_nodes:
             print(f"  - {node_id}")
         print("\n❌ Story NOT published (contains rejected nodes)")
+        print("\n🔁 Regenerate just these nodes with:")
+        print(f"   python regenerate_nodes.py --api-key ... --story-id {story_id} --nodes {' '.join(rejected_nodes)}")
         return False
     
     # All nodes accepted - publish to index.json
@@ -209,9 +211,10 @@ def publish_story(story_id: str, story_data: dict) -> bool:
     return True
 
 
-def main():
+def main(argv=None):
     """Entry point."""
-    if len(sys.argv) < 2:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
         print("Usage: python proofread_story.py <story-id>")
         print("\nExample: python proofread_story.py amulets-guardian")
         print("\nStories in 'stories/' directory:")
@@ -266,7 +269,7 @@ def main():
             print("\nAll stories with story.json are published (in index.json).")
         sys.exit(1)
     
-    story_id = sys.argv[1]
+    story_id = argv[0]
     success = proofread_story(story_id)
     
     if success:
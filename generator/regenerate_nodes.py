@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Regenerate selected nodes of an existing story without touching the rest.
+
+Only the rejected nodes and their neighbourhood (parent nodes and the choices that
+lead in, current children) are sent to the model, so a fix-up costs a few seconds
+and a fraction of the tokens of a full regeneration. The node files and choice
+edges of the regenerated nodes are rewritten; every other node, and every image,
+is left as it is. Images of regenerated nodes become stale and are rebuilt by
+generate_images.py (their fingerprint no longer matches).
+
+Usage:
+    python regenerate_nodes.py --api-key KEY --story-id STORY_ID --nodes node-a node-b [--subtree] [--notes "too scary"]
+
+- --subtree also regenerates nodes that can only be reached through the given nodes.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Set
+
+from api_scheduler import add_scheduler_args, scheduler_from_args
+from generate_story import request_json_completion, write_node_text
+from image_io import build_image_prompt, image_fingerprint
+from proofread_story import traverse_story_bfs
+from telemetry import add_telemetry_args, telemetry_from_args, stage
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+STORIES_DIR = Path(__file__).parent.parent / 'stories'
+
+REGENERATE_INSTRUCTIONS = """
+You are revising part of an existing choose-your-own-adventure story. The reader
+rejected the nodes listed below. Rewrite each of them so it fits the surrounding
+story: it must follow on naturally from the parent nodes that lead to it and lead
+into the nodes its choices point to. Keep ending nodes as endings (no choices) and
+keep every other node's choices pointing at node IDs listed as allowed targets.
+Return ONLY a JSON object of the form:
+  {"nodes": {"<node ID>": {"text": "<full node text>", "choices": [{"text": "...", "nextNode": "<node ID>"}]}}}"""
+
+
+def read_node_text(story_dir: Path, node: Dict[str, Any]) -> str:
+    path = story_dir / node.get('textFile', '')
+    if not node.get('textFile') or not path.exists():
+        return ''
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def parents_of(nodes: Dict[str, Any]) -> Dict[str, List[tuple]]:
+    """Map each node ID to the (parent ID, choice text) pairs that lead to it"""
+    parents = {}
+    for node_id, node in nodes.items():
+        for choice in node.get('choices', []):
+            parents.setdefault(choice.get('nextNode'), []).append((node_id, choice.get('text', '')))
+    return parents
+
+
+def exclusive_subtree(nodes: Dict[str, Any], roots: Set[str]) -> Set[str]:
+    """Nodes (including roots) that cannot be reached from start without passing through a root"""
+    reachable = set()
+    queue = deque(['start'] if 'start' not in roots else [])
+    while queue:
+        node_id = queue.popleft()
+        if node_id in reachable or node_id in roots or node_id not in nodes:
+            continue
+        reachable.add(node_id)
+        queue.extend(c.get('nextNode') for c in nodes[node_id].get('choices', []))
+    below = set()
+    queue = deque(roots)
+    while queue:
+        node_id = queue.popleft()
+        if node_id in below or node_id in reachable or node_id not in nodes:
+            continue
+        below.add(node_id)
+        queue.extend(c.get('nextNode') for c in nodes[node_id].get('choices', []))
+    return below
+
+
+def build_context(story_dir: Path, story: Dict[str, Any], targets: List[str], notes: str = '') -> str:
+    """Describe the targets and their immediate neighbourhood for the model"""
+    nodes = story['nodes']
+    parents = parents_of(nodes)
+    metadata = story.get('metadata', {})
+    target_set = set(targets)
+    lines = [
+        f"Story: {metadata.get('title', '')}",
+        f"Description: {metadata.get('description', '')}",
+    ]
+    style_kit = metadata.get('styleKit', {})
+    if style_kit.get('character'):
+        lines.append(f"Main character: {style_kit['character']}")
+    if notes:
+        lines.append(f"Reviewer notes: {notes}")
+
+    neighbours = []
+    for node_id in targets:
+        for parent_id, _ in parents.get(node_id, []):
+            neighbours.append(parent_id)
+        for choice in nodes[node_id].get('choices', []):
+            neighbours.append(choice.get('nextNode'))
+    context_ids = [n for n in dict.fromkeys(neighbours) if n in nodes and n not in target_set]
+    if context_ids:
+        lines.append('\nSurrounding nodes (approved, do not rewrite):')
+        for node_id in context_ids:
+            lines.append(f'\n[{node_id}]\n{read_node_text(story_dir, nodes[node_id])}')
+
+    lines.append('\nNodes to rewrite:')
+    for node_id in targets:
+        node = nodes[node_id]
+        incoming = [f'"{text}" from {parent_id}' for parent_id, text in parents.get(node_id, [])]
+        lines.append(f'\n[{node_id}] ' + ('ending node' if not node.get('choices') else 'has choices'))
+        if incoming:
+            lines.append(f"Reached by: {'; '.join(incoming)}")
+        current = [f"{c.get('text', '')} -> {c.get('nextNode')}" for c in node.get('choices', [])]
+        if current:
+            lines.append(f"Current choices: {'; '.join(current)}")
+        lines.append(f'Rejected text:\n{read_node_text(story_dir, node)}')
+
+    lines.append(f"\nAllowed choice targets: {', '.join(nodes)}")
+    lines.append(f"Return the rewritten nodes for these IDs: {', '.join(targets)}")
+    return '\n'.join(lines)
+
+
+def validate_rewrites(result: Dict[str, Any], targets: List[str], nodes: Dict[str, Any]) -> List[str]:
+    """Return a list of problems with the model's rewritten nodes"""
+    problems = []
+    rewritten = result.get('nodes', {})
+    for node_id in targets:
+        node = rewritten.get(node_id)
+        if not isinstance(node, dict) or not str(node.get('text', '')).strip():
+            problems.append(f'{node_id}: missing text')
+            continue
+        choices = node.get('choices', [])
+        if not isinstance(choices, list):
+            problems.append(f'{node_id}: choices must be a list')
+            continue
+        if bool(choices) != bool(nodes[node_id].get('choices')):
+            problems.append(f'{node_id}: must {"have choices" if nodes[node_id].get("choices") else "stay an ending"}')
+        for choice in choices:
+            if not isinstance(choice, dict) or not choice.get('text') or choice.get('nextNode') not in nodes:
+                problems.append(f'{node_id}: invalid choice {json.dumps(choice, ensure_ascii=False)}')
+    return problems
+
+
+def regenerate_nodes(client: OpenAI, story_dir: Path, story: Dict[str, Any], targets: List[str],
+                     model: str, system_prompt: str = '', notes: str = '', attempts: int = 2) -> Dict[str, Any]:
+    """Ask the model for new versions of the target nodes; returns {node_id: {text, choices}}"""
+    messages = [
+        {"role": "system", "content": system_prompt + REGENERATE_INSTRUCTIONS},
+        {"role": "user", "content": build_context(story_dir, story, targets, notes)},
+    ]
+    for attempt in range(attempts):
+        result = request_json_completion(client, model, messages)
+        problems = validate_rewrites(result, targets, story['nodes'])
+        if not problems:
+            return {nid: result['nodes'][nid] for nid in targets}
+        print(f"   ⚠️  Attempt {attempt + 1}: {'; '.join(problems)}")
+        messages += [
+            {"role": "assistant", "content": json.dumps(result, ensure_ascii=False)},
+            {"role": "user", "content": 'Please fix these problems and return all requested nodes again:\n'
+                                        + '\n'.join(problems)},
+        ]
+    raise ValueError(f'Could not regenerate valid nodes: {"; ".join(problems)}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate rejected nodes of an existing CYOA story')
+    parser.add_argument('--api-key', required=True, help='Your OpenAI API key (any value for mock_provider.py)')
+    parser.add_argument('--base-url', default=None, help='API base URL, e.g. http://127.0.0.1:8765/v1 for mock_provider.py')
+    parser.add_argument('--story-id', required=True, help='Story ID (folder name in stories/)')
+    parser.add_argument('--nodes', nargs='+', required=True, help='IDs of the nodes to regenerate')
+    parser.add_argument('--subtree', action='store_true', help='Also regenerate nodes only reachable through the given nodes')
+    parser.add_argument('--notes', default='', help='What was wrong with the rejected nodes, passed to the model')
+    parser.add_argument('--system-prompt', help='Path to the system prompt used for the story (optional, improves consistency)')
+    parser.add_argument('--model', default='gpt-4o', help='OpenAI model to use (default: gpt-4o)')
+    parser.add_argument('--image-model', default='dall-e-3', help='Image model the story\'s images were made with (default: dall-e-3)')
+    parser.add_argument('--image-quality', default='standard', choices=['standard','hd'], help='Image quality the story\'s images were made with (standard or hd)')
+    parser.add_argument('--dry-run', action='store_true', help='Show which nodes would be regenerated and the context sent, then exit')
+    add_scheduler_args(parser)
+    add_telemetry_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    story_dir = STORIES_DIR / args.story_id
+    story_json_path = story_dir / 'story.json'
+    if not story_json_path.exists():
+        print(f"Error: {story_json_path} not found.")
+        sys.exit(1)
+    with open(story_json_path, 'r', encoding='utf-8') as f:
+        story = json.load(f)
+    nodes = story['nodes']
+
+    unknown = [n for n in args.nodes if n not in nodes]
+    if unknown:
+        print(f"Error: unknown node(s): {', '.join(unknown)}")
+        sys.exit(1)
+    targets = list(dict.fromkeys(args.nodes))
+    if args.subtree:
+        below = exclusive_subtree(nodes, set(targets))
+        targets += sorted(below - set(targets))
+    print(f"🔁 Regenerating {len(targets)} of {len(nodes)} nodes: {', '.join(targets)}")
+
+    system_prompt = ''
+    if args.system_prompt:
+        with open(args.system_prompt, 'r', encoding='utf-8') as f:
+            system_prompt = f.read()
+    if args.dry_run:
+        print(build_context(story_dir, story, targets, args.notes))
+        return
+
+    from openai import OpenAI
+
+    recorder = telemetry_from_args(args, 'regenerate_nodes')
+    client = scheduler_from_args(args, recorder).wrap(OpenAI(api_key=args.api_key, base_url=args.base_url, max_retries=0))
+    try:
+        with stage('llm', recorder):
+            rewritten = regenerate_nodes(client, story_dir, story, targets, args.model, system_prompt, args.notes)
+    except Exception as e:
+        print(f"Error regenerating nodes: {e}")
+        sys.exit(1)
+
+    style_kit = story['metadata'].get('styleKit', {})
+    for node_id, new_node in rewritten.items():
+        if nodes[node_id].get('image') and not nodes[node_id].get('imageFingerprint'):
+            # Older images have no fingerprint; record the one of the text they were made from
+            # so generate_images.py sees them as stale instead of adopting them
+            nodes[node_id]['imageFingerprint'] = image_fingerprint(
+                build_image_prompt(read_node_text(story_dir, nodes[node_id]), style_kit),
+                args.image_model, args.image_quality)
+        write_node_text(story_dir, node_id, new_node)
+        nodes[node_id]['textFile'] = new_node['textFile']
+        nodes[node_id]['choices'] = [{'text': c['text'], 'nextNode': c['nextNode']} for c in new_node.get('choices', [])]
+        print(f"   ✓ {node_id}")
+    with open(story_json_path, 'w', encoding='utf-8') as f:
+        json.dump(story, f, indent=2, ensure_ascii=False)
+    print(f"✓ Updated {story_json_path}")
+
+    orphaned = set(nodes) - set(traverse_story_bfs(story))
+    if orphaned:
+        print(f"⚠️  No longer reachable from start: {', '.join(sorted(orphaned))}")
+
+    stale = [n for n in targets if nodes[n].get('image')]
+    if stale:
+        print(f"\n🖼  {len(stale)} regenerated node(s) have images; refresh them with:")
+        print(f"   python generate_images.py --api-key ... --story-id {args.story_id} "
+              f"--image-model {args.image_model} --image-quality {args.image_quality}")
+    print(f"📝 Proofread the changes with: python proofread_story.py {args.story_id}")
+
+
+if __name__ == '__main__':
+    main()
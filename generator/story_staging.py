@@ -0,0 +1,161 @@
+"""
+Build stories in a staging directory and publish them with an atomic rename.
+
+A story is generated into stories/.staging/<storyId>.<job>/ (node files, images,
+checkpoint, story.json) and only moved to stories/<storyId>/ once it is complete,
+so the reader, the proofreader and the other scripts never see a half-written
+story. Loaders skip dot-directories, which keeps the staging area invisible. The
+job suffix is unique per build, so concurrent builds (batch workers, or two prompts
+that produce the same storyId) never share a directory.
+
+A failed build is removed automatically unless it has a checkpoint, in which case
+it is kept for `generate_story.py --resume <storyId>`. An existing story is only
+replaced when asked to (--overwrite); if a run dies halfway through that swap, the
+next run moves the previous version back into place.
+"""
+
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from checkpoint import Checkpoint
+
+
+STAGING_DIRNAME = '.staging'
+# Staging directories without a checkpoint older than this are left over from a crash
+STALE_AFTER_SECONDS = 24 * 60 * 60
+
+
+def staging_root(stories_dir: Path) -> Path:
+    return Path(stories_dir) / STAGING_DIRNAME
+
+
+def new_staging_dir(stories_dir: Path, story_id: str) -> Path:
+    """A fresh build directory for story_id, unique to this job (not created yet)"""
+    return staging_root(stories_dir) / f'{story_id}.{uuid.uuid4().hex[:12]}'
+
+
+def story_id_of(staged: Path) -> str:
+    """stories/.staging/<storyId>.<job> -> storyId (story IDs never contain dots)"""
+    return Path(staged).name.split('.')[0]
+
+
+def _flush_to_disk(directory: Path) -> None:
+    """fsync the files written while staging, then their directories (deepest first)"""
+    directories = [Path(directory)]
+    for path in Path(directory).rglob('*'):
+        if path.is_dir():
+            directories.append(path)
+        elif path.is_file():
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+    for path in sorted(directories, key=lambda p: len(p.parts), reverse=True):
+        _fsync_dir(path)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Persist a rename in directory (not supported on Windows, where it is not needed)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish(stories_dir: Path, staged: Path, overwrite: bool = False) -> Path:
+    """
+    Move a finished staging directory to stories/<storyId>/. With overwrite, a previous
+    version of the story is swapped out and deleted, so the story directory is never
+    partially written; without it an existing story raises FileExistsError.
+    """
+    stories_dir = Path(stories_dir)
+    staged = Path(staged)
+    final = stories_dir / story_id_of(staged)
+    if final.exists() and not overwrite:
+        raise FileExistsError(f'stories/{final.name}/ already exists; pass --overwrite to replace it')
+    _flush_to_disk(staged)
+    old = None
+    if final.exists():
+        old = staging_root(stories_dir) / f'{staged.name}.old-{int(time.time())}'
+        os.replace(final, old)
+    os.replace(staged, final)
+    _fsync_dir(stories_dir)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def discard(staged: Path) -> bool:
+    """
+    Clean up after a failed build. The staging directory is kept (returns False) when it
+    holds a checkpoint the build can be resumed from.
+    """
+    staged = Path(staged)
+    if not staged.exists() or Checkpoint.exists(staged):
+        return False
+    shutil.rmtree(staged, ignore_errors=True)
+    return True
+
+
+def find_resumable(stories_dir: Path, story_id: str) -> Optional[Path]:
+    """
+    Directory holding the checkpoint for story_id: the most recent staged build first,
+    then a story built in place
+    """
+    root = staging_root(stories_dir)
+    staged = [p for p in root.glob(f'{story_id}.*') if '.old-' not in p.name and story_id_of(p) == story_id] \
+        if root.exists() else []
+    for directory in sorted(staged, key=lambda p: p.stat().st_mtime, reverse=True) + [Path(stories_dir) / story_id]:
+        if Checkpoint.exists(directory):
+            return directory
+    return None
+
+
+def restore_swapped(stories_dir: Path) -> List[str]:
+    """
+    Move a previous story version back to stories/<storyId>/ when publish() was interrupted
+    after swapping it out but before the new build took its place. Returns the restored IDs.
+    """
+    root = staging_root(stories_dir)
+    if not root.exists():
+        return []
+    restored = []
+    swapped = sorted((p for p in root.iterdir() if p.is_dir() and '.old-' in p.name),
+                     key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in swapped:
+        final = Path(stories_dir) / story_id_of(path)
+        if not final.exists():
+            os.replace(path, final)
+            _fsync_dir(Path(stories_dir))
+            restored.append(final.name)
+    return restored
+
+
+def clean_stale(stories_dir: Path, max_age: float = STALE_AFTER_SECONDS) -> int:
+    """
+    Remove staging directories left behind by crashed runs (no checkpoint, not modified
+    recently). A swapped-out story version is only removed once its story is back in place.
+    """
+    root = staging_root(stories_dir)
+    if not root.exists():
+        return 0
+    restore_swapped(stories_dir)
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in root.iterdir():
+        if not path.is_dir():
+            continue
+        leftover_swap = '.old-' in path.name and (Path(stories_dir) / story_id_of(path)).exists()
+        if leftover_swap or ('.old-' not in path.name and not Checkpoint.exists(path)
+                             and path.stat().st_mtime < cutoff):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,156 @@
+"""
+Incremental parser for streamed story JSON.
+
+The model returns a single JSON object of the form
+    {"metadata": {...}, "nodes": {"start": {...}, "other-node": {...}}}
+When the response is streamed, StreamingStoryParser is fed the text chunks as
+they arrive and reports metadata and each node as soon as its JSON object is
+complete, so node files can be written before the whole response has finished.
+"""
+
+import json
+from typing import Any, Callable, Dict, Optional
+
+
+_WHITESPACE = ' \t\n\r'
+
+
+class StreamingStoryParser:
+    """Parse a streamed story JSON object, emitting metadata and nodes as they complete."""
+
+    def __init__(self,
+                 on_node: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 on_metadata: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.on_node = on_node
+        self.on_metadata = on_metadata
+        self.buffer = ''
+        self.emitted = set()
+        self._decoder = json.JSONDecoder()
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+        self._broken = False
+
+    def feed(self, chunk: str) -> None:
+        """Append a chunk of response text and emit anything that is now complete"""
+        if not chunk:
+            return
+        self.buffer += chunk
+        if not self._broken:
+            try:
+                while self._step():
+                    pass
+            except ValueError:
+                # Not the shape we expected; fall back to parsing everything in close()
+                self._broken = True
+
+    def close(self) -> Dict[str, Any]:
+        """Parse the full response and emit any nodes the incremental pass missed"""
+        story_data = json.loads(self.buffer)
+        if self._state != 'done':
+            if self.on_metadata and isinstance(story_data.get('metadata'), dict) and 'metadata' not in self.emitted:
+                self.emitted.add('metadata')
+                self.on_metadata(story_data['metadata'])
+            for node_id, node_data in (story_data.get('nodes') or {}).items():
+                self._emit_node(node_id, node_data)
+        return story_data
+
+    def _emit_node(self, node_id: str, node_data: Any) -> None:
+        if ('node', node_id) in self.emitted or not isinstance(node_data, dict):
+            return
+        self.emitted.add(('node', node_id))
+        if self.on_node:
+            self.on_node(node_id, node_data)
+
+    def _skip(self, pos: int, chars: str = _WHITESPACE) -> int:
+        while pos < len(self.buffer) and self.buffer[pos] in chars:
+            pos += 1
+        return pos
+
+    def _decode(self, pos: int):
+        """
+        Decode one JSON value at pos. Returns (value, end) or None if the value
+        is not complete yet. A value only counts as complete once a following
+        non-whitespace character has arrived, so numbers are never cut short.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self.buffer, pos)
+        except json.JSONDecodeError:
+            return None
+        if self._skip(end) >= len(self.buffer):
+            return None
+        return value, end
+
+    def _read_key(self):
+        """Read a '"key":' pair at the current position, or None if incomplete"""
+        pos = self._skip(self._pos)
+        if pos >= len(self.buffer):
+            return None
+        if self.buffer[pos] != '"':
+            raise ValueError(f'Expected object key at offset {pos}')
+        decoded = self._decode(pos)
+        if decoded is None:
+            return None
+        key, end = decoded
+        colon = self._skip(end)
+        if colon >= len(self.buffer):
+            return None
+        if self.buffer[colon] != ':':
+            raise ValueError(f'Expected ":" at offset {colon}')
+        return key, colon + 1
+
+    def _step(self) -> bool:
+        """Advance the state machine by one token; returns False when more input is needed"""
+        pos = self._skip(self._pos)
+        if pos >= len(self.buffer):
+            return False
+
+        if self._state == 'start':
+            if self.buffer[pos] != '{':
+                raise ValueError('Story response is not a JSON object')
+            self._pos, self._state = pos + 1, 'key'
+            return True
+
+        if self._state in ('key', 'node_key'):
+            pos = self._skip(pos, _WHITESPACE + ',')
+            if pos >= len(self.buffer):
+                return False
+            if self.buffer[pos] == '}':
+                self._pos = pos + 1
+                self._state = 'done' if self._state == 'key' else 'key'
+                return self._state != 'done'
+            self._pos = pos
+            read = self._read_key()
+            if read is None:
+                return False
+            self._key, self._pos = read
+            if self._state == 'node_key':
+                self._state = 'node_value'
+            elif self._key == 'nodes':
+                self._state = 'nodes_open'
+            else:
+                self._state = 'value'
+            return True
+
+        if self._state == 'nodes_open':
+            if self.buffer[pos] != '{':
+                raise ValueError('"nodes" is not a JSON object')
+            self._pos, self._state = pos + 1, 'node_key'
+            return True
+
+        if self._state in ('value', 'node_value'):
+            decoded = self._decode(pos)
+            if decoded is None:
+                return False
+            value, self._pos = decoded
+            if self._state == 'node_value':
+                self._emit_node(self._key, value)
+                self._state = 'node_key'
+            else:
+                if self._key == 'metadata' and isinstance(value, dict) and self.on_metadata:
+                    self.emitted.add('metadata')
+                    self.on_metadata(value)
+                self._state = 'key'
+            return True
+
+        return False
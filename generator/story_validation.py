@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Schema and graph validation for generated stories, with targeted repair.
+
+validate_story() checks a story (as returned by the model, or a story.json on disk)
+for structural problems: missing metadata fields, nodes without text, malformed
+choices, choices pointing at nodes that do not exist, unsafe node IDs, nodes that
+cannot be reached from "start" and graphs with no reachable ending.
+
+validate_and_repair() is used by generate_story.py on the model output. Problems
+that can be fixed locally (unsafe IDs, unreachable nodes) are fixed without an API
+call; broken or missing nodes are re-requested on their own, with the story graph
+as context, for a bounded number of attempts. Problems that make the response
+unusable (no nodes, no start node) fail immediately.
+
+Usage (check stories already on disk):
+    python story_validation.py --story-id STORY_ID
+    python story_validation.py --all
+"""
+import argparse
+import json
+import re
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+STORIES_DIR = Path(__file__).parent.parent / 'stories'
+SAFE_ID = re.compile(r'^[a-z0-9][a-z0-9_-]*$', re.IGNORECASE)
+REQUIRED_METADATA = ('title', 'description', 'storyId')
+# Problems that mean the response is unusable; no point asking for fragments
+FATAL_KINDS = {'schema', 'no-ending'}
+
+REPAIR_INSTRUCTIONS = """
+
+REPAIR MODE: A story you generated has a few problems. You are given the story graph
+(node IDs, a short excerpt of each node and its choices) and a list of problems.
+Fix only what is listed. Return ONLY a JSON object of the form:
+  {"metadata": {<only if metadata fields were requested>},
+   "nodes": {"<node ID>": {"text": "<full node text>", "imagePrompt": "<image prompt>",
+                           "choices": [{"text": "...", "nextNode": "<existing node ID>"}]}}}
+Every nextNode must be a node ID from the graph or one of the nodes you are writing.
+Ending nodes have an empty "choices" list."""
+
+
+class StoryIssue:
+    """One problem found in a story"""
+
+    def __init__(self, kind: str, message: str, node_id: Optional[str] = None):
+        self.kind = kind
+        self.message = message
+        self.node_id = node_id
+
+    @property
+    def fatal(self) -> bool:
+        return self.kind in FATAL_KINDS
+
+    def __str__(self) -> str:
+        return f'{self.node_id}: {self.message}' if self.node_id else self.message
+
+    def __repr__(self) -> str:
+        return f'StoryIssue({self.kind!r}, {str(self)!r})'
+
+
+class StoryValidationError(ValueError):
+    """Raised when a story still has problems after repair"""
+
+    def __init__(self, issues: List[StoryIssue]):
+        self.issues = issues
+        super().__init__('Invalid story: ' + '; '.join(str(i) for i in issues))
+
+
+def slugify(value: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-') or 'story'
+
+
+def _node_text(node: Dict[str, Any], story_dir: Optional[Path]) -> Optional[str]:
+    """The node's text, from the node itself or (for stories on disk) its textFile"""
+    if isinstance(node.get('text'), str):
+        return node['text']
+    if story_dir is not None and isinstance(node.get('textFile'), str):
+        path = Path(story_dir) / node['textFile']
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+    return None
+
+
+def reachable_nodes(nodes: Dict[str, Any], start: str = 'start') -> set:
+    seen = set()
+    queue = deque([start])
+    while queue:
+        node_id = queue.popleft()
+        if node_id in seen or not isinstance(nodes.get(node_id), dict):
+            continue
+        seen.add(node_id)
+        choices = nodes[node_id].get('choices')
+        for choice in choices if isinstance(choices, list) else []:
+            if isinstance(choice, dict):
+                queue.append(choice.get('nextNode'))
+    return seen
+
+
+def validate_story(story_data: Any, story_dir: Optional[Path] = None) -> List[StoryIssue]:
+    """
+    Return every problem found in story_data. With story_dir, node text is read from
+    each node's textFile (the story.json format) instead of the node's 'text' field.
+    """
+    if not isinstance(story_data, dict):
+        return [StoryIssue('schema', 'story is not a JSON object')]
+    nodes = story_data.get('nodes')
+    if not isinstance(nodes, dict) or not nodes:
+        return [StoryIssue('schema', 'no nodes')]
+    if 'start' not in nodes:
+        return [StoryIssue('schema', 'no "start" node')]
+
+    issues = []
+    metadata = story_data.get('metadata')
+    if not isinstance(metadata, dict):
+        issues.append(StoryIssue('metadata', 'metadata is missing'))
+    else:
+        missing = [k for k in REQUIRED_METADATA if not isinstance(metadata.get(k), str) or not metadata[k].strip()]
+        if missing:
+            issues.append(StoryIssue('metadata', f'metadata is missing {", ".join(missing)}'))
+        elif not SAFE_ID.match(metadata['storyId']):
+            issues.append(StoryIssue('story-id', f'storyId "{metadata["storyId"]}" is not a safe folder name'))
+
+    missing_targets = {}
+    for node_id, node in nodes.items():
+        if not SAFE_ID.match(node_id):
+            issues.append(StoryIssue('node-id', 'node ID is not a safe file name', node_id))
+        if not isinstance(node, dict):
+            issues.append(StoryIssue('node', 'node is not an object', node_id))
+            continue
+        text = _node_text(node, story_dir)
+        if not text or not text.strip():
+            issues.append(StoryIssue('node', 'node text is missing or empty', node_id))
+        choices = node.get('choices', [])
+        if not isinstance(choices, list):
+            issues.append(StoryIssue('node', 'choices is not a list', node_id))
+            continue
+        for choice in choices:
+            if not isinstance(choice, dict) or not isinstance(choice.get('text'), str) \
+                    or not choice['text'].strip() or not isinstance(choice.get('nextNode'), str):
+                issues.append(StoryIssue('node', f'malformed choice {json.dumps(choice, ensure_ascii=False)}', node_id))
+            elif choice['nextNode'] not in nodes:
+                missing_targets.setdefault(choice['nextNode'], []).append(node_id)
+    for target, parents in missing_targets.items():
+        if not SAFE_ID.match(target):
+            issues.append(StoryIssue('node-id', 'node ID is not a safe file name', target))
+        issues.append(StoryIssue('dangling', f'referenced by {", ".join(parents)} but does not exist', target))
+
+    reachable = reachable_nodes(nodes)
+    for node_id in nodes:
+        if node_id not in reachable:
+            issues.append(StoryIssue('unreachable', 'cannot be reached from start', node_id))
+    has_ending = any(isinstance(nodes[n], dict) and not nodes[n].get('choices') for n in reachable)
+    if not has_ending and not missing_targets:
+        # With dangling targets the missing nodes may well be the endings
+        issues.append(StoryIssue('no-ending', 'no ending can be reached from start'))
+    return issues
+
+
+# Weights for score_story(); higher scores are bigger, more branching, more complete stories
+SCORE_WEIGHTS = {
+    'reachable_nodes': 1.0,
+    'endings': 2.0,
+    'branching': 5.0,
+    'decision_nodes': 1.5,
+    'avg_words': 0.1,
+    'short_nodes': -1.0,
+    'unreachable_nodes': -2.0,
+    'issues': -3.0,
+}
+SHORT_NODE_WORDS = 40
+MAX_SCORED_WORDS = 150
+
+
+def story_metrics(story_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Cheap graph and text metrics for a generated story"""
+    nodes = story_data.get('nodes', {}) if isinstance(story_data, dict) else {}
+    reachable = reachable_nodes(nodes) if isinstance(nodes, dict) else set()
+    choices = {n: [c for c in nodes[n].get('choices') or [] if isinstance(c, dict)] for n in reachable}
+    endings = [n for n in reachable if not choices[n]]
+    words = [len(str(nodes[n].get('text') or '').split()) for n in reachable]
+    depth = {'start': 0}
+    queue = deque(['start'] if 'start' in reachable else [])
+    while queue:
+        node_id = queue.popleft()
+        for choice in choices[node_id]:
+            if choice.get('nextNode') in reachable and choice['nextNode'] not in depth:
+                depth[choice['nextNode']] = depth[node_id] + 1
+                queue.append(choice['nextNode'])
+    non_endings = [n for n in reachable if choices[n]]
+    return {
+        'nodes': len(nodes),
+        'reachable_nodes': len(reachable),
+        'unreachable_nodes': len(nodes) - len(reachable),
+        'endings': len(endings),
+        'decision_nodes': sum(1 for n in non_endings if len(choices[n]) >= 2),
+        'branching': round(sum(len(choices[n]) for n in non_endings) / len(non_endings), 2) if non_endings else 0.0,
+        'max_depth': max(depth.values(), default=0),
+        'avg_words': round(sum(words) / len(words)) if words else 0,
+        'short_nodes': sum(1 for w in words if w < SHORT_NODE_WORDS),
+        'issues': len([i for i in validate_story(story_data) if i.kind != 'unreachable']),
+    }
+
+
+def score_story(metrics: Dict[str, Any]) -> float:
+    """Weighted score of story_metrics(); used to pick the best of several candidates"""
+    values = dict(metrics, avg_words=min(metrics['avg_words'], MAX_SCORED_WORDS))
+    return round(sum(weight * values[name] for name, weight in SCORE_WEIGHTS.items()), 2)
+
+
+def rename_node(nodes: Dict[str, Any], old_id: str, new_id: str) -> None:
+    """Rename a node (which may not exist yet) and every choice that points to it"""
+    if old_id in nodes:
+        nodes[new_id] = nodes.pop(old_id)
+    for node in nodes.values():
+        for choice in node.get('choices', []) if isinstance(node, dict) else []:
+            if isinstance(choice, dict) and choice.get('nextNode') == old_id:
+                choice['nextNode'] = new_id
+
+
+def apply_local_fixes(story_data: Dict[str, Any], issues: List[StoryIssue]) -> List[str]:
+    """Fix the problems that need no API call (unsafe IDs). Returns descriptions of what changed."""
+    fixes = []
+    nodes = story_data['nodes']
+    renamed = set()
+    for issue in issues:
+        if issue.kind == 'story-id':
+            old_id = story_data['metadata']['storyId']
+            story_data['metadata']['storyId'] = slugify(old_id)
+            fixes.append(f'storyId "{old_id}" -> "{story_data["metadata"]["storyId"]}"')
+        elif issue.kind == 'node-id' and issue.node_id != 'start':
+            new_id = slugify(issue.node_id)
+            if issue.node_id in nodes:
+                while new_id in nodes or new_id in renamed:
+                    new_id += '-x'
+            elif new_id in nodes or new_id in renamed:
+                # A dangling target: renaming it would send its choices to a different node
+                continue
+            renamed.add(new_id)
+            rename_node(nodes, issue.node_id, new_id)
+            fixes.append(f'node "{issue.node_id}" -> "{new_id}"')
+    return fixes
+
+
+def drop_unreachable(story_data: Dict[str, Any]) -> List[str]:
+    """Remove nodes that cannot be reached from start; returns their IDs"""
+    nodes = story_data['nodes']
+    reachable = reachable_nodes(nodes)
+    dropped = [n for n in nodes if n not in reachable]
+    for node_id in dropped:
+        del nodes[node_id]
+    return dropped
+
+
+def graph_summary(nodes: Dict[str, Any], excerpt: int = 80) -> str:
+    """Compact view of the story graph sent as context for repairs"""
+    lines = []
+    for node_id, node in nodes.items():
+        if not isinstance(node, dict):
+            lines.append(f'[{node_id}] (broken)')
+            continue
+        text = node.get('text') if isinstance(node.get('text'), str) else ''
+        choices = node.get('choices') if isinstance(node.get('choices'), list) else []
+        edges = '; '.join(f"{c.get('text', '')} -> {c.get('nextNode')}" for c in choices if isinstance(c, dict))
+        lines.append(f'[{node_id}] {text[:excerpt].strip()}' + (f' | choices: {edges}' if edges else ' | ending'))
+    return '\n'.join(lines)
+
+
+def repair_request(story_data: Dict[str, Any], issues: List[StoryIssue]) -> str:
+    """Describe the broken fragments to re-generate"""
+    lines = ['Story graph:', graph_summary(story_data['nodes']), '', 'Problems to fix:']
+    wanted = []
+    for issue in issues:
+        if issue.kind == 'metadata':
+            lines.append(f'- {issue} (return "metadata" with title, description and storyId)')
+        elif issue.kind == 'dangling':
+            lines.append(f'- node "{issue.node_id}" is {issue.message}: write it')
+            wanted.append(issue.node_id)
+        else:
+            lines.append(f'- node "{issue.node_id}": {issue.message}: rewrite it')
+            wanted.append(issue.node_id)
+    if wanted:
+        lines.append(f'\nReturn nodes for these IDs: {", ".join(dict.fromkeys(wanted))}')
+    return '\n'.join(lines)
+
+
+def merge_repair(story_data: Dict[str, Any], repair: Dict[str, Any], issues: List[StoryIssue]) -> List[str]:
+    """Apply a repair response to the requested fragments only. Returns the node IDs replaced."""
+    if any(i.kind == 'metadata' for i in issues) and isinstance(repair.get('metadata'), dict):
+        if not isinstance(story_data.get('metadata'), dict):
+            story_data['metadata'] = {}
+        for key, value in repair['metadata'].items():
+            if not story_data['metadata'].get(key):
+                story_data['metadata'][key] = value
+    wanted = {i.node_id for i in issues if i.kind in ('node', 'dangling')}
+    replaced = []
+    for node_id, node in (repair.get('nodes') or {}).items():
+        if node_id in wanted and isinstance(node, dict):
+            # A fresh dict, so a node file written from a stream is not mistaken for this text
+            story_data['nodes'][node_id] = {
+                'text': node.get('text'),
+                'imagePrompt': node.get('imagePrompt', ''),
+                'choices': node.get('choices', []),
+            }
+            replaced.append(node_id)
+    return replaced
+
+
+def validate_and_repair(complete: Callable[[List[Dict[str, str]]], Dict[str, Any]], system_prompt: str,
+                        user_prompt: str, story_data: Any, max_attempts: int = 2) -> Dict[str, Any]:
+    """
+    Validate generated story data, repairing local defects by re-requesting only the broken
+    fragments (up to max_attempts requests). complete(messages) runs one JSON-mode chat
+    completion and returns the parsed object. Raises StoryValidationError if the story is
+    unusable or still invalid afterwards.
+    """
+    for attempt in range(max_attempts + 1):
+        issues = validate_story(story_data)
+        fatal = [i for i in issues if i.fatal]
+        if fatal:
+            raise StoryValidationError(fatal)
+        fixes = apply_local_fixes(story_data, issues)
+        if fixes:
+            print(f'   🔧 Fixed: {", ".join(fixes)}')
+            issues = validate_story(story_data)
+        repairable = [i for i in issues if i.kind in ('metadata', 'node', 'dangling')]
+        if not repairable:
+            break
+        if attempt == max_attempts:
+            raise StoryValidationError(repairable)
+        print(f'   ⚠️  {len(repairable)} problem(s): {"; ".join(str(i) for i in repairable)}')
+        print(f'   🔁 Repairing (attempt {attempt + 1}/{max_attempts})...')
+        repair = complete([
+            {"role": "system", "content": system_prompt + REPAIR_INSTRUCTIONS},
+            {"role": "user", "content": f'{user_prompt}\n\n{repair_request(story_data, repairable)}'}
+        ])
+        merge_repair(story_data, repair, repairable)
+
+    dropped = drop_unreachable(story_data)
+    if dropped:
+        print(f'   ✂️  Dropped unreachable node(s): {", ".join(dropped)}')
+    return story_data
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Validate the structure of CYOA stories on disk')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--story-id', help='Story ID (folder name in stories/)')
+    target.add_argument('--all', action='store_true', help='Validate every story in stories/')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.all:
+        story_dirs = sorted(p for p in STORIES_DIR.iterdir()
+                            if p.is_dir() and not p.name.startswith('.') and (p / 'story.json').exists())
+    else:
+        story_dirs = [STORIES_DIR / args.story_id]
+        if not (story_dirs[0] / 'story.json').exists():
+            print(f"Error: {story_dirs[0] / 'story.json'} not found.")
+            sys.exit(1)
+
+    failed = 0
+    for story_dir in story_dirs:
+        with open(story_dir / 'story.json', 'r', encoding='utf-8') as f:
+            story = json.load(f)
+        issues = validate_story(story, story_dir)
+        if issues:
+            failed += 1
+            print(f'✗ {story_dir.name}: {len(issues)} problem(s)')
+            for issue in issues:
+                print(f'   - {issue}')
+        else:
+            print(f'✓ {story_dir.name}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Per-call API telemetry and pipeline stage timing.
+
+Each run gets its own recorder (see telemetry_from_args), handed to the ApiScheduler
+that wraps its client, so runs in parallel threads never share one. Every chat, image
+and image download call made through that scheduler is appended to calls.jsonl with its
+latency, time spent waiting on rate limits and backoff, retries, token usage, bytes
+received and an estimated cost. Pipeline stages timed with
+`with stage('images', recorder):` are appended to stages.jsonl. With --profile the same spans are also written as a
+Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+A call is attributed to the innermost stage open in its context. Stories built in
+parallel each have their own, and work handed to a thread pool must be submitted as
+carry_stage(fn) to be counted under the stage that submitted it.
+
+Once a log passes MAX_LOG_BYTES it is rotated to calls.1.jsonl / stages.1.jsonl (replacing
+the previous rotation), and only the newest KEEP_TRACES traces are kept.
+
+Usage:
+    python telemetry.py summary [--runs 20] [--command generate_story]
+
+Costs are estimates from the list prices in PRICES; update them when prices change.
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_TELEMETRY_DIR = Path(__file__).parent / '.cache' / 'telemetry'
+MAX_LOG_BYTES = 20 * 1024 * 1024
+KEEP_TRACES = 20
+
+# USD per million input / output tokens for chat models, per image for image models
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+IMAGE_PRICES = {
+    ('dall-e-3', 'standard'): 0.040,
+    ('dall-e-3', 'hd'): 0.080,
+    ('dall-e-2', 'standard'): 0.020,
+}
+
+# Recorders whose trace has not been written yet; flushed by one exit handler
+_unclosed = set()
+_unclosed_lock = threading.Lock()
+
+
+def estimate_cost(kind: str, model: str, prompt_tokens: Optional[int] = None,
+                  completion_tokens: Optional[int] = None, quality: Optional[str] = None) -> Optional[float]:
+    """Estimated USD cost of one call, or None for an unknown model"""
+    if kind == 'image':
+        return IMAGE_PRICES.get((model, quality or 'standard'))
+    if kind != 'chat' or prompt_tokens is None:
+        return None
+    # Dated snapshots (gpt-4o-2024-08-06) are priced like their base model
+    base = next((m for m in sorted(PRICES, key=len, reverse=True) if model.startswith(m)), None)
+    if base is None:
+        return None
+    per_input, per_output = PRICES[base]
+    return round((prompt_tokens * per_input + (completion_tokens or 0) * per_output) / 1_000_000, 6)
+
+
+def response_bytes(kind: str, result: Any) -> Optional[int]:
+    """Bytes received in a call's result: message text, decoded image or downloaded file"""
+    try:
+        if kind == 'chat':
+            return len((result.choices[0].message.content or '').encode('utf-8'))
+        if kind == 'image':
+            b64 = getattr(result.data[0], 'b64_json', None)
+            return len(b64) * 3 // 4 if b64 else 0
+        if kind == 'download':
+            return Path(result).stat().st_size
+    except (AttributeError, IndexError, OSError, TypeError):
+        pass
+    return None
+
+
+def rotated_path(path: Path) -> Path:
+    """Where a log is moved once it passes MAX_LOG_BYTES: calls.jsonl -> calls.1.jsonl"""
+    return path.with_name(f'{path.stem}.1{path.suffix}')
+
+
+def carry_stage(fn: Callable) -> Callable:
+    """
+    fn bound to a copy of the caller's context, so the API calls it makes in a worker
+    thread are attributed to the caller's stage. Wrap each submitted task separately.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def usage_tokens(result: Any) -> tuple:
+    usage = getattr(result, 'usage', None)
+    prompt = getattr(usage, 'prompt_tokens', None)
+    completion = getattr(usage, 'completion_tokens', None)
+    return (prompt if isinstance(prompt, int) else None,
+            completion if isinstance(completion, int) else None)
+
+
+class Telemetry:
+    """Appends call and stage records for one run; optionally keeps spans for a Chrome trace"""
+
+    def __init__(self, directory: Path = DEFAULT_TELEMETRY_DIR, command: str = '', profile: bool = False):
+        self.directory = Path(directory)
+        self.command = command
+        self.profile = profile
+        self.run_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}'
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._stages = contextvars.ContextVar(f'stages-{self.run_id}', default=())
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _append(self, filename: str, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        path = self.directory / filename
+        with self._lock:
+            try:
+                if path.stat().st_size > MAX_LOG_BYTES:
+                    os.replace(path, rotated_path(path))
+            except FileNotFoundError:
+                pass  # first record, or another process rotated it just now
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _span(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        if self.profile:
+            with self._lock:
+                self.spans.append({'name': name, 'cat': category, 'start': start, 'end': end,
+                                   'tid': threading.get_ident(), 'thread': threading.current_thread().name,
+                                   'args': args})
+
+    def current_stage(self) -> Optional[str]:
+        """Innermost stage open in this context (see carry_stage for worker threads)"""
+        stack = self._stages.get()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name: str):
+        token = self._stages.set(self._stages.get() + (name,))
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            end = time.perf_counter()
+            self._stages.reset(token)
+            self._append('stages.jsonl', {
+                'ts': round(time.time(), 3), 'run': self.run_id, 'command': self.command,
+                'stage': name, 'durationMs': round((end - start) * 1000, 1), 'ok': ok,
+            })
+            self._span(name, 'stage', start, end, {'ok': ok})
+
+    def record_call(self, kind: str, params: Dict[str, Any], start: float, latency: float, waited: float,
+                    retries: int, result: Any = None, error: Optional[BaseException] = None,
+                    received: Optional[int] = None) -> None:
+        """Log one API call; start/latency/waited are perf_counter seconds"""
+        model = params.get('model', '')
+        prompt_tokens, completion_tokens = usage_tokens(result)
+        record = {
+            'ts': round(time.time(), 3), 'run': self.run_id, 'command': self.command,
+            'stage': self.current_stage(), 'kind': kind, 'model': model,
+            'latencyMs': round(latency * 1000, 1), 'waitMs': round(waited * 1000, 1), 'retries': retries,
+            'promptTokens': prompt_tokens, 'completionTokens': completion_tokens,
+            'bytes': received if received is not None else (response_bytes(kind, result) if error is None else None),
+            'costUsd': estimate_cost(kind, model, prompt_tokens, completion_tokens, params.get('quality'))
+            if error is None else None,
+            'ok': error is None,
+            'error': f'{type(error).__name__}: {error}'[:200] if error is not None else None,
+        }
+        self._append('calls.jsonl', record)
+        end = start + waited + latency
+        self._span(f'{kind} {model}'.strip(), kind, start + waited, end,
+                   {k: record[k] for k in ('retries', 'promptTokens', 'completionTokens', 'bytes', 'costUsd', 'error')
+                    if record[k] is not None})
+
+    def record_stream(self, stream: Any, params: Dict[str, Any], start: float, waited: float, retries: int):
+        """Pass a streamed chat response through, logging the call once it has been read to the end"""
+        received = 0
+        usage = None
+        error = None
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received += len(chunk.choices[0].delta.content.encode('utf-8'))
+                usage = getattr(chunk, 'usage', None) or usage
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.record_call('chat', params, start, time.perf_counter() - start - waited, waited, retries,
+                             SimpleNamespace(usage=usage), error, received)
+
+    def write_trace(self, path: Optional[Path] = None) -> Path:
+        """Write the collected spans in Chrome trace event format"""
+        path = Path(path or self.directory / f'trace-{self.run_id}.json')
+        pid = os.getpid()
+        tids = {}
+        events = []
+        for span in self.spans:
+            tid = tids.setdefault(span['tid'], len(tids) + 1)
+            events.append({'name': span['name'], 'cat': span['cat'], 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round((span['start'] - self.started) * 1e6),
+                           'dur': round((span['end'] - span['start']) * 1e6), 'args': span['args']})
+        names = {tids[s['tid']]: s['thread'] for s in self.spans}
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                   for tid, name in names.items()]
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.command or 'cyoa'}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        # Run IDs start with a timestamp, so name order is age order
+        for old in sorted(self.directory.glob('trace-*.json'))[:-KEEP_TRACES]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def close(self) -> None:
+        with _unclosed_lock:
+            _unclosed.discard(self)
+        if self.profile and self.spans:
+            print(f'📈 Profile written to {self.write_trace()}')
+
+
+def _close_all() -> None:
+    with _unclosed_lock:
+        recorders = list(_unclosed)
+    for recorder in recorders:
+        recorder.close()
+
+
+atexit.register(_close_all)
+
+
+def recorder_of(client: Any) -> Optional[Telemetry]:
+    """The recorder of a client wrapped by an ApiScheduler, if any"""
+    return getattr(getattr(client, 'scheduler', None), 'recorder', None)
+
+
+@contextmanager
+def stage(name: str, recorder: Optional[Telemetry] = None):
+    """Time a pipeline stage with recorder (does nothing when there is none)"""
+    if recorder is None:
+        yield
+        return
+    with recorder.stage(name):
+        yield
+
+
+def add_telemetry_args(parser) -> None:
+    """Add the shared telemetry options to an argparse parser"""
+    parser.add_argument('--profile', action='store_true', help='Also write a Chrome/Perfetto trace of stages and API calls')
+    parser.add_argument('--telemetry-dir', default=str(DEFAULT_TELEMETRY_DIR), help='Where call and stage logs are appended (default: generator/.cache/telemetry)')
+    parser.add_argument('--no-telemetry', action='store_true', help='Do not log API calls or stage timings')
+
+
+def telemetry_from_args(args, command: str) -> Optional[Telemetry]:
+    """
+    A recorder for the options added by add_telemetry_args(), or None with --no-telemetry.
+    Pass it to scheduler_from_args(); its trace is written at exit unless closed earlier.
+    """
+    if args.no_telemetry:
+        return None
+    recorder = Telemetry(Path(args.telemetry_dir), command, profile=args.profile)
+    with _unclosed_lock:
+        _unclosed.add(recorder)
+    return recorder
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def load_records(path: Path, runs: Optional[int] = None, command: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Records from a JSONL log and its rotated predecessor, optionally limited to one
+    command and its last `runs` runs
+    """
+    records = []
+    for log in (rotated_path(path), path):
+        if not log.exists():
+            continue
+        with open(log, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                if command is None or record.get('command') == command:
+                    records.append(record)
+    if runs:
+        keep = set(list(dict.fromkeys(r.get('run') for r in records))[-runs:])
+        records = [r for r in records if r.get('run') in keep]
+    return records
+
+
+def summarise(directory: Path, runs: Optional[int] = None, command: Optional[str] = None) -> None:
+    stages = load_records(directory / 'stages.jsonl', runs, command)
+    calls = load_records(directory / 'calls.jsonl', runs, command)
+    if not stages and not calls:
+        print(f'No telemetry in {directory}')
+        return
+    run_count = len({r.get('run') for r in stages + calls})
+    print(f'📊 {run_count} run(s){f" of {command}" if command else ""}\n')
+
+    if stages:
+        by_stage: Dict[str, List[float]] = {}
+        for r in stages:
+            by_stage.setdefault(r['stage'], []).append(r['durationMs'])
+        print(f'{"Stage":<16} {"count":>6} {"p50 s":>9} {"p95 s":>9} {"total s":>10}')
+        for name, values in sorted(by_stage.items(), key=lambda kv: -sum(kv[1])):
+            print(f'{name:<16} {len(values):>6} {percentile(values, 50) / 1000:>9.2f} '
+                  f'{percentile(values, 95) / 1000:>9.2f} {sum(values) / 1000:>10.1f}')
+        print()
+
+    if calls:
+        by_call: Dict[tuple, List[Dict[str, Any]]] = {}
+        for r in calls:
+            by_call.setdefault((r['kind'], r.get('model') or '-'), []).append(r)
+        print(f'{"Call":<28} {"count":>6} {"errors":>6} {"retries":>7} {"p50 s":>8} {"p95 s":>8} '
+              f'{"tokens":>9} {"MB":>8} {"cost $":>8}')
+        total_cost = 0.0
+        for (kind, model), records in sorted(by_call.items()):
+            latencies = [r['latencyMs'] for r in records]
+            tokens = sum((r.get('promptTokens') or 0) + (r.get('completionTokens') or 0) for r in records)
+            received = sum(r.get('bytes') or 0 for r in records)
+            cost = sum(r.get('costUsd') or 0 for r in records)
+            total_cost += cost
+            print(f'{f"{kind} {model}":<28} {len(records):>6} {sum(not r.get("ok") for r in records):>6} '
+                  f'{sum(r.get("retries", 0) for r in records):>7} {percentile(latencies, 50) / 1000:>8.2f} '
+                  f'{percentile(latencies, 95) / 1000:>8.2f} {tokens:>9} {received / 1e6:>8.2f} {cost:>8.3f}')
+        waited = sum(r.get('waitMs') or 0 for r in calls) / 1000
+        print(f'\nEstimated cost: ${total_cost:.3f}; {waited:.1f}s spent waiting on rate limits and retries')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise API call and stage telemetry')
+    parser.add_argument('--telemetry-dir', default=str(DEFAULT_TELEMETRY_DIR), help='Telemetry directory (default: generator/.cache/telemetry)')
+    sub = parser.add_subparsers(dest='command_name', required=True)
+    summary = sub.add_parser('summary', help='p50/p95 per stage and per call type across runs')
+    summary.add_argument('--runs', type=int, default=None, help='Only the most recent N runs (default: all)')
+    summary.add_argument('--command', default=None, help='Only runs of this script, e.g. generate_story')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command_name == 'summary':
+        summarise(Path(args.telemetry_dir), args.runs, args.command)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Tests for story_staging.py: publishing over an existing story and recovering from a crash"""
+import os
+
+import pytest
+
+import story_staging
+from story_staging import clean_stale, new_staging_dir, publish
+
+
+def make_build(stories_dir, story_id, text):
+    staged = new_staging_dir(stories_dir, story_id)
+    (staged / 'nodes').mkdir(parents=True)
+    (staged / 'story.json').write_text(text, encoding='utf-8')
+    return staged
+
+
+def test_publish_refuses_existing_story_without_overwrite(tmp_path):
+    publish(tmp_path, make_build(tmp_path, 'tale', 'v1'))
+    staged = make_build(tmp_path, 'tale', 'v2')
+    with pytest.raises(FileExistsError):
+        publish(tmp_path, staged)
+    assert (tmp_path / 'tale' / 'story.json').read_text(encoding='utf-8') == 'v1'
+    publish(tmp_path, staged, overwrite=True)
+    assert (tmp_path / 'tale' / 'story.json').read_text(encoding='utf-8') == 'v2'
+
+
+def test_crash_between_renames_restores_previous_version(tmp_path, monkeypatch):
+    publish(tmp_path, make_build(tmp_path, 'tale', 'v1'))
+    staged = make_build(tmp_path, 'tale', 'v2')
+    real_replace = os.replace
+    calls = []
+
+    def crash_on_second_rename(src, dst):
+        calls.append((src, dst))
+        if len(calls) == 2:
+            raise KeyboardInterrupt  # process killed after the old version was swapped out
+        real_replace(src, dst)
+
+    monkeypatch.setattr(story_staging.os, 'replace', crash_on_second_rename)
+    with pytest.raises(KeyboardInterrupt):
+        publish(tmp_path, staged, overwrite=True)
+    monkeypatch.setattr(story_staging.os, 'replace', real_replace)
+    assert not (tmp_path / 'tale').exists()
+
+    # The next run puts the previous version back instead of deleting the only copy
+    clean_stale(tmp_path)
+    assert (tmp_path / 'tale' / 'story.json').read_text(encoding='utf-8') == 'v1'
+    assert not [p for p in story_staging.staging_root(tmp_path).iterdir() if '.old-' in p.name]
@@ -4,84 +4,384 @@ import json
 import hashlib
 from PySide6.QtGui import QAction, QFont
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QTreeWidget, QTreeWidgetItem, QWidget,
+    QApplication, QMainWindow, QTreeView, QWidget,
     QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, QLabel, QSplitter, QFileDialog, QMessageBox, QMenu
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, QTimer
 
 
 STATE_FILE = "state.json"
-
-class ProofReaderApp(QMainWindow):
-
-    def _get_node_hash(self, story, node):
-        node_path = os.path.join("stories", story, "nodes", f"{node}.txt")
-        if os.path.exists(node_path):
-            with open(node_path, "rb") as f:
-                return hashlib.sha256(f.read()).hexdigest()
+# Node file hashes from earlier sessions, keyed on the file's stat (machine-specific, not in git)
+HASH_CACHE_FILE = "state.hashes.json"
+# Typing pause before the preview (choice buttons) is refreshed
+PREVIEW_DELAY_MS = 300
+
+
+class NodeHashCache:
+    """
+    SHA-256 of node files, reused while the file's size, mtime_ns and inode are
+    unchanged. Checking a node then costs a stat() instead of a read; an edited file
+    gets a new mtime, so its hash (and the auto-unapprove check) is recomputed.
+    """
+
+    def __init__(self, path=HASH_CACHE_FILE):
+        self.path = path
+        self._entries = {}  # node path -> [size, mtime_ns, inode, sha256]
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}  # rebuilt as nodes are hashed
+
+    def get(self, node_path):
+        try:
+            st = os.stat(node_path)
+        except OSError:
+            if self._entries.pop(node_path, None) is not None:
+                self._dirty = True
+            return None
+        key = [st.st_size, st.st_mtime_ns, st.st_ino]
+        entry = self._entries.get(node_path)
+        if entry is not None and entry[:3] == key:
+            return entry[3]
+        with open(node_path, "rb") as f:
+            node_hash = hashlib.sha256(f.read()).hexdigest()
+        self._entries[node_path] = key + [node_hash]
+        self._dirty = True
+        return node_hash
+
+    def save(self):
+        if not self._dirty:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        self._dirty = False
+
+
+class StoryCache:
+    """
+    Parsed story.json files by story id. Each lookup stats the file and only parses
+    it again when its mtime or size changed, so clicks and choice navigation reuse
+    the parsed story.
+    """
+
+    def __init__(self, stories_dir="stories"):
+        self.stories_dir = stories_dir
+        self._entries = {}  # story -> ((mtime_ns, size), story data)
+
+    def path(self, story):
+        return os.path.join(self.stories_dir, story, "story.json")
+
+    def get(self, story):
+        """Parsed story.json of story, or None if it has none"""
+        path = self.path(story)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._entries.pop(story, None)
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(story)
+        if entry is None or entry[0] != key:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = (key, json.load(f))
+            self._entries[story] = entry
+        return entry[1]
+
+    def nodes(self, story):
+        story_data = self.get(story)
+        return story_data.get("nodes", {}) if story_data else {}
+
+    def choices(self, story, node):
+        return self.nodes(story).get(node, {}).get("choices", [])
+
+
+class _TreeRow:
+    # One row of the story tree: a story, a node, or a reference to a node shown elsewhere
+    __slots__ = ("story", "node", "parent", "row", "children", "reference", "loaded", "node_count")
+
+    def __init__(self, story, node, parent, reference=False):
+        self.story = story
+        self.node = node
+        self.parent = parent
+        self.reference = reference
+        self.children = []
+        self.loaded = True
+        self.node_count = 0
+        self.row = len(parent.children) if parent is not None else 0
+        if parent is not None:
+            parent.children.append(self)
+
+
+class StoryTreeModel(QAbstractItemModel):
+    """
+    Story graphs for the tree view. Every node is shown once, under the first parent
+    that reaches it (depth first from "start", then the orphans); any further choice
+    leading to it is a leaf "↪" reference row. Stories whose branches reconverge
+    therefore cost nodes + edges rows instead of one row per path.
+
+    Loading only lists the story directories; a story's story.json is read and its
+    rows built when the story is first expanded (canFetchMore/fetchMore). Until then
+    the story row shows a summary from its node files and the approval state, which
+    is checked against the node file hashes for every story at load time.
+    """
+    NodeRole = Qt.UserRole
+    ReferenceRole = Qt.UserRole + 1
+
+    def __init__(self, state, node_hash, stories, parent=None):
+        super().__init__(parent)
+        self.state = state
+        self.node_hash = node_hash
+        self.stories = stories
+        self._root = _TreeRow(None, None, None)
+        self._stories = {}  # story -> story row
+        self._nodes = {}    # (story, node) -> row where the node is shown
+        self._refs = {}     # (story, node) -> reference rows
+
+    def load(self):
+        self.beginResetModel()
+        stories_dir = self.stories.stories_dir
+        self._root = _TreeRow(None, None, None)
+        self._stories = {}
+        self._nodes = {}
+        self._refs = {}
+        for story in os.listdir(stories_dir):
+            if story.startswith("."):
+                continue  # stories/.staging holds stories still being generated
+            story_path = os.path.join(stories_dir, story)
+            if os.path.isdir(story_path):
+                story_row = _TreeRow(story, None, self._root)
+                story_row.loaded = False  # filled in by fetchMore
+                story_row.node_count = self._count_nodes(story_path)
+                self._stories[story] = story_row
+        # Edited nodes are auto-unapproved when their story is expanded (_add_node), so
+        # start-up cost does not grow with the total number of nodes
+        self.endResetModel()
+
+    def _count_nodes(self, story_path):
+        # One directory listing per story, no parsing
+        try:
+            with os.scandir(os.path.join(story_path, "nodes")) as entries:
+                return sum(1 for entry in entries if entry.name.endswith(".txt"))
+        except OSError:
+            return 0
+
+    def _populate(self, story_row):
+        story_row.loaded = True
+        nodes = self.stories.nodes(story_row.story)
+        if not nodes:
+            return
+        # Build detached, then insert the finished rows in one go
+        built = _TreeRow(story_row.story, None, None)
+        self._build(built, nodes)
+        if not built.children:
+            return
+        self.beginInsertRows(self._index(story_row), 0, len(built.children) - 1)
+        for child in built.children:
+            child.parent = story_row
+        story_row.children = built.children
+        self.endInsertRows()
+        # Approvals were re-checked while building; refresh the "to approve" count
+        story_index = self._index(story_row)
+        self.dataChanged.emit(story_index, story_index)
+
+    def _build(self, story_row, nodes):
+        story = story_row.story
+        targets = set()
+        for node in nodes.values():
+            for choice in node.get("choices", []):
+                targets.add(choice.get("nextNode"))
+        # "start" first, then every node no choice leads to
+        roots = (["start"] if "start" in nodes else []) + [n for n in nodes if n not in targets and n != "start"]
+        for root in roots:
+            if (story, root) in self._nodes:
+                continue
+            # Iterative depth first walk, so deep stories cannot hit the recursion limit
+            stack = [(self._add_node(story_row, root), iter(nodes[root].get("choices", [])))]
+            while stack:
+                row, choices = stack[-1]
+                for choice in choices:
+                    next_node = choice.get("nextNode")
+                    if not next_node:
+                        continue
+                    if (story, next_node) in self._nodes:
+                        self._add_reference(row, next_node)
+                        continue
+                    child = self._add_node(row, next_node)
+                    stack.append((child, iter((nodes.get(next_node) or {}).get("choices", []))))
+                    break
+                else:
+                    stack.pop()
+
+    def _add_node(self, parent, node):
+        row = _TreeRow(parent.story, node, parent)
+        self._nodes[(parent.story, node)] = row
+        self._check_approval(parent.story, node)
+        return row
+
+    def _add_reference(self, parent, node):
+        row = _TreeRow(parent.story, node, parent, reference=True)
+        self._refs.setdefault((parent.story, node), []).append(row)
+
+    def _check_approval(self, story, node):
+        node_state = self.state.get(story, {}).get(node, None)
+        node_hash = self.node_hash(story, node)
+        if isinstance(node_state, dict):
+            # If hash doesn't match, auto-unapprove
+            if node_state.get("hash") != node_hash:
+                self.state.setdefault(story, {})[node] = {"approved": False, "hash": node_hash}
+        elif isinstance(node_state, bool):
+            # Legacy state: treat as approved/rejected, but update to new format
+            self.state.setdefault(story, {})[node] = {"approved": node_state, "hash": node_hash}
+
+    def approved(self, story, node):
+        val = self.state.get(story, {}).get(node)
+        return val.get("approved", False) if isinstance(val, dict) else bool(val)
+
+    def _story_label(self, row):
+        nodes = self.state.get(row.story, {})
+        approved = sum(1 for node in nodes if self.approved(row.story, node)) if isinstance(nodes, dict) else 0
+        return f"{row.story}  ({row.node_count} nodes, {max(row.node_count - approved, 0)} to approve)"
+
+    # --- QAbstractItemModel ---
+
+    def _row(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def _index(self, row):
+        return self.createIndex(row.row, 0, row)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self._index(self._row(parent).children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QModelIndex()
+        return self._index(parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._row(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        row = self._row(parent)
+        if not row.loaded:
+            return row.node_count > 0
+        return bool(row.children)
+
+    def canFetchMore(self, parent):
+        return parent.isValid() and not parent.internalPointer().loaded
+
+    def fetchMore(self, parent):
+        if self.canFetchMore(parent):
+            self._populate(parent.internalPointer())
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.internalPointer()
+        if role == Qt.DisplayRole:
+            if row.node is None:
+                return self._story_label(row)
+            label = f"{row.node} {'✓' if self.approved(row.story, row.node) else '✗'}"
+            return f"↪ {label}" if row.reference else label
+        if role == Qt.ToolTipRole and row.reference:
+            return f"{row.node} is shown under {self._nodes[(row.story, row.node)].parent.node or 'the story'}"
+        if role == self.NodeRole:
+            return row.node
+        if role == self.ReferenceRole:
+            return row.reference
         return None
-    def __init__(self):
-        super().__init__()
-        from PySide6.QtWidgets import QLabel
-        self.status_bar = self.statusBar()
-        self.status_label_all = QLabel()
-        self.status_label_story = QLabel()
-        self.status_bar.addWidget(self.status_label_all)
-        self.status_bar.addWidget(self.status_label_story)
-        self.state = self.load_state()
-        self.current_story = None
-        self.current_node = None
-        self.text_size = 12
-
-        # Restore window geometry/state if available
-        winstate = self.state.get("window", {})
-        if winstate.get("maximized"):
-            self.showMaximized()
-        # Layouts
-        main_widget = QWidget()
-        main_layout = QHBoxLayout(main_widget)
-        self.setCentralWidget(main_widget)
-
-        # Left: Tree with control buttons
-        left_widget = QWidget()
-        left_layout = QVBoxLayout(left_widget)
-
-        # Top row: Refresh and Publish
-        btn_top_row = QHBoxLayout()
-        self.refresh_btn = QPushButton("Refresh Stories")
-        self.publish_btn = QPushButton("Publish Story")
-        btn_top_row.addWidget(self.refresh_btn)
-        btn_top_row.addWidget(self.publish_btn)
-        left_layout.addLayout(btn_top_row)
 
-        # Second row: Expand/Collapse
-        btn_row = QHBoxLayout()
-        btn_expand = QPushButton("Expand All")
-        btn_collapse = QPushButton("Collapse All")
-        btn_row.addWidget(btn_expand)
-        btn_row.addWidget(btn_collapse)
-        left_layout.addLayout(btn_row)
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return "Stories"
+        return None
 
-        # Third row: Accept/Reject All
-        btn_row2 = QHBoxLayout()
-        btn_accept_all = QPushButton("Accept All")
-        btn_reject_all = QPushButton("Reject All")
-        btn_row2.addWidget(btn_accept_all)
-        btn_row2.addWidget(btn_reject_all)
-        left_layout.addLayout(btn_row2)
+    # --- Lookups used by the proofreader ---
+
+    def story_name(self, index):
+        row = self._row(index)
+        return row.story
+
+    def path(self, index):
+        """(story, node, node, ...) from the story row down to index"""
+        names = []
+        row = self._row(index)
+        while row is not self._root:
+            names.append(row.story if row.node is None else row.node)
+            row = row.parent
+        return tuple(reversed(names))
+
+    def index_for_path(self, path):
+        if not path:
+            return QModelIndex()
+        row = self._stories.get(path[0])
+        for name in path[1:]:
+            if row is None:
+                break
+            if not row.loaded:
+                self._populate(row)
+            matches = [c for c in row.children if c.node == name]
+            # A node and a reference to it can share a parent; prefer the node
+            row = next((c for c in matches if not c.reference), matches[0] if matches else None)
+        return self._index(row) if row is not None else QModelIndex()
+
+    def node_index(self, story, node):
+        story_row = self._stories.get(story)
+        if story_row is not None and not story_row.loaded:
+            self._populate(story_row)
+        row = self._nodes.get((story, node))
+        return self._index(row) if row is not None else QModelIndex()
+
+    def subtree_nodes(self, index):
+        """Story of index and every node reachable from it (the whole story for a story row)"""
+        start = self._row(index)
+        if not start.loaded:
+            self._populate(start)
+        names = []
+        seen = set()
+        stack = [start]
+        while stack:
+            row = stack.pop()
+            if row.node is not None:
+                if row.node in seen:
+                    continue
+                seen.add(row.node)
+                names.append(row.node)
+                if row.reference:
+                    row = self._nodes[(row.story, row.node)]
+            stack.extend(reversed(row.children))
+        return start.story, names
+
+    def node_changed(self, story, node):
+        """Repaint a node and every reference to it after its approval changed"""
+        rows = self._refs.get((story, node), [])
+        if (story, node) in self._nodes:
+            rows = [self._nodes[(story, node)]] + rows
+        if story in self._stories:
+            rows = [self._stories[story]] + rows  # its summary count
+        for row in rows:
+            index = self._index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Stories")
-        self.tree.itemClicked.connect(self.on_tree_item_clicked)
-        left_layout.addWidget(self.tree)
-        left_widget.setMinimumWidth(200)
-        main_layout.addWidget(left_widget, 2)
 
-        btn_expand.clicked.connect(self.expand_selected_item)
-        btn_collapse.clicked.connect(self.collapse_selected_item)
-        btn_accept_all.clicked.connect(self.accept_all_nodes_in_story)
-        btn_reject_all.clicked.connect(self.reject_all_nodes_in_story)
+class ProofReaderApp(QMainWindow):
 
+    def _get_node_hash(self, story, node):
+        node_path = os.path.join("stories", story, "nodes", f"{node}.txt")
+        return self.node_hashes.get(node_path)
     def update_status_bar(self):
         # Count all nodes and unapproved nodes across all stories
         total_nodes = 0
@@ -113,257 +413,94 @@ class ProofReaderApp(QMainWindow):
         if winstate.get("maximized"):
             self.showMaximized()
     def accept_all_nodes_in_story(self):
-        # Save expanded/collapsed state and selection
-        expanded = set()
-        selected = None
-        def save_expanded(item, path):
-            # Always use node names (Qt.UserRole) for path, not label text
-            node_name = item.data(0, Qt.UserRole)
-            new_path = path + [node_name] if node_name else path
-            if item.isExpanded():
-                expanded.add(tuple(new_path))
-            for i in range(item.childCount()):
-                save_expanded(item.child(i), new_path)
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            story_item = root.child(i)
-            story_name = story_item.text(0)
-            for j in range(story_item.childCount()):
-                save_expanded(story_item.child(j), [story_name, story_item.child(j).data(0, Qt.UserRole)])
-        current = self.tree.currentItem()
-        if current:
-            selected = []
-            item2 = current
-            while item2:
-                selected.insert(0, item2.data(0, Qt.UserRole))
-                item2 = item2.parent()
-
-        item = self.tree.currentItem()
-        if item is None:
-            return
-        # Find the top-level story item
-        story_item = item
-        while story_item.parent() is not None:
-            story_item = story_item.parent()
-        story = story_item.text(0)
-        # Collect all node names under the selected item (including itself)
-        node_names = []
-        def collect_nodes(tree_item):
-            # Only collect if not the top-level story item
-            if tree_item != story_item:
-                node_name = tree_item.data(0, Qt.UserRole)
-                if node_name:
-                    node_names.append(node_name)
-            for i in range(tree_item.childCount()):
-                collect_nodes(tree_item.child(i))
-        collect_nodes(item)
-        # If the selected item is a node, include it
-        if item != story_item:
-            node_name = item.data(0, Qt.UserRole)
-            if node_name and node_name not in node_names:
-                node_names.insert(0, node_name)
-        # Update state for these nodes only
-        for node_name in node_names:
-            self.state.setdefault(story, {})[node_name] = True
-        self.save_state()
-        self.load_stories_with_restore(expanded, selected)
+        self._set_selected_subtree(True)
 
     def reject_all_nodes_in_story(self):
-        # Save expanded/collapsed state and selection
-        expanded = set()
-        selected = None
-        def save_expanded(item, path):
-            if item.isExpanded():
-                expanded.add(tuple(path))
-            for i in range(item.childCount()):
-                save_expanded(item.child(i), path + [item.child(i).data(0, Qt.UserRole)])
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            story_item = root.child(i)
-            story_name = story_item.text(0)
-            for j in range(story_item.childCount()):
-                save_expanded(story_item.child(j), [story_name, story_item.child(j).data(0, Qt.UserRole)])
-        current = self.tree.currentItem()
-        if current:
-            selected = []
-            item2 = current
-            while item2:
-                selected.insert(0, item2.data(0, Qt.UserRole))
-                item2 = item2.parent()
-
-        item = self.tree.currentItem()
-        if item is None:
+        self._set_selected_subtree(False)
+
+    def _set_selected_subtree(self, value):
+        # Approve or reject the selected node and everything reachable from it (or the whole story)
+        index = self.tree.currentIndex()
+        if not index.isValid():
             return
-        # Find the top-level story item
-        story_item = item
-        while story_item.parent() is not None:
-            story_item = story_item.parent()
-        story = story_item.text(0)
-        # Collect all node names under the selected item (including itself)
-        node_names = []
-        def collect_nodes(tree_item):
-            # Only collect if not the top-level story item
-            if tree_item != story_item:
-                node_name = tree_item.data(0, Qt.UserRole)
-                if node_name:
-                    node_names.append(node_name)
-            for i in range(tree_item.childCount()):
-                collect_nodes(tree_item.child(i))
-        collect_nodes(item)
-        # If the selected item is a node, include it
-        if item != story_item:
-            node_name = item.data(0, Qt.UserRole)
-            if node_name and node_name not in node_names:
-                node_names.insert(0, node_name)
-        # Update state for these nodes only
+        expanded, selected = self._tree_state()
+        story, node_names = self.tree_model.subtree_nodes(index)
         for node_name in node_names:
-            self.state.setdefault(story, {})[node_name] = False
+            self.state.setdefault(story, {})[node_name] = value
         self.save_state()
         self.load_stories_with_restore(expanded, selected)
+        self.update_status_bar()
+
+    def _tree_state(self):
+        # Expanded rows and the selected row, as paths of story/node names
+        expanded = set()
+        stack = [QModelIndex()]
+        while stack:
+            parent = stack.pop()
+            for row in range(self.tree_model.rowCount(parent)):
+                index = self.tree_model.index(row, 0, parent)
+                if self.tree.isExpanded(index):
+                    expanded.add(self.tree_model.path(index))
+                stack.append(index)
+        current = self.tree.currentIndex()
+        selected = self.tree_model.path(current) if current.isValid() else None
+        return expanded, selected
+
     def load_stories_with_restore(self, expanded, selected):
-        # This is a copy of load_stories, but restores expanded/collapsed state and selection from arguments
-        self.tree.clear()
-        stories_dir = "stories"
-        for story in os.listdir(stories_dir):
-            story_path = os.path.join(stories_dir, story)
-            if os.path.isdir(story_path):
-                story_item = QTreeWidgetItem([story])
-                story_item.setData(0, Qt.UserRole, None)
-                story_json_path = os.path.join(story_path, "story.json")
-                if not os.path.exists(story_json_path):
-                    story_json_path = os.path.join(story_path, "..", "story.json")
-                if os.path.exists(story_json_path):
-                    with open(story_json_path, "r", encoding="utf-8") as f:
-                        story_data = json.load(f)
-                    nodes = story_data.get("nodes", {})
-                    # Build parent map
-                    parent_map = {k: set() for k in nodes}
-                    for n, node in nodes.items():
-                        for choice in node.get("choices", []):
-                            next_node = choice.get("nextNode")
-                            if next_node in parent_map:
-                                parent_map[next_node].add(n)
-                    # Add tree recursively
-                    def add_node_recursive(node_name, parent_item, path=None, depth=0):
-                        if path is None:
-                            path = set()
-                        if node_name in path or depth > 100:
-                            return
-                        path = set(path)
-                        path.add(node_name)
-                        node_state = self.state.get(story, {}).get(node_name, None)
-                        node_hash = self._get_node_hash(story, node_name)
-                        approved = False
-                        if isinstance(node_state, dict):
-                            # If hash doesn't match, auto-unapprove
-                            if node_state.get("hash") != node_hash:
-                                approved = False
-                                # Update state to reflect unapproved
-                                self.state.setdefault(story, {})[node_name] = {"approved": False, "hash": node_hash}
-                            else:
-                                approved = node_state.get("approved", False)
-                        elif isinstance(node_state, bool):
-                            # Legacy state: treat as approved/rejected, but update to new format
-                            approved = node_state
-                            self.state.setdefault(story, {})[node_name] = {"approved": approved, "hash": node_hash}
-                        label = f"{node_name} {'✓' if approved else '✗'}"
-                        node_item = QTreeWidgetItem([label])
-                        node_item.setData(0, Qt.UserRole, node_name)
-                        parent_item.addChild(node_item)
-                        node = nodes.get(node_name)
-                        if node and "choices" in node:
-                            for choice in node["choices"]:
-                                next_node = choice.get("nextNode")
-                                if next_node:
-                                    add_node_recursive(next_node, node_item, path, depth+1)
-                    # Add all root nodes (nodes with no parents) except 'start'
-                    roots = [n for n in nodes if not parent_map[n] and n != "start"]
-                    if "start" in nodes:
-                        add_node_recursive("start", story_item)
-                    for orphan in roots:
-                        add_node_recursive(orphan, story_item)
-                self.tree.addTopLevelItem(story_item)
-        # Restore expanded/collapsed state and selection
-        def restore_expanded(item, path):
-            # Always use node names (Qt.UserRole) for path, not label text
-            node_name = item.data(0, Qt.UserRole)
-            new_path = path + [node_name] if node_name else path
-            if tuple(new_path) in expanded:
-                item.setExpanded(True)
-            for i in range(item.childCount()):
-                restore_expanded(item.child(i), new_path)
-        for i in range(self.tree.topLevelItemCount()):
-            story_item = self.tree.topLevelItem(i)
-            restore_expanded(story_item, [story_item.text(0)])
-        # Restore selection
+        self.tree_model.load()
+        # Parents before children
+        for path in sorted(expanded, key=len):
+            index = self.tree_model.index_for_path(path)
+            if index.isValid():
+                self.tree.setExpanded(index, True)
         if selected:
-            def find_item(item, path, idx):
-                if idx >= len(path):
-                    return item
-                for i in range(item.childCount()):
-                    child = item.child(i)
-                    if child.data(0, Qt.UserRole) == path[idx]:
-                        return find_item(child, path, idx+1)
-                return None
-            for i in range(self.tree.topLevelItemCount()):
-                story_item = self.tree.topLevelItem(i)
-                if story_item.text(0) == selected[0]:
-                    item = find_item(story_item, selected, 1)
-                    if item:
-                        self.tree.setCurrentItem(item)
-                        break
+            index = self.tree_model.index_for_path(selected)
+            if index.isValid():
+                self.tree.setCurrentIndex(index)
 
     def _set_all_nodes_in_story(self, story, value):
-        # Load story.json
-        story_json_path = os.path.join("stories", story, "story.json")
-        if not os.path.exists(story_json_path):
-            story_json_path = os.path.join("stories", story, "..", "story.json")
-        if not os.path.exists(story_json_path):
+        nodes = self.stories.nodes(story)
+        if not nodes:
             return
-        with open(story_json_path, "r", encoding="utf-8") as f:
-            story_data = json.load(f)
-        nodes = story_data.get("nodes", {})
         for node_name in nodes:
             self.state.setdefault(story, {})[node_name] = value
         self.save_state()
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Stories")
-        self.tree.itemClicked.connect(self.on_tree_item_clicked)
+        self.load_stories()
 
     def expand_selected_item(self):
-        item = self.tree.currentItem()
-        if item:
-            self.expand_all_nodes(item)
+        index = self.tree.currentIndex()
+        if index.isValid():
+            self.expand_all_nodes(index)
 
     def collapse_selected_item(self):
-        item = self.tree.currentItem()
-        if item:
-            self.collapse_all_nodes(item)
+        index = self.tree.currentIndex()
+        if index.isValid():
+            self.collapse_all_nodes(index)
     def on_tree_context_menu(self, pos):
-        item = self.tree.itemAt(pos)
-        if item is None:
+        index = self.tree.indexAt(pos)
+        if not index.isValid():
             return
         # Only show menu for top-level (story) items
-        if item.parent() is not None:
+        if index.parent().isValid():
             return
         menu = QMenu(self.tree)
         expand_action = menu.addAction("Expand All Nodes")
         collapse_action = menu.addAction("Collapse All Nodes")
         action = menu.exec_(self.tree.viewport().mapToGlobal(pos))
         if action == expand_action:
-            self.expand_all_nodes(item)
+            self.expand_all_nodes(index)
         elif action == collapse_action:
-            self.collapse_all_nodes(item)
+            self.collapse_all_nodes(index)
 
-    def expand_all_nodes(self, item):
-        item.setExpanded(True)
-        for i in range(item.childCount()):
-            self.expand_all_nodes(item.child(i))
+    def expand_all_nodes(self, index):
+        self.tree.expandRecursively(index)
 
-    def collapse_all_nodes(self, item):
-        item.setExpanded(False)
-        for i in range(item.childCount()):
-            self.collapse_all_nodes(item.child(i))
+    def collapse_all_nodes(self, index):
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            self.tree.collapse(index)
+            stack.extend(self.tree_model.index(i, 0, index) for i in range(self.tree_model.rowCount(index)))
     def __init__(self):
         super().__init__()
         from PySide6.QtWidgets import QLabel
@@ -373,6 +510,7 @@ class ProofReaderApp(QMainWindow):
         self.status_bar.addWidget(self.status_label_all)
         self.status_bar.addWidget(self.status_label_story)
         self.state = self.load_state()
+        self.node_hashes = NodeHashCache(HASH_CACHE_FILE)
         self.current_story = None
         self.current_node = None
         self.text_size = 12
@@ -409,9 +547,14 @@ class ProofReaderApp(QMainWindow):
         btn_row.addWidget(btn_collapse)
         left_layout.addLayout(btn_row)
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabel("Stories")
-        self.tree.itemClicked.connect(self.on_tree_item_clicked)
+        self.stories = StoryCache("stories")
+        self.tree_model = StoryTreeModel(self.state, self._get_node_hash, self.stories, self)
+        self.tree = QTreeView()
+        self.tree.setModel(self.tree_model)
+        self.tree.setUniformRowHeights(True)
+        self.tree.clicked.connect(self.on_tree_item_clicked)
+        # Expanding a story re-checks its approvals, which can change the totals
+        self.tree.expanded.connect(lambda index: self.update_status_bar())
         left_layout.addWidget(self.tree)
         left_widget.setMinimumWidth(200)
         main_layout.addWidget(left_widget, 2)
@@ -440,6 +583,8 @@ class ProofReaderApp(QMainWindow):
         self._choice_btn_layout.setContentsMargins(0, 8, 0, 0)
         self._choice_btn_layout.setSpacing(8)
         bottom_layout.addWidget(self._choice_btn_row)
+        self._choice_btns = []  # pooled, reused from node to node
+        self._choice_key = None  # (story, node, choices) the buttons show
 
         btn_layout = QHBoxLayout()
         self.accept_btn = QPushButton("Accept and stay")  # Underline C for Ctrl+Return
@@ -459,7 +604,12 @@ class ProofReaderApp(QMainWindow):
         self.save_btn.clicked.connect(self.save_node)
         self.publish_btn.clicked.connect(self.publish_story)
         self.refresh_btn.clicked.connect(self.load_stories)
-        self.text_edit.textChanged.connect(self.update_rendered_view)
+        # Refresh the preview once typing pauses, not on every keystroke
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self._preview_timer.timeout.connect(self.update_rendered_view)
+        self.text_edit.textChanged.connect(self._preview_timer.start)
 
         # Menu for text size and refresh (after widgets are created)
         menubar = self.menuBar()
@@ -507,102 +657,17 @@ class ProofReaderApp(QMainWindow):
     def save_state(self):
         with open(STATE_FILE, "w", encoding="utf-8") as f:
             json.dump(self.state, f, indent=2)
+        self.node_hashes.save()
+
+    def closeEvent(self, event):
+        # Keep the hashes computed while browsing for the next session
+        self.node_hashes.save()
+        super().closeEvent(event)
 
     def load_stories(self):
-        # Save expanded/collapsed state and selection
-        expanded = set()
-        selected = None
-        def save_expanded(item, path):
-            if item.isExpanded():
-                expanded.add(tuple(path))
-            for i in range(item.childCount()):
-                save_expanded(item.child(i), path + [item.child(i).data(0, Qt.UserRole)])
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            story_item = root.child(i)
-            story_name = story_item.text(0)
-            for j in range(story_item.childCount()):
-                save_expanded(story_item.child(j), [story_name, story_item.child(j).data(0, Qt.UserRole)])
-        current = self.tree.currentItem()
-        if current:
-            selected = []
-            item = current
-            while item:
-                selected.insert(0, item.data(0, Qt.UserRole))
-                item = item.parent()
-        self.tree.clear()
-        stories_dir = "stories"
-        for story in os.listdir(stories_dir):
-            story_path = os.path.join(stories_dir, story)
-            if os.path.isdir(story_path):
-                story_item = QTreeWidgetItem([story])
-                story_item.setData(0, Qt.UserRole, None)
-                story_json_path = os.path.join(story_path, "story.json")
-                if not os.path.exists(story_json_path):
-                    story_json_path = os.path.join(story_path, "..", "story.json")
-                if os.path.exists(story_json_path):
-                    with open(story_json_path, "r", encoding="utf-8") as f:
-                        story_data = json.load(f)
-                    nodes = story_data.get("nodes", {})
-                    # Build parent map
-                    parent_map = {k: set() for k in nodes}
-                    for n, node in nodes.items():
-                        for choice in node.get("choices", []):
-                            next_node = choice.get("nextNode")
-                            if next_node in parent_map:
-                                parent_map[next_node].add(n)
-                    # Add tree recursively
-                    def add_node_recursive(node_name, parent_item, path=None, depth=0):
-                        if path is None:
-                            path = set()
-                        if node_name in path or depth > 100:
-                            return
-                        path = set(path)
-                        path.add(node_name)
-                        proofed = self.state.get(story, {}).get(node_name, False)
-                        label = f"{node_name} {'✓' if proofed else '✗'}"
-                        node_item = QTreeWidgetItem([label])
-                        node_item.setData(0, Qt.UserRole, node_name)
-                        parent_item.addChild(node_item)
-                        node = nodes.get(node_name)
-                        if node and "choices" in node:
-                            for choice in node["choices"]:
-                                next_node = choice.get("nextNode")
-                                if next_node:
-                                    add_node_recursive(next_node, node_item, path, depth+1)
-                    # Add all root nodes (nodes with no parents) except 'start'
-                    roots = [n for n in nodes if not parent_map[n] and n != "start"]
-                    if "start" in nodes:
-                        add_node_recursive("start", story_item)
-                    for orphan in roots:
-                        add_node_recursive(orphan, story_item)
-                self.tree.addTopLevelItem(story_item)
-        # Restore expanded/collapsed state and selection
-        def restore_expanded(item, path):
-            if tuple(path) in expanded:
-                item.setExpanded(True)
-            for i in range(item.childCount()):
-                restore_expanded(item.child(i), path + [item.child(i).data(0, Qt.UserRole)])
-        for i in range(self.tree.topLevelItemCount()):
-            story_item = self.tree.topLevelItem(i)
-            restore_expanded(story_item, [story_item.text(0)])
-        # Restore selection
-        if selected:
-            def find_item(item, path, idx):
-                if idx >= len(path):
-                    return item
-                for i in range(item.childCount()):
-                    child = item.child(i)
-                    if child.data(0, Qt.UserRole) == path[idx]:
-                        return find_item(child, path, idx+1)
-                return None
-            for i in range(self.tree.topLevelItemCount()):
-                story_item = self.tree.topLevelItem(i)
-                if story_item.text(0) == selected[0]:
-                    item = find_item(story_item, selected, 1)
-                    if item:
-                        self.tree.setCurrentItem(item)
-                        break
+        # Keep expanded/collapsed state and selection across the reload
+        expanded, selected = self._tree_state()
+        self.load_stories_with_restore(expanded, selected)
         self.update_status_bar()
 
     def accept_node(self):
@@ -613,16 +678,8 @@ class ProofReaderApp(QMainWindow):
                 "hash": node_hash
             }
             self.save_state()
-            # Update label for current node in tree
-            item = self.tree.currentItem()
-            if item:
-                label = item.text(0)
-                if label.endswith('✗'):
-                    item.setText(0, label[:-1] + '✓')
-                elif label.endswith('✓'):
-                    pass  # already accepted
-                else:
-                    item.setText(0, label + ' ✓')
+            # Update label for current node (and references to it) in tree
+            self.tree_model.node_changed(self.current_story, self.current_node)
             self.update_status_bar()
 
     def reject_node(self):
@@ -633,32 +690,20 @@ class ProofReaderApp(QMainWindow):
                 "hash": node_hash
             }
             self.save_state()
-            # Update label for current node in tree
-            item = self.tree.currentItem()
-            if item:
-                label = item.text(0)
-                if label.endswith('✓'):
-                    item.setText(0, label[:-1] + '✗')
-                elif label.endswith('✗'):
-                    pass  # already rejected
-                else:
-                    item.setText(0, label + ' ✗')
+            # Update label for current node (and references to it) in tree
+            self.tree_model.node_changed(self.current_story, self.current_node)
             self.update_status_bar()
 
-    def on_tree_item_clicked(self, item, column):
-        node = item.data(0, Qt.UserRole)
+    def on_tree_item_clicked(self, index):
+        node = index.data(StoryTreeModel.NodeRole)
+        story = self.tree_model.story_name(index)
         if node is None:
             # This is a story root (no node name)
             self.filename_label.setText("")
-            self.current_story = item.text(0)
+            self.current_story = story
             self.current_node = None
             self.update_status_bar()
             return
-        # Traverse up to the story root
-        story_item = item
-        while story_item.parent() is not None:
-            story_item = story_item.parent()
-        story = story_item.text(0)
         self.current_story = story
         self.current_node = node
         node_path = os.path.join("stories", story, "nodes", f"{node}.txt")
@@ -681,147 +726,68 @@ class ProofReaderApp(QMainWindow):
             # Ensure rendered view uses correct font size and choices rendering
             self.render_node_with_choices(self.text_edit.toPlainText())
 
-    def accept_node(self):
-        if self.current_story and self.current_node:
-            node_hash = self._get_node_hash(self.current_story, self.current_node)
-            self.state.setdefault(self.current_story, {})[self.current_node] = {
-                "approved": True,
-                "hash": node_hash
-            }
-            self.save_state()
-            # Update label for current node in tree
-            item = self.tree.currentItem()
-            if item:
-                label = item.text(0)
-                if label.endswith('✗'):
-                    item.setText(0, label[:-1] + '✓')
-                elif label.endswith('✓'):
-                    pass  # already accepted
-                else:
-                    item.setText(0, label + ' ✓')
-            self.update_status_bar()
-
-    def reject_node(self):
-        if self.current_story and self.current_node:
-            node_hash = self._get_node_hash(self.current_story, self.current_node)
-            self.state.setdefault(self.current_story, {})[self.current_node] = {
-                "approved": False,
-                "hash": node_hash
-            }
-            self.save_state()
-            # Update label for current node in tree
-            item = self.tree.currentItem()
-            if item:
-                label = item.text(0)
-                if label.endswith('✓'):
-                    item.setText(0, label[:-1] + '✗')
-                elif label.endswith('✗'):
-                    pass  # already rejected
-                else:
-                    item.setText(0, label + ' ✗')
-            self.update_status_bar()
-
     def update_rendered_view(self):
         self.render_node_with_choices(self.text_edit.toPlainText())
 
     def render_node_with_choices(self, text):
-        # Remove any previous choice buttons from the row
-        if hasattr(self, '_choice_btns') and self._choice_btns:
-            for btn in self._choice_btns:
-                self._choice_btn_layout.removeWidget(btn)
-                btn.setParent(None)
-        self._choice_btns = []
-
-        # Add choices as real QPushButton widgets below the text editor
+        choices = []
         if self.current_story and self.current_node:
-            story_json_path = os.path.join("stories", self.current_story, "story.json")
-            if not os.path.exists(story_json_path):
-                story_json_path = os.path.join("stories", self.current_story, "..", "story.json")
-            if os.path.exists(story_json_path):
-                with open(story_json_path, "r", encoding="utf-8") as f:
-                    story_data = json.load(f)
-                node_data = story_data.get("nodes", {}).get(self.current_node, {})
-                choices = node_data.get("choices", [])
-                for idx, choice in enumerate(choices):
-                    btn = QPushButton(f"Accept and: {choice['text']}")
-                    btn.setStyleSheet("")  # Use default QPushButton style
-                    shortcut = str(idx+1) if idx < 9 else None
-                    if shortcut:
-                        btn.setShortcut(shortcut)
-                    btn.clicked.connect(lambda checked, i=idx: self.handle_choice_button(i))
-                    self._choice_btn_layout.addWidget(btn)
-                    self._choice_btns.append(btn)
+            choices = self.stories.choices(self.current_story, self.current_node)
+        # Only touch the buttons when the node or its choices changed
+        key = (self.current_story, self.current_node,
+               tuple((choice.get("text"), choice.get("nextNode")) for choice in choices))
+        if key == self._choice_key:
+            return
+        self._choice_key = key
+
+        # Choices are real QPushButton widgets below the text editor, taken from a pool
+        while len(self._choice_btns) < len(choices):
+            idx = len(self._choice_btns)
+            btn = QPushButton()
+            btn.setStyleSheet("")  # Use default QPushButton style
+            btn.clicked.connect(lambda checked, i=idx: self.handle_choice_button(i))
+            self._choice_btn_layout.addWidget(btn)
+            self._choice_btns.append(btn)
+        for idx, btn in enumerate(self._choice_btns):
+            if idx < len(choices):
+                btn.setText(f"Accept and: {choices[idx]['text']}")
+                btn.setShortcut(str(idx+1) if idx < 9 else "")
+                btn.show()
+            else:
+                btn.setShortcut("")
+                btn.hide()
 
     def handle_choice_button(self, idx):
         # Accept and advance to the next node
-        story_json_path = os.path.join("stories", self.current_story, "story.json")
-        if not os.path.exists(story_json_path):
-            story_json_path = os.path.join("stories", self.current_story, "..", "story.json")
-        if os.path.exists(story_json_path):
-            with open(story_json_path, "r", encoding="utf-8") as f:
-                story_data = json.load(f)
-            node_data = story_data.get("nodes", {}).get(self.current_node, {})
-            choices = node_data.get("choices", [])
-            if 0 <= idx < len(choices):
-                next_node = choices[idx].get("nextNode")
-                if next_node:
-                    self.accept_node()
-                    # Find and select the next node in the tree
-                    self.select_node_in_tree(self.current_story, next_node)
+        choices = self.stories.choices(self.current_story, self.current_node)
+        if 0 <= idx < len(choices):
+            next_node = choices[idx].get("nextNode")
+            if next_node:
+                self.accept_node()
+                # Find and select the next node in the tree
+                self.select_node_in_tree(self.current_story, next_node)
 
     def handle_choice_link(self, link):
         # Accept and advance to the next node
         if link.startswith("choice_"):
-            idx = int(link.split("_")[1])
-            story_json_path = os.path.join("stories", self.current_story, "story.json")
-            if not os.path.exists(story_json_path):
-                story_json_path = os.path.join("stories", self.current_story, "..", "story.json")
-            if os.path.exists(story_json_path):
-                with open(story_json_path, "r", encoding="utf-8") as f:
-                    story_data = json.load(f)
-                node_data = story_data.get("nodes", {}).get(self.current_node, {})
-                choices = node_data.get("choices", [])
-                if 0 <= idx < len(choices):
-                    next_node = choices[idx].get("nextNode")
-                    if next_node:
-                        self.accept_node()
-                        # Find and select the next node in the tree
-                        self.select_node_in_tree(self.current_story, next_node)
+            self.handle_choice_button(int(link.split("_")[1]))
 
     def select_node_in_tree(self, story, node):
-        # Traverse the tree to find and select the node
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            story_item = root.child(i)
-            if story_item.text(0) == story:
-                self._select_node_recursive(story_item, node)
-
-    def _select_node_recursive(self, item, node):
-        for i in range(item.childCount()):
-            child = item.child(i)
-            if child.text(0).startswith(node + " ") or child.text(0) == node:
-                self.tree.setCurrentItem(child)
-                self.on_tree_item_clicked(child, 0)
-                return True
-            if self._select_node_recursive(child, node):
-                return True
-        return False
+        # Select the row where the node is shown (not a reference to it)
+        index = self.tree_model.node_index(story, node)
+        if index.isValid():
+            self.tree.setCurrentIndex(index)
+            self.on_tree_item_clicked(index)
 
     def publish_story(self):
         if not self.current_story:
             QMessageBox.warning(self, "No Story Selected", "Please select a story to publish.")
             return
-        story_dir = os.path.join("stories", self.current_story)
-        story_json_path = os.path.join(story_dir, "story.json")
-        # Try to find the main story.json (in root or in story dir)
-        if not os.path.exists(story_json_path):
-            # fallback to root
-            story_json_path = os.path.join(story_dir, "..", "story.json")
-        if not os.path.exists(story_json_path):
+        story_json_path = self.stories.path(self.current_story)
+        story_data = self.stories.get(self.current_story)
+        if story_data is None:
             QMessageBox.warning(self, "No story.json", f"No story.json found for {self.current_story}.")
             return
-        with open(story_json_path, "r", encoding="utf-8") as f:
-            story_data = json.load(f)
         # Remove any 'text' fields from nodes
         for node in story_data.get("nodes", {}).values():
             if "text" in node: